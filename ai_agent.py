@@ -1,17 +1,27 @@
-import os
 import logging
 import json
 import re
+import threading
+from collections import OrderedDict
 from typing import List, Dict, Any, Optional
-from google import genai
-from google.genai import types
+from sqlalchemy import text
+from database import DatabaseManager
+from llm_client import LLMError, get_llm_client
+from schema_catalog import SchemaCatalog
 
 logger = logging.getLogger(__name__)
 
+# Generated SQL kept in memory per question, served when the LLM is unavailable
+SQL_CACHE_SIZE = 256
+
 class AIAgent:
     def __init__(self):
-        self.client = genai.Client(api_key=os.environ.get("GEMINI_API_KEY"))
+        self.llm = get_llm_client()
+        self.db_manager = DatabaseManager()
         self.schema_context = self._get_schema_context()
+        self.schema_catalog = SchemaCatalog()
+        self._sql_cache = OrderedDict()
+        self._sql_cache_lock = threading.Lock()
     
     def _get_schema_context(self) -> str:
         """Define the database schema context for the AI"""
@@ -36,14 +46,21 @@ class AIAgent:
         - Conversion Rate = units_sold / clicks
         - CTR (Click Through Rate) = clicks / impressions
         """
-    
-    def generate_sql_query(self, question: str) -> Optional[str]:
-        """Generate SQL query from natural language question"""
+
+    def _schema_context_for(self, question: str) -> str:
+        """Schema pruned to the question and annotated with column statistics; the static schema if that fails"""
         try:
-            system_prompt = f"""
+            return self.schema_catalog.context_for(question)
+        except Exception as e:
+            logger.error(f"Error building schema context: {str(e)}")
+            return self.schema_context
+    
+    def _sql_system_prompt(self, schema_context: str) -> str:
+        """Instructions and schema shared by single and batched SQL generation"""
+        return f"""
             You are an expert SQL query generator for an e-commerce analytics database.
             
-            {self.schema_context}
+            {schema_context}
             
             Rules:
             1. Generate ONLY the SQL query, no explanations
@@ -63,6 +80,12 @@ class AIAgent:
             - "Highest CPC" = MAX(ad_spend / clicks) from ad_sales table where clicks > 0
             - "Eligible products" = COUNT(*) from eligibility where eligibility = 'TRUE'
             """
+    
+    def generate_sql_query(self, question: str) -> Optional[str]:
+        """Generate SQL query from natural language question"""
+        try:
+            schema_context = self._schema_context_for(question)
+            system_prompt = self._sql_system_prompt(schema_context)
             
             user_prompt = f"""
             Generate a SQL query for this question: "{question}"
@@ -70,27 +93,107 @@ class AIAgent:
             Return only the SQL query, nothing else.
             """
             
-            response = self.client.models.generate_content(
-                model="gemini-2.5-flash",
-                contents=[
-                    types.Content(role="user", parts=[types.Part(text=f"{system_prompt}\n\n{user_prompt}")])
-                ]
-            )
-            
-            if not response.text:
+            prompt = f"{system_prompt}\n\n{user_prompt}"
+            logger.info(f"SQL prompt: {len(prompt)} characters ({len(schema_context)} of schema)")
+            try:
+                response_text = self.llm.generate(prompt)
+            except LLMError as e:
+                cached = self._cached_sql(question)
+                if cached:
+                    logger.warning(f"LLM unavailable ({str(e)}), serving cached SQL")
+                    return cached
+                raise
+            
+            if not response_text:
                 logger.error("Empty response from Gemini")
                 return None
                 
             # Extract SQL query from response
-            sql_query = self._extract_sql_query(response.text)
+            sql_query = self._extract_sql_query(response_text)
             logger.info(f"Generated SQL query: {sql_query}")
+            self._remember_sql(question, sql_query)
             
             return sql_query
             
+        except LLMError:
+            raise
         except Exception as e:
             logger.error(f"Error generating SQL query: {str(e)}")
             return None
     
+    def generate_sql_queries(self, questions: List[str]) -> Dict[str, str]:
+        """Generate SQL for several questions in one LLM request.
+
+        Returns the queries the model answered; callers ask the rest singly.
+        """
+        try:
+            schema_context = self._schema_context_for(' '.join(questions))
+            numbered = "\n".join(f"            {i}. {question}" for i, question in enumerate(questions, 1))
+            user_prompt = f"""
+            Generate SQL queries for these numbered questions:
+{numbered}
+            
+            Return only a JSON object mapping each question number to its SQL query, nothing else.
+            """
+            
+            prompt = f"{self._sql_system_prompt(schema_context)}\n\n{user_prompt}"
+            logger.info(f"Batched SQL prompt: {len(prompt)} characters for {len(questions)} questions")
+            response_text = self.llm.generate(prompt)
+            
+            # Strip markdown fences around the JSON object
+            match = re.search(r'\{.*\}', response_text or '', re.DOTALL)
+            answers = json.loads(match.group(0)) if match else {}
+            
+            queries = {}
+            for i, question in enumerate(questions, 1):
+                sql_query = answers.get(str(i))
+                if isinstance(sql_query, str) and sql_query.strip():
+                    queries[question] = self._extract_sql_query(sql_query)
+                    self._remember_sql(question, queries[question])
+            logger.info(f"Batched SQL generation answered {len(queries)} of {len(questions)} questions")
+            return queries
+            
+        except LLMError as e:
+            logger.warning(f"Batched SQL generation failed: {str(e)}")
+            return {}
+        except Exception as e:
+            logger.error(f"Error generating batched SQL queries: {str(e)}")
+            return {}
+    
+    @staticmethod
+    def _question_key(question: str) -> str:
+        return ' '.join(question.lower().split())
+    
+    def _remember_sql(self, question: str, sql_query: str):
+        with self._sql_cache_lock:
+            key = self._question_key(question)
+            self._sql_cache[key] = sql_query
+            self._sql_cache.move_to_end(key)
+            while len(self._sql_cache) > SQL_CACHE_SIZE:
+                self._sql_cache.popitem(last=False)
+    
+    def _cached_sql(self, question: str) -> Optional[str]:
+        """SQL previously generated for this question, from memory or the query history"""
+        key = self._question_key(question)
+        with self._sql_cache_lock:
+            cached = self._sql_cache.get(key)
+        if cached or not key:
+            return cached
+        # SQL can't collapse whitespace portably: match the words in order, then compare keys here
+        pattern = '%'.join(re.sub(r'([\\%_])', r'\\\1', word) for word in key.split())
+        try:
+            with self.db_manager.engine.connect() as conn:
+                rows = conn.execute(text("""
+                    SELECT question, sql_query FROM query_history
+                    WHERE LOWER(TRIM(question)) LIKE :pattern ESCAPE '\\' AND sql_query IS NOT NULL
+                    ORDER BY created_at DESC
+                    LIMIT 20
+                """), {'pattern': pattern}).fetchall()
+            return next((sql_query for asked, sql_query in rows if self._question_key(asked) == key), None)
+        except Exception as e:
+            logger.error(f"Error looking up cached SQL: {str(e)}")
+            return None
+    
     def _extract_sql_query(self, response_text: str) -> str:
         """Extract clean SQL query from AI response"""
         # Remove markdown code blocks if present
@@ -132,14 +235,14 @@ class AIAgent:
             Please provide a clear, business-friendly interpretation of these results.
             """
             
-            response = self.client.models.generate_content(
-                model="gemini-2.5-flash",
-                contents=[
-                    types.Content(role="user", parts=[types.Part(text=f"{system_prompt}\n\n{user_prompt}")])
-                ]
-            )
+            response_text = self.llm.generate(f"{system_prompt}\n\n{user_prompt}")
+            
+            return response_text or "Unable to generate response"
             
-            return response.text or "Unable to generate response"
+        except LLMError as e:
+            logger.error(f"LLM unavailable for the response: {str(e)}")
+            row_count = len(results) if results else 0
+            return f"The AI explanation is temporarily unavailable. The query returned {row_count} row{'s' if row_count != 1 else ''}; see the raw results below."
             
         except Exception as e:
             logger.error(f"Error generating response: {str(e)}")
@@ -1,11 +1,23 @@
 import logging
 from typing import List, Dict, Any, Optional
 from database import DatabaseManager
+from queries import run_fixed_query
+from scoring import score_products, recommendation_masks, decode_recommendations, normalize_eligibility
 import pandas as pd
 from datetime import datetime, timedelta
+from sqlalchemy import text
 
 logger = logging.getLogger(__name__)
 
+# Columns returned for each product by the product performance analysis
+PRODUCT_COLUMNS = [
+    'item_id', 'total_revenue', 'total_units', 'ad_revenue', 'ad_spend', 'impressions', 'clicks',
+    'ad_units', 'roas', 'cpc', 'ctr', 'conversion_rate', 'is_eligible', 'performance_score',
+]
+PRODUCT_SORT_COLUMNS = [column for column in PRODUCT_COLUMNS if column != 'is_eligible']
+# Most products returned per page
+PRODUCT_PAGE_MAX = 500
+
 class AdvancedAnalytics:
     def __init__(self):
         self.db_manager = DatabaseManager()
@@ -13,52 +25,10 @@ class AdvancedAnalytics:
     def get_business_summary(self) -> Dict[str, Any]:
         """Get comprehensive business performance summary"""
         try:
-            # Total sales and revenue metrics
-            sales_query = """
-            SELECT 
-                SUM(total_sales) as total_revenue,
-                SUM(total_units_ordered) as total_units,
-                COUNT(DISTINCT item_id) as active_products,
-                AVG(total_sales) as avg_sales_per_transaction,
-                COUNT(DISTINCT date) as active_days
-            FROM total_sales WHERE total_sales > 0
-            """
-            
-            # Ad performance metrics
-            ad_query = """
-            SELECT 
-                SUM(ad_sales) as total_ad_revenue,
-                SUM(ad_spend) as total_ad_spend,
-                SUM(impressions) as total_impressions,
-                SUM(clicks) as total_clicks,
-                SUM(units_sold) as total_ad_units,
-                CASE WHEN SUM(ad_spend) > 0 THEN SUM(ad_sales) / SUM(ad_spend) ELSE 0 END as overall_roas,
-                CASE WHEN SUM(clicks) > 0 THEN SUM(ad_spend) / SUM(clicks) ELSE 0 END as avg_cpc,
-                CASE WHEN SUM(impressions) > 0 THEN SUM(clicks) * 100.0 / SUM(impressions) ELSE 0 END as overall_ctr,
-                CASE WHEN SUM(clicks) > 0 THEN SUM(units_sold) * 100.0 / SUM(clicks) ELSE 0 END as overall_conversion_rate
-            FROM ad_sales WHERE ad_spend > 0
-            """
-            
-            # Eligibility metrics
-            eligibility_query = """
-            SELECT 
-                SUM(CASE WHEN eligibility = 'TRUE' THEN 1 ELSE 0 END) as eligible_products,
-                COUNT(*) as total_products_checked,
-                SUM(CASE WHEN eligibility = 'TRUE' THEN 1 ELSE 0 END) * 100.0 / COUNT(*) as eligibility_rate
-            FROM (
-                SELECT DISTINCT item_id, eligibility 
-                FROM eligibility 
-                WHERE eligibility_datetime_utc = (
-                    SELECT MAX(eligibility_datetime_utc) 
-                    FROM eligibility e2 
-                    WHERE e2.item_id = eligibility.item_id
-                )
-            ) latest_eligibility
-            """
-            
-            sales_results = self.db_manager.execute_query(sales_query)
-            ad_results = self.db_manager.execute_query(ad_query)
-            eligibility_results = self.db_manager.execute_query(eligibility_query)
+            # Sales, ad performance and eligibility metrics
+            sales_results = run_fixed_query(self.db_manager, 'business_sales')
+            ad_results = run_fixed_query(self.db_manager, 'business_ads')
+            eligibility_results = run_fixed_query(self.db_manager, 'business_eligibility')
             
             summary = {
                 'sales_metrics': sales_results[0] if sales_results else {},
@@ -88,172 +58,110 @@ class AdvancedAnalytics:
     
     def get_product_performance_analysis(self, limit: int = 20) -> List[Dict[str, Any]]:
         """Get detailed performance analysis for top products"""
+        return self.get_scored_products(limit=limit).get('products', [])
+    
+    def get_scored_products(self, limit: int = 20, offset: int = 0, sort_by: str = 'total_revenue',
+                            descending: bool = True, min_score: float = None, max_score: float = None,
+                            eligible: bool = None) -> Dict[str, Any]:
+        """Get a page of scored products from the whole catalog, sorted and filtered"""
+        if sort_by not in PRODUCT_SORT_COLUMNS:
+            raise ValueError(f"Cannot sort by {sort_by}; choose one of {', '.join(PRODUCT_SORT_COLUMNS)}")
+        # A negative LIMIT means no limit to SQLite, which would return the whole catalog
+        if not 1 <= limit <= PRODUCT_PAGE_MAX:
+            raise ValueError(f"limit must be between 1 and {PRODUCT_PAGE_MAX}")
+        if offset < 0:
+            raise ValueError("offset must not be negative")
+        
         try:
-            query = f"""
-            SELECT 
-                ts.item_id,
-                SUM(ts.total_sales) as total_revenue,
-                SUM(ts.total_units_ordered) as total_units,
-                SUM(ads.ad_sales) as ad_revenue,
-                SUM(ads.ad_spend) as ad_spend,
-                SUM(ads.impressions) as impressions,
-                SUM(ads.clicks) as clicks,
-                SUM(ads.units_sold) as ad_units,
-                CASE WHEN SUM(ads.ad_spend) > 0 THEN SUM(ads.ad_sales) / SUM(ads.ad_spend) ELSE 0 END as roas,
-                CASE WHEN SUM(ads.clicks) > 0 THEN SUM(ads.ad_spend) / SUM(ads.clicks) ELSE 0 END as cpc,
-                CASE WHEN SUM(ads.impressions) > 0 THEN SUM(ads.clicks) * 100.0 / SUM(ads.impressions) ELSE 0 END as ctr,
-                CASE WHEN SUM(ads.clicks) > 0 THEN SUM(ads.units_sold) * 100.0 / SUM(ads.clicks) ELSE 0 END as conversion_rate,
-                e.eligibility as is_eligible
-            FROM total_sales ts
-            LEFT JOIN ad_sales ads ON ts.item_id = ads.item_id
-            LEFT JOIN (
-                SELECT DISTINCT item_id, eligibility 
-                FROM eligibility 
-                WHERE eligibility_datetime_utc = (
-                    SELECT MAX(eligibility_datetime_utc) 
-                    FROM eligibility e2 
-                    WHERE e2.item_id = eligibility.item_id
-                )
-            ) e ON ts.item_id = e.item_id
-            WHERE ts.total_sales > 0
-            GROUP BY ts.item_id, e.eligibility
-            ORDER BY total_revenue DESC
-            LIMIT {limit}
-            """
-            
-            results = self.db_manager.execute_query(query)
+            try:
+                page, total = self._query_product_scores(limit, offset, sort_by, descending, min_score, max_score, eligible)
+            except Exception as e:
+                # Scores are materialized at ingest; score on the fly if they aren't there yet
+                logger.warning(f"Product scores not materialized, scoring on the fly: {str(e)}")
+                page, total = self._filter_product_scores(self._score_catalog(), limit, offset, sort_by, descending,
+                                                          min_score, max_score, eligible)
             
-            # Add performance ratings
-            for product in results:
-                product['performance_score'] = self._calculate_performance_score(product)
-                product['recommendations'] = self._generate_product_recommendations(product)
+            products = []
+            for product in page:
+                product['recommendations'] = decode_recommendations(product.pop('recommendation_mask'))
+                products.append(product)
             
-            return results
+            return {'products': products, 'total': total, 'limit': limit, 'offset': offset}
             
         except Exception as e:
             logger.error(f"Error getting product performance analysis: {str(e)}")
-            return []
+            return {}
     
-    def _calculate_performance_score(self, product: Dict[str, Any]) -> float:
-        """Calculate a performance score (0-100) for a product"""
-        score = 0
-        
-        # Revenue component (40%)
-        revenue = product.get('total_revenue', 0)
-        if revenue > 10000:
-            score += 40
-        elif revenue > 5000:
-            score += 30
-        elif revenue > 1000:
-            score += 20
-        elif revenue > 0:
-            score += 10
-        
-        # RoAS component (30%)
-        roas = product.get('roas', 0)
-        if roas > 10:
-            score += 30
-        elif roas > 5:
-            score += 25
-        elif roas > 3:
-            score += 20
-        elif roas > 2:
-            score += 15
-        elif roas > 1:
-            score += 10
+    def materialize_product_scores(self, version: int):
+        """Score every product and store the results for this data version"""
+        df = self._score_catalog()
+        df['data_version'] = version
+        df.to_sql('product_scores', self.db_manager.engine, index=False, if_exists='replace')
         
-        # Conversion rate component (20%)
-        conversion_rate = product.get('conversion_rate', 0)
-        if conversion_rate > 10:
-            score += 20
-        elif conversion_rate > 5:
-            score += 15
-        elif conversion_rate > 2:
-            score += 10
-        elif conversion_rate > 1:
-            score += 5
+        with self.db_manager.engine.connect() as conn:
+            conn.execute(text("CREATE INDEX IF NOT EXISTS idx_product_scores_score ON product_scores(performance_score)"))
+            conn.execute(text("CREATE INDEX IF NOT EXISTS idx_product_scores_revenue ON product_scores(total_revenue)"))
+            conn.commit()
         
-        # Eligibility component (10%)
-        if product.get('is_eligible') == 'TRUE':
-            score += 10
-        
-        return min(score, 100)
+        logger.info(f"Materialized scores for {len(df)} products (data version {version})")
     
-    def _generate_product_recommendations(self, product: Dict[str, Any]) -> List[str]:
-        """Generate actionable recommendations for a product"""
-        recommendations = []
-        
-        roas = product.get('roas', 0)
-        cpc = product.get('cpc', 0)
-        conversion_rate = product.get('conversion_rate', 0)
-        ctr = product.get('ctr', 0)
-        is_eligible = product.get('is_eligible')
-        
-        # RoAS recommendations
-        if roas < 2:
-            recommendations.append("⚠️ Low RoAS: Consider optimizing ad targeting or reducing ad spend")
-        elif roas > 10:
-            recommendations.append("🚀 Excellent RoAS: Consider increasing ad budget to scale")
-        
-        # CPC recommendations
-        if cpc > 5:
-            recommendations.append("💰 High CPC: Review keyword bidding strategy and ad relevance")
-        elif cpc < 0.5:
-            recommendations.append("💡 Low CPC: Opportunity to increase bids for better visibility")
-        
-        # Conversion rate recommendations
-        if conversion_rate < 1:
-            recommendations.append("📈 Low conversion rate: Optimize product page and ad copy")
-        elif conversion_rate > 10:
-            recommendations.append("✅ Excellent conversion rate: This product converts very well")
+    def _score_catalog(self) -> pd.DataFrame:
+        """Compute metrics, performance scores and recommendation masks for every product"""
+        rows = run_fixed_query(self.db_manager, 'product_performance')
+        df = pd.DataFrame(rows, columns=PRODUCT_COLUMNS[:-1])
         
-        # CTR recommendations
-        if ctr < 1:
-            recommendations.append("👁️ Low CTR: Improve ad creative and targeting")
-        elif ctr > 5:
-            recommendations.append("🎯 Great CTR: Ad creative is engaging audiences well")
-        
-        # Eligibility recommendations
-        if is_eligible != 'TRUE':
-            recommendations.append("❌ Not eligible for ads: Review eligibility requirements")
+        df['is_eligible'] = normalize_eligibility(df['is_eligible'])
+        metrics = {column: df[column].to_numpy() for column in df.columns}
+        df['performance_score'] = score_products(metrics)
+        df['recommendation_mask'] = recommendation_masks(metrics)
+        return df
+    
+    def _query_product_scores(self, limit, offset, sort_by, descending, min_score, max_score, eligible):
+        """Page through the materialized product_scores table"""
+        conditions = []
+        params = {'limit': limit, 'offset': offset}
+        if min_score is not None:
+            conditions.append("performance_score >= :min_score")
+            params['min_score'] = min_score
+        if max_score is not None:
+            conditions.append("performance_score <= :max_score")
+            params['max_score'] = max_score
+        if eligible is not None:
+            conditions.append("is_eligible = 'TRUE'" if eligible else "(is_eligible IS NULL OR is_eligible <> 'TRUE')")
+        where = f"WHERE {' AND '.join(conditions)}" if conditions else ""
         
-        return recommendations[:3]  # Limit to top 3 recommendations
+        # sort_by is validated against PRODUCT_SORT_COLUMNS; item_id keeps pages stable
+        direction = 'DESC' if descending else 'ASC'
+        columns = ', '.join(PRODUCT_COLUMNS + ['recommendation_mask'])
+        with self.db_manager.engine.connect() as conn:
+            total = conn.execute(text(f"SELECT COUNT(*) FROM product_scores {where}"), params).scalar()
+            result = conn.execute(text(f"""
+                SELECT {columns} FROM product_scores {where}
+                ORDER BY {sort_by} {direction}, item_id
+                LIMIT :limit OFFSET :offset
+            """), params)
+            page = [dict(row._mapping) for row in result]
+        return page, total
+    
+    def _filter_product_scores(self, df: pd.DataFrame, limit, offset, sort_by, descending, min_score, max_score, eligible):
+        """Same paging as _query_product_scores, over an in-memory scored catalog"""
+        if min_score is not None:
+            df = df[df['performance_score'] >= min_score]
+        if max_score is not None:
+            df = df[df['performance_score'] <= max_score]
+        if eligible is not None:
+            df = df[(df['is_eligible'] == 'TRUE') == eligible]
+        df = df.sort_values([sort_by, 'item_id'], ascending=[not descending, True])
+        page = df.iloc[offset:offset + limit][PRODUCT_COLUMNS + ['recommendation_mask']]
+        page = page.astype(object).where(page.notna(), None)
+        return page.to_dict('records'), len(df)
     
     def get_time_based_analysis(self, days: int = 7) -> Dict[str, Any]:
         """Get time-based performance analysis"""
         try:
-            # Daily sales trend
-            daily_sales_query = f"""
-            SELECT 
-                date,
-                SUM(total_sales) as daily_sales,
-                SUM(total_units_ordered) as daily_units,
-                COUNT(DISTINCT item_id) as active_products
-            FROM total_sales 
-            WHERE total_sales > 0 
-            GROUP BY date 
-            ORDER BY date DESC 
-            LIMIT {days}
-            """
-            
-            # Daily ad performance
-            daily_ad_query = f"""
-            SELECT 
-                date,
-                SUM(ad_sales) as daily_ad_sales,
-                SUM(ad_spend) as daily_ad_spend,
-                SUM(impressions) as daily_impressions,
-                SUM(clicks) as daily_clicks,
-                CASE WHEN SUM(ad_spend) > 0 THEN SUM(ad_sales) / SUM(ad_spend) ELSE 0 END as daily_roas
-            FROM ad_sales 
-            WHERE ad_spend > 0 
-            GROUP BY date 
-            ORDER BY date DESC 
-            LIMIT {days}
-            """
-            
-            sales_data = self.db_manager.execute_query(daily_sales_query)
-            ad_data = self.db_manager.execute_query(daily_ad_query)
+            # Daily sales trend and ad performance
+            sales_data = run_fixed_query(self.db_manager, 'daily_sales', days=days)
+            ad_data = run_fixed_query(self.db_manager, 'daily_ad_performance', days=days)
             
             # Calculate trends
             analysis = {
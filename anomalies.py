@@ -0,0 +1,216 @@
+import logging
+import os
+import time
+import warnings
+import numpy as np
+import pandas as pd
+from typing import List, Dict, Any, Tuple
+from numpy.lib.stride_tricks import sliding_window_view
+from sqlalchemy import text
+from database import DatabaseManager
+
+logger = logging.getLogger(__name__)
+
+# Trailing days each day is compared with, and how many of them must have data
+ANOMALY_WINDOW = int(os.environ.get("ANOMALY_WINDOW", 7))
+ANOMALY_MIN_PERIODS = int(os.environ.get("ANOMALY_MIN_PERIODS", 5))
+# 'zscore' (rolling mean/std) or 'mad' (rolling median/MAD, robust to earlier outliers)
+ANOMALY_METHOD = os.environ.get("ANOMALY_METHOD", "zscore")
+ANOMALY_THRESHOLD = float(os.environ.get("ANOMALY_THRESHOLD", 3.5))
+# Items scored per block, bounding the window arrays at 100k+ items
+ANOMALY_CHUNK_ITEMS = int(os.environ.get("ANOMALY_CHUNK_ITEMS", 8192))
+
+ANOMALY_METRICS = ['sales', 'spend', 'ctr', 'cpc', 'roas']
+
+def rolling_zscores(values: np.ndarray, window: int, min_periods: int) -> Tuple[np.ndarray, np.ndarray]:
+    """(score, baseline) of each day against the mean/std of the `window` days before it.
+
+    values is items x days with NaN for days without data. Window sums come
+    from cumulative sums, so the pass is O(items x days) whatever the window.
+    """
+    items, days = values.shape
+    valid = ~np.isnan(values)
+    observed = np.where(valid, values, 0.0)
+    zeros = np.zeros((items, 1))
+    counts = np.concatenate([zeros, np.cumsum(valid, axis=1)], axis=1)
+    sums = np.concatenate([zeros, np.cumsum(observed, axis=1)], axis=1)
+    squares = np.concatenate([zeros, np.cumsum(observed * observed, axis=1)], axis=1)
+
+    end = np.arange(days)
+    start = np.maximum(end - window, 0)
+    n = counts[:, end] - counts[:, start]
+    total = sums[:, end] - sums[:, start]
+    with np.errstate(invalid='ignore', divide='ignore'):
+        mean = total / n
+        variance = (squares[:, end] - squares[:, start] - total * mean) / (n - 1)
+        std = np.sqrt(np.maximum(variance, 0))
+        # Flat windows have no spread to measure against
+        std[std <= 1e-9 * np.maximum(np.abs(mean), 1)] = np.nan
+        scores = (values - mean) / std
+    scores[n < min_periods] = np.nan
+    return scores, mean
+
+def rolling_mad_scores(values: np.ndarray, window: int, min_periods: int) -> Tuple[np.ndarray, np.ndarray]:
+    """(score, baseline) of each day as a robust z-score against the median/MAD of the `window` days before it"""
+    items, days = values.shape
+    scores = np.full((items, days), np.nan)
+    baseline = np.full((items, days), np.nan)
+    if days <= window:
+        return scores, baseline
+    # windows[:, t] holds days t .. t+window-1, the history of day t+window
+    windows = sliding_window_view(values, window, axis=1)[:, :days - window]
+    enough = (~np.isnan(windows)).sum(axis=2) >= min_periods
+    with np.errstate(invalid='ignore', divide='ignore'), warnings.catch_warnings():
+        # All-NaN windows (days without data) are expected
+        warnings.simplefilter('ignore', RuntimeWarning)
+        median = np.nanmedian(windows, axis=2)
+        mad = np.nanmedian(np.abs(windows - median[:, :, None]), axis=2)
+        mad[mad <= 1e-9 * np.maximum(np.abs(median), 1)] = np.nan
+        # 0.6745 makes the MAD consistent with a normal standard deviation
+        robust = 0.6745 * (values[:, window:] - median) / mad
+    robust[~enough] = np.nan
+    scores[:, window:] = robust
+    baseline[:, window:] = median
+    return scores, baseline
+
+SCORERS = {'zscore': rolling_zscores, 'mad': rolling_mad_scores}
+
+def metric_matrices(total: Dict[str, np.ndarray], ads: Dict[str, np.ndarray]) -> Dict[str, np.ndarray]:
+    """Daily item metrics from dense items x days matrices of the raw sums (NaN = no row that day)"""
+    with np.errstate(invalid='ignore', divide='ignore'):
+        return {
+            'sales': total['total_sales'],
+            'spend': ads['ad_spend'],
+            'ctr': np.where(ads['impressions'] > 0, ads['clicks'] * 100.0 / ads['impressions'], np.nan),
+            'cpc': np.where(ads['clicks'] > 0, ads['ad_spend'] / ads['clicks'], np.nan),
+            'roas': np.where(ads['ad_spend'] > 0, ads['ad_sales'] / ads['ad_spend'], np.nan),
+        }
+
+def scan_matrices(matrices: Dict[str, np.ndarray], method: str = None, window: int = None, min_periods: int = None,
+                  threshold: float = None, chunk_items: int = None) -> List[Tuple[str, np.ndarray, np.ndarray, np.ndarray, np.ndarray]]:
+    """Flag |score| >= threshold for every item x day x metric.
+
+    Returns one (metric, item index, day index, score, baseline) tuple of
+    arrays per metric, scoring ANOMALY_CHUNK_ITEMS items at a time.
+    """
+    scorer = SCORERS[method or ANOMALY_METHOD]
+    window = window or ANOMALY_WINDOW
+    min_periods = min_periods or ANOMALY_MIN_PERIODS
+    threshold = threshold or ANOMALY_THRESHOLD
+    chunk_items = chunk_items or ANOMALY_CHUNK_ITEMS
+
+    found = []
+    for metric, values in matrices.items():
+        item_parts, day_parts, score_parts, baseline_parts = [], [], [], []
+        for offset in range(0, values.shape[0], chunk_items):
+            scores, baseline = scorer(values[offset:offset + chunk_items], window, min_periods)
+            with np.errstate(invalid='ignore'):
+                items, days = np.nonzero(np.abs(scores) >= threshold)
+            item_parts.append(items + offset)
+            day_parts.append(days)
+            score_parts.append(scores[items, days])
+            baseline_parts.append(baseline[items, days])
+        found.append((metric, np.concatenate(item_parts), np.concatenate(day_parts),
+                      np.concatenate(score_parts), np.concatenate(baseline_parts)))
+    return found
+
+class AnomalyDetector:
+    """Catalog-wide anomaly scan over daily item metrics, stored per data version"""
+
+    def __init__(self):
+        self.db_manager = DatabaseManager()
+
+    def load_matrices(self) -> Tuple[np.ndarray, pd.DatetimeIndex, Dict[str, np.ndarray]]:
+        """(item ids, days, metric matrices) with one row per item and one column per calendar day"""
+        with self.db_manager.engine.connect() as conn:
+            total = pd.read_sql(text("""
+                SELECT date, item_id, SUM(total_sales) AS total_sales
+                FROM total_sales GROUP BY date, item_id
+            """), conn)
+            ads = pd.read_sql(text("""
+                SELECT date, item_id, SUM(ad_sales) AS ad_sales, SUM(ad_spend) AS ad_spend,
+                       SUM(clicks) AS clicks, SUM(impressions) AS impressions
+                FROM ad_sales GROUP BY date, item_id
+            """), conn)
+        for frame in (total, ads):
+            frame['date'] = pd.to_datetime(frame['date'])
+
+        item_ids = np.union1d(total['item_id'].to_numpy(), ads['item_id'].to_numpy())
+        dates = pd.concat([total['date'], ads['date']])
+        days = pd.date_range(dates.min(), dates.max(), freq='D') if len(dates) else pd.DatetimeIndex([])
+
+        def dense(frame: pd.DataFrame, columns: List[str]) -> Dict[str, np.ndarray]:
+            rows = np.searchsorted(item_ids, frame['item_id'].to_numpy())
+            cols = ((frame['date'] - days[0]).dt.days.to_numpy()) if len(days) else np.zeros(0, dtype=int)
+            matrices = {}
+            for column in columns:
+                matrix = np.full((len(item_ids), len(days)), np.nan)
+                matrix[rows, cols] = frame[column].to_numpy(dtype=float)
+                matrices[column] = matrix
+            return matrices
+
+        matrices = metric_matrices(dense(total, ['total_sales']),
+                                   dense(ads, ['ad_sales', 'ad_spend', 'clicks', 'impressions']))
+        return item_ids, days, matrices
+
+    def scan(self, method: str = None) -> pd.DataFrame:
+        """Every flagged item x day x metric, strongest first"""
+        item_ids, days, matrices = self.load_matrices()
+        frames = []
+        for metric, items, day_index, scores, baseline in scan_matrices(matrices, method=method):
+            frames.append(pd.DataFrame({
+                'item_id': item_ids[items],
+                'date': days[day_index].strftime('%Y-%m-%d'),
+                'metric': metric,
+                'value': matrices[metric][items, day_index],
+                'baseline': baseline,
+                'score': scores,
+            }))
+        columns = ['item_id', 'date', 'metric', 'value', 'baseline', 'score']
+        df = pd.concat(frames, ignore_index=True) if frames else pd.DataFrame(columns=columns)
+        df['direction'] = np.where(df['score'] > 0, 'spike', 'drop')
+        return df.sort_values('score', key=np.abs, ascending=False, ignore_index=True)
+
+    def materialize_anomalies(self, version: int):
+        """Scan the catalog and store the anomalies for this data version"""
+        start = time.perf_counter()
+        df = self.scan()
+        df['data_version'] = version
+        df.to_sql('anomalies', self.db_manager.engine, index=False, if_exists='replace')
+        with self.db_manager.engine.connect() as conn:
+            conn.execute(text("CREATE INDEX IF NOT EXISTS idx_anomalies_date ON anomalies(date)"))
+            conn.execute(text("CREATE INDEX IF NOT EXISTS idx_anomalies_item_id ON anomalies(item_id)"))
+            conn.commit()
+        logger.info(f"Stored {len(df)} anomalies in {(time.perf_counter() - start) * 1000:.0f} ms (data version {version})")
+
+    def get_anomalies(self, metric: str = None, item_id: int = None, since: str = None, direction: str = None,
+                      limit: int = 50, offset: int = 0) -> Dict[str, Any]:
+        """Stored anomalies, strongest first, filtered by metric, item, first date and direction"""
+        if metric is not None and metric not in ANOMALY_METRICS:
+            raise ValueError(f"metric must be one of {', '.join(ANOMALY_METRICS)}")
+        if direction is not None and direction not in ('spike', 'drop'):
+            raise ValueError("direction must be spike or drop")
+        conditions = []
+        params: Dict[str, Any] = {'limit': limit, 'offset': offset}
+        for column, value in (('metric', metric), ('item_id', item_id), ('direction', direction)):
+            if value is not None:
+                conditions.append(f"{column} = :{column}")
+                params[column] = value
+        if since is not None:
+            conditions.append("date >= :since")
+            params['since'] = since
+        where = f"WHERE {' AND '.join(conditions)}" if conditions else ""
+
+        try:
+            with self.db_manager.engine.connect() as conn:
+                total = conn.execute(text(f"SELECT COUNT(*) FROM anomalies {where}"), params).scalar()
+                result = conn.execute(text(f"""
+                    SELECT item_id, date, metric, value, baseline, score, direction FROM anomalies {where}
+                    ORDER BY ABS(score) DESC, item_id, date
+                    LIMIT :limit OFFSET :offset
+                """), params)
+                anomalies = [dict(row._mapping) for row in result]
+        except Exception as e:
+            logger.error(f"Error getting anomalies: {str(e)}")
+            return {'anomalies': [], 'total': 0, 'limit': limit, 'offset': offset}
+        return {'anomalies': anomalies, 'total': total, 'limit': limit, 'offset': offset}
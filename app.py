@@ -1,11 +1,34 @@
 import os
+import hmac
 import logging
 import json
-from flask import Flask, request, jsonify, render_template
-from database import DatabaseManager
+import time
+from collections import OrderedDict
+from functools import partial
+from concurrent.futures import ThreadPoolExecutor, FIRST_COMPLETED, wait
+from datetime import date
+from typing import Optional
+from flask import Flask, Response, request, jsonify, render_template, stream_with_context
+from database import DatabaseManager, register_post_ingest_hook, serving_status
 from ai_agent import AIAgent
-from visualization import VisualizationEngine
+from llm_client import LLMError
+from visualization import VisualizationEngine, CHART_TYPES, CHART_QUERIES
 from analytics import AdvancedAnalytics
+from timeseries import TimeSeriesAnalytics
+from anomalies import AnomalyDetector
+from sketches import SketchAnalytics
+from query_cache import query_cache
+from tenants import ShardedAnalytics
+from query_rewriter import QueryRewriter, results_match
+from snapshots import get_snapshot_follower
+from ingest import run_ingest
+from responses import dumps_json, json_response, raw_json, enable_compression
+from singleflight import get_single_flight, coalescing_stats
+from warmup import Warmup
+from export import ResultExporter, EXPORT_FORMATS, content_disposition
+from queries import FIXED_QUERIES, QUERY_PARAMS, bind_params
+from delta_ingest import DeltaIngestor, DeltaValidationError
+from watcher import get_watcher
 
 # Configure logging
 logging.basicConfig(level=logging.DEBUG)
@@ -14,24 +37,231 @@ logger = logging.getLogger(__name__)
 # Create Flask app
 app = Flask(__name__)
 app.secret_key = os.environ.get("SESSION_SECRET", "dev-secret-key")
+enable_compression(app)
 
 # Initialize components
 db_manager = DatabaseManager()
 ai_agent = AIAgent()
 viz_engine = VisualizationEngine()
 analytics = AdvancedAnalytics()
+timeseries = TimeSeriesAnalytics()
+anomaly_detector = AnomalyDetector()
+sketch_analytics = SketchAnalytics()
+sharded_analytics = ShardedAnalytics()
+query_rewriter = QueryRewriter()
+warmup = Warmup()
+exporter = ResultExporter()
+delta_ingestor = DeltaIngestor()
+
+# Bearer token required by the upload endpoint; without one it is disabled
+INGEST_TOKEN = os.environ.get("INGEST_TOKEN")
+# Bearer token required by the cross-tenant admin endpoints; without one they are disabled
+ADMIN_TOKEN = os.environ.get("ADMIN_TOKEN")
+# Development only: leave the token-protected endpoints open when their token is unset
+ALLOW_UNAUTHENTICATED = os.environ.get("ALLOW_UNAUTHENTICATED", "false").lower() == "true"
+
+# Batch questions: per-request cap, questions per batched LLM request, and a shared
+# worker pool bounding how many answers are in progress across all batches
+ASK_BATCH_MAX = int(os.environ.get("ASK_BATCH_MAX", 50))
+ASK_BATCH_LLM_SIZE = int(os.environ.get("ASK_BATCH_LLM_SIZE", 10))
+ASK_BATCH_CONCURRENCY = int(os.environ.get("ASK_BATCH_CONCURRENCY", 4))
+batch_executor = ThreadPoolExecutor(max_workers=ASK_BATCH_CONCURRENCY, thread_name_prefix='ask-batch')
+
+# Identical concurrent requests share one computation
+ask_flight = get_single_flight('ask')
+dashboard_flight = get_single_flight('dashboard')
+visualization_flight = get_single_flight('visualizations')
+
+def require_token(token: Optional[str], setting: str):
+    """Error response unless the request carries the bearer token; fails closed when the token is unset"""
+    if token is None:
+        if ALLOW_UNAUTHENTICATED:
+            return None
+        return jsonify({
+            'error': f'Disabled until {setting} is configured',
+            'status': 'error'
+        }), 403
+    if not hmac.compare_digest(request.headers.get('Authorization', '').encode(), f"Bearer {token}".encode()):
+        return jsonify({
+            'error': 'Unauthorized',
+            'status': 'error'
+        }), 401
+    return None
+
+def normalize_question(question: str) -> str:
+    """Coalescing key for a question: case and whitespace don't change the answer"""
+    return ' '.join(question.lower().split())
+
+SAMPLE_QUESTIONS = [
+    "What is my total sales?",
+    "Calculate the RoAS (Return on Ad Spend)",
+    "Which product had the highest CPC (Cost Per Click)?",
+    "How many products are eligible for advertising?",
+    "What are the top 5 products by total sales?",
+    "Which products have the best conversion rate?",
+    "What is the average ad spend per product?",
+    "Show me products with negative sales",
+    "Which products are not eligible and why?",
+    "Show me sales trends over time",
+    "Display RoAS by product with visualization",
+    "Create a chart of product eligibility distribution",
+    "Show ad performance scatter plot"
+]
 
 @app.route('/')
 def index():
     """Main page with the query interface"""
     return render_template('index.html')
 
+def summarize_response(response: str) -> str:
+    """History summary of a response (first 100 characters)"""
+    return response[:100] + "..." if len(response) > 100 else response
+
+def complete_answer(question: str, sql_query: str, timings: dict) -> dict:
+    """Run generated SQL, explain and chart the results; step durations go into timings"""
+    # Execute query (from precomputed rollups when the answer is provably the same)
+    step = time.time()
+    results = query_rewriter.execute(sql_query)
+    timings['execution_ms'] = int((time.time() - step) * 1000)
+    logger.info(f"Query results: {results}")
+    
+    # Generate human-readable response
+    step = time.time()
+    response = ai_agent.generate_response(question, sql_query, results)
+    timings['narration_ms'] = int((time.time() - step) * 1000)
+    
+    # Try to generate visualization
+    step = time.time()
+    visualization = viz_engine.get_visualization_for_question(question, results)
+    timings['visualization_ms'] = int((time.time() - step) * 1000)
+    
+    return {
+        'question': question,
+        'sql_query': sql_query,
+        'raw_results': results,
+        'response': response,
+        'visualization': raw_json(visualization),
+        'status': 'success'
+    }
+
+def answer_question(question: str):
+    """Generate, run and explain the SQL for a question; returns (response body, status)"""
+    start_time = time.time()
+    
+    logger.info(f"Processing question: {question}")
+    
+    # Generate SQL query using AI
+    try:
+        sql_query = ai_agent.generate_sql_query(question)
+    except LLMError as e:
+        logger.error(f"LLM unavailable: {str(e)}")
+        return {
+            'error': 'The AI service is temporarily unavailable, please try again shortly',
+            'status': 'error'
+        }, 503
+    logger.info(f"Generated SQL: {sql_query}")
+    
+    if not sql_query:
+        return {
+            'error': 'Could not generate SQL query from the question',
+            'status': 'error'
+        }, 400
+    
+    body = complete_answer(question, sql_query, {})
+    
+    # Calculate execution time and save to history
+    execution_time = int((time.time() - start_time) * 1000)
+    db_manager.save_query_history(question, sql_query, summarize_response(body['response']), execution_time)
+    
+    body['execution_time_ms'] = execution_time
+    return body, 200
+
+def answer_batch(questions: list):
+    """Answer deduplicated questions concurrently, yielding NDJSON lines as each finishes.
+
+    SQL is generated ASK_BATCH_LLM_SIZE questions per LLM request; questions the
+    batched request misses are asked singly. History is written once at the end.
+    """
+    start_time = time.time()
+    unique = OrderedDict()
+    for index, question in enumerate(questions):
+        unique.setdefault(normalize_question(question), (question, []))[1].append(index)
+    
+    def generate_chunk(chunk):
+        step = time.time()
+        queries = ai_agent.generate_sql_queries(chunk) if len(chunk) > 1 else {}
+        return chunk, queries, int((time.time() - step) * 1000)
+    
+    def answer(question, sql_query, timings):
+        step = time.time()
+        if sql_query is None:
+            try:
+                sql_query = ai_agent.generate_sql_query(question)
+            except LLMError as e:
+                logger.error(f"LLM unavailable: {str(e)}")
+                return {'question': question, 'error': 'The AI service is temporarily unavailable, please try again shortly', 'status': 'error'}
+            timings['sql_generation_ms'] = timings.get('sql_generation_ms', 0) + int((time.time() - step) * 1000)
+        if not sql_query:
+            return {'question': question, 'error': 'Could not generate SQL query from the question', 'status': 'error'}
+        return complete_answer(question, sql_query, timings)
+    
+    pending = {}
+    texts = [question for question, _ in unique.values()]
+    for offset in range(0, len(texts), max(ASK_BATCH_LLM_SIZE, 1)):
+        pending[batch_executor.submit(generate_chunk, texts[offset:offset + ASK_BATCH_LLM_SIZE])] = None
+    
+    history = []
+    llm_requests = 0
+    try:
+        while pending:
+            done, _ = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                context = pending.pop(future)
+                if context is None:
+                    chunk, queries, elapsed = future.result()
+                    llm_requests += 1 if len(chunk) > 1 else 0
+                    for question in chunk:
+                        batched_ms = elapsed if question in queries else 0
+                        timings = {'sql_generation_ms': batched_ms, 'started': time.time()}
+                        pending[batch_executor.submit(answer, question, queries.get(question), timings)] = (question, timings, batched_ms)
+                    continue
+                
+                question, timings, batched_ms = context
+                try:
+                    body = future.result()
+                except Exception as e:
+                    logger.error(f"Error answering batch question: {str(e)}")
+                    body = {'question': question, 'error': f'An error occurred while processing your question: {str(e)}', 'status': 'error'}
+                # Batched generation finished before the answer started; a fallback
+                # single generation is already inside the answer's own time
+                timings['total_ms'] = int((time.time() - timings.pop('started')) * 1000) + batched_ms
+                body['timings'] = timings
+                body['indices'] = unique[normalize_question(question)][1]
+                if body['status'] == 'success':
+                    history.append({
+                        'question': question,
+                        'sql_query': body['sql_query'],
+                        'response_summary': summarize_response(body['response']),
+                        'execution_time_ms': timings['total_ms']
+                    })
+                yield dumps_json(body) + "\n"
+    finally:
+        # The client went away: don't start answers nobody will read
+        for future in pending:
+            future.cancel()
+    
+    db_manager.save_query_history_batch(history)
+    yield json.dumps({
+        'status': 'complete',
+        'questions': len(questions),
+        'unique_questions': len(unique),
+        'llm_batch_requests': llm_requests,
+        'total_time_ms': int((time.time() - start_time) * 1000)
+    }) + "\n"
+
 @app.route('/ask', methods=['POST'])
 def ask_question():
     """API endpoint to process natural language questions"""
-    import time
-    start_time = time.time()
-    
     try:
         data = request.get_json()
         if not data or 'question' not in data:
@@ -47,46 +277,15 @@ def ask_question():
                 'status': 'error'
             }), 400
             
-        logger.info(f"Processing question: {question}")
-        
-        # Generate SQL query using AI
-        sql_query = ai_agent.generate_sql_query(question)
-        logger.info(f"Generated SQL: {sql_query}")
-        
-        if not sql_query:
-            return jsonify({
-                'error': 'Could not generate SQL query from the question',
-                'status': 'error'
-            }), 400
-            
-        # Execute query
-        results = db_manager.execute_query(sql_query)
-        logger.info(f"Query results: {results}")
-        
-        # Generate human-readable response
-        response = ai_agent.generate_response(question, sql_query, results)
-        
-        # Try to generate visualization
-        visualization = viz_engine.get_visualization_for_question(question, results)
-        
-        # Calculate execution time and save to history
-        execution_time = int((time.time() - start_time) * 1000)
+        warm = warmup.get(f"ask:{normalize_question(question)}")
+        if warm:
+            body = json.loads(warm)
+            db_manager.save_query_history(question, body['sql_query'], summarize_response(body['response']), 0)
+            body['execution_time_ms'] = 0
+            return json_response(body)
         
-        # Extract summary from response (first 100 characters)
-        response_summary = response[:100] + "..." if len(response) > 100 else response
-        
-        # Save to history
-        db_manager.save_query_history(question, sql_query, response_summary, execution_time)
-        
-        return jsonify({
-            'question': question,
-            'sql_query': sql_query,
-            'raw_results': results,
-            'response': response,
-            'visualization': visualization,
-            'execution_time_ms': execution_time,
-            'status': 'success'
-        })
+        (body, status), _ = ask_flight.do(normalize_question(question), lambda: answer_question(question))
+        return json_response(body, status)
         
     except Exception as e:
         logger.error(f"Error processing question: {str(e)}")
@@ -95,65 +294,148 @@ def ask_question():
             'status': 'error'
         }), 500
 
+@app.route('/ask/batch', methods=['POST'])
+def ask_batch():
+    """Answer many questions at once, streaming one NDJSON line per unique question as it finishes"""
+    data = request.get_json(silent=True)
+    questions = data.get('questions') if isinstance(data, dict) else None
+    if not isinstance(questions, list) or not questions:
+        return jsonify({
+            'error': 'A non-empty list of questions is required',
+            'status': 'error'
+        }), 400
+    
+    questions = [question.strip() for question in questions if isinstance(question, str) and question.strip()]
+    if not questions:
+        return jsonify({
+            'error': 'Questions cannot be empty',
+            'status': 'error'
+        }), 400
+    if len(questions) > ASK_BATCH_MAX:
+        return jsonify({
+            'error': f'At most {ASK_BATCH_MAX} questions per batch',
+            'status': 'error'
+        }), 400
+    
+    return Response(stream_with_context(answer_batch(questions)), mimetype='application/x-ndjson')
+
 @app.route('/health', methods=['GET'])
 def health_check():
-    """Health check endpoint"""
+    """Health check endpoint; ?require_warm=true answers 503 until the warm-up has finished"""
+    llm = ai_agent.llm.health()
+    warm = warmup.is_warm()
+    serving = serving_status()
+    follower = get_snapshot_follower()
+    if follower is not None:
+        # A read node stuck on an old version says why
+        serving.update(swaps=follower.swaps, last_error=follower.last_error)
+    status = 503 if request.args.get('require_warm', 'false').lower() == 'true' and not warm else 200
     return jsonify({
-        'status': 'healthy',
+        'status': 'healthy' if status == 200 else 'warming',
         'database': 'connected',
-        'ai_agent': 'ready'
+        'ai_agent': 'ready' if llm['circuit'] == 'closed' else 'degraded',
+        'llm': llm,
+        'warm': warm,
+        'warmup': warmup.status(),
+        'data_version': db_manager.get_data_version(),
+        'serving': serving
+    }), status
+
+@app.route('/metrics/coalescing', methods=['GET'])
+def coalescing_metrics():
+    """Requests served by sharing an identical in-flight computation, per endpoint"""
+    return jsonify({
+        'coalescing': coalescing_stats(),
+        'status': 'success'
+    })
+
+@app.route('/metrics/query-cache', methods=['GET'])
+def query_cache_metrics():
+    """Memoized execute_query hit rates, overall and for the most-run statements"""
+    return jsonify({
+        'query_cache': query_cache.stats(limit=request.args.get('limit', 20, type=int)),
+        'status': 'success'
     })
 
 @app.route('/sample-questions', methods=['GET'])
 def sample_questions():
     """Get sample questions for testing"""
-    samples = [
-        "What is my total sales?",
-        "Calculate the RoAS (Return on Ad Spend)",
-        "Which product had the highest CPC (Cost Per Click)?",
-        "How many products are eligible for advertising?",
-        "What are the top 5 products by total sales?",
-        "Which products have the best conversion rate?",
-        "What is the average ad spend per product?",
-        "Show me products with negative sales",
-        "Which products are not eligible and why?",
-        "Show me sales trends over time",
-        "Display RoAS by product with visualization",
-        "Create a chart of product eligibility distribution",
-        "Show ad performance scatter plot"
-    ]
-    
     return jsonify({
-        'sample_questions': samples,
+        'sample_questions': SAMPLE_QUESTIONS,
         'status': 'success'
     })
 
+def build_dashboard():
+    """Assemble the dashboard response body"""
+    business_summary = analytics.get_business_summary()
+    product_analysis = analytics.get_product_performance_analysis(limit=15)
+    time_analysis = analytics.get_time_based_analysis(days=7)
+    
+    # Get key visualizations (precomputed at ingest for the current data version)
+    sales_trend = viz_engine.get_chart('sales-trend')
+    top_products = viz_engine.get_chart('top-products', limit=10)
+    roas_chart = viz_engine.get_chart('roas', limit=10)
+    eligibility_chart = viz_engine.get_chart('eligibility')
+    
+    return {
+        'business_summary': business_summary,
+        'product_analysis': product_analysis,
+        'time_analysis': time_analysis,
+        'visualizations': {
+            'sales_trend': raw_json(sales_trend),
+            'top_products': raw_json(top_products),
+            'roas_chart': raw_json(roas_chart),
+            'eligibility_chart': raw_json(eligibility_chart)
+        },
+        'status': 'success'
+    }
+
+def warm_answer(question: str):
+    """Serialized /ask response for a question, or None when it can't be answered"""
+    sql_query = ai_agent.generate_sql_query(question)
+    if not sql_query:
+        return None
+    return dumps_json(complete_answer(question, sql_query, {}))
+
+def rewarm_answer(question: str, previous: str):
+    """Carry an answer warmed for an earlier version over when its SQL still returns the same rows.
+
+    Only changed results are narrated again, reusing the SQL, so a delta that
+    doesn't touch an answer costs no LLM calls for it.
+    """
+    answer = json.loads(previous)
+    sql_query = answer.get('sql_query')
+    if not sql_query:
+        return warm_answer(question)
+    results = json.loads(dumps_json(query_rewriter.execute(sql_query)))
+    if results_match(answer.get('raw_results') or [], results, ordered=True):
+        return previous
+    return dumps_json(complete_answer(question, sql_query, {}))
+
+def start_warmup(version: int):
+    """Precompute the dashboard and the sample question answers for a data version in the background"""
+    previous = warmup.previous(version)
+    tasks = {'dashboard': lambda: dumps_json(build_dashboard())}
+    for question in SAMPLE_QUESTIONS:
+        name = f"ask:{normalize_question(question)}"
+        if name in previous:
+            tasks[name] = partial(rewarm_answer, question, previous[name])
+        else:
+            tasks[name] = partial(warm_answer, question)
+    warmup.start(version, tasks)
+
+register_post_ingest_hook(start_warmup)
+
 @app.route('/dashboard', methods=['GET'])
 def dashboard():
     """Get comprehensive business dashboard data"""
     try:
-        business_summary = analytics.get_business_summary()
-        product_analysis = analytics.get_product_performance_analysis(limit=15)
-        time_analysis = analytics.get_time_based_analysis(days=7)
+        warm = warmup.get('dashboard')
+        if warm:
+            return json_response(raw_json(warm))
         
-        # Get key visualizations
-        sales_trend = viz_engine.create_sales_trend_chart()
-        top_products = viz_engine.create_top_products_chart(limit=10)
-        roas_chart = viz_engine.create_roas_by_product_chart(limit=10)
-        eligibility_chart = viz_engine.create_eligibility_pie_chart()
-        
-        return jsonify({
-            'business_summary': business_summary,
-            'product_analysis': product_analysis,
-            'time_analysis': time_analysis,
-            'visualizations': {
-                'sales_trend': sales_trend,
-                'top_products': top_products,
-                'roas_chart': roas_chart,
-                'eligibility_chart': eligibility_chart
-            },
-            'status': 'success'
-        })
+        body, _ = dashboard_flight.do('dashboard', build_dashboard)
+        return json_response(body)
         
     except Exception as e:
         logger.error(f"Error generating dashboard: {str(e)}")
@@ -164,16 +446,33 @@ def dashboard():
 
 @app.route('/analytics/products', methods=['GET'])
 def product_analytics():
-    """Get detailed product performance analytics"""
+    """Get scored product performance analytics, sortable, filterable and paginated"""
     try:
-        limit = request.args.get('limit', 20, type=int)
-        product_analysis = analytics.get_product_performance_analysis(limit=limit)
+        eligible = request.args.get('eligible')
+        page = analytics.get_scored_products(
+            limit=request.args.get('limit', 20, type=int),
+            offset=request.args.get('offset', 0, type=int),
+            sort_by=request.args.get('sort', 'total_revenue'),
+            descending=request.args.get('order', 'desc').lower() != 'asc',
+            min_score=request.args.get('min_score', type=float),
+            max_score=request.args.get('max_score', type=float),
+            eligible=None if eligible is None else eligible.lower() == 'true'
+        )
         
         return jsonify({
-            'products': product_analysis,
+            'products': page.get('products', []),
+            'total': page.get('total', 0),
+            'limit': page.get('limit'),
+            'offset': page.get('offset'),
             'status': 'success'
         })
         
+    except ValueError as e:
+        return jsonify({
+            'error': str(e),
+            'status': 'error'
+        }), 400
+        
     except Exception as e:
         logger.error(f"Error getting product analytics: {str(e)}")
         return jsonify({
@@ -181,33 +480,151 @@ def product_analytics():
             'status': 'error'
         }), 500
 
+@app.route('/analytics/timeseries', methods=['GET'])
+def timeseries_analytics():
+    """Get metrics for an arbitrary date range by day, week or month, with optional comparison"""
+    try:
+        start = request.args.get('start')
+        end = request.args.get('end')
+        analysis = timeseries.analyze(
+            start=date.fromisoformat(start) if start else None,
+            end=date.fromisoformat(end) if end else None,
+            grain=request.args.get('grain', 'day'),
+            compare_to=request.args.get('compare_to'),
+            rolling=request.args.get('rolling', type=int)
+        )
+        
+        return jsonify({
+            'timeseries': analysis,
+            'status': 'success'
+        })
+        
+    except ValueError as e:
+        return jsonify({
+            'error': str(e),
+            'status': 'error'
+        }), 400
+    except Exception as e:
+        logger.error(f"Error getting time series analytics: {str(e)}")
+        return jsonify({
+            'error': f'Error getting time series analytics: {str(e)}',
+            'status': 'error'
+        }), 500
+
+@app.route('/analytics/anomalies', methods=['GET'])
+def anomaly_analytics():
+    """Get the anomalous item days found by the last catalog-wide scan, strongest first"""
+    try:
+        since = request.args.get('since')
+        page = anomaly_detector.get_anomalies(
+            metric=request.args.get('metric'),
+            item_id=request.args.get('item_id', type=int),
+            since=date.fromisoformat(since).isoformat() if since else None,
+            direction=request.args.get('direction'),
+            limit=request.args.get('limit', 50, type=int),
+            offset=request.args.get('offset', 0, type=int)
+        )
+        
+        return jsonify({
+            **page,
+            'status': 'success'
+        })
+        
+    except ValueError as e:
+        return jsonify({
+            'error': str(e),
+            'status': 'error'
+        }), 400
+    except Exception as e:
+        logger.error(f"Error getting anomalies: {str(e)}")
+        return jsonify({
+            'error': f'Error getting anomalies: {str(e)}',
+            'status': 'error'
+        }), 500
+
+def date_range_args():
+    """(start, end) ISO dates from the query string, validated"""
+    start = request.args.get('start')
+    end = request.args.get('end')
+    return (date.fromisoformat(start).isoformat() if start else None,
+            date.fromisoformat(end).isoformat() if end else None)
+
+@app.route('/analytics/distinct', methods=['GET'])
+def distinct_analytics():
+    """Count distinct selling and advertised products and active days, exactly or from sketches (?approx=true)"""
+    try:
+        start, end = date_range_args()
+        counts = sketch_analytics.distinct_products(
+            start=start,
+            end=end,
+            approx=request.args.get('approx', 'false').lower() == 'true'
+        )
+        
+        return jsonify({
+            'distinct': counts,
+            'status': 'success'
+        })
+        
+    except ValueError as e:
+        return jsonify({
+            'error': str(e),
+            'status': 'error'
+        }), 400
+    except Exception as e:
+        logger.error(f"Error counting distinct products: {str(e)}")
+        return jsonify({
+            'error': f'Error counting distinct products: {str(e)}',
+            'status': 'error'
+        }), 500
+
+@app.route('/analytics/quantiles', methods=['GET'])
+def quantile_analytics():
+    """Get quantiles (?q=0.5,0.9) of sales, CPC, RoAS or CTR, exactly or from sketches (?approx=true)"""
+    try:
+        start, end = date_range_args()
+        quantiles = sketch_analytics.quantiles(
+            metric=request.args.get('metric', 'cpc'),
+            qs=[float(q) for q in request.args.get('q', '0.5').split(',')],
+            start=start,
+            end=end,
+            approx=request.args.get('approx', 'false').lower() == 'true'
+        )
+        
+        return jsonify({
+            'quantiles': quantiles,
+            'status': 'success'
+        })
+        
+    except ValueError as e:
+        return jsonify({
+            'error': str(e),
+            'status': 'error'
+        }), 400
+    except Exception as e:
+        logger.error(f"Error computing quantiles: {str(e)}")
+        return jsonify({
+            'error': f'Error computing quantiles: {str(e)}',
+            'status': 'error'
+        }), 500
+
 @app.route('/visualizations/<chart_type>', methods=['GET'])
 def get_visualization(chart_type):
     """Get specific visualization charts"""
     try:
-        chart_data = None
-        
-        if chart_type == 'sales-trend':
-            chart_data = viz_engine.create_sales_trend_chart()
-        elif chart_type == 'top-products':
-            limit = request.args.get('limit', 10, type=int)
-            chart_data = viz_engine.create_top_products_chart(limit=limit)
-        elif chart_type == 'roas':
-            limit = request.args.get('limit', 15, type=int)
-            chart_data = viz_engine.create_roas_by_product_chart(limit=limit)
-        elif chart_type == 'eligibility':
-            chart_data = viz_engine.create_eligibility_pie_chart()
-        elif chart_type == 'ad-performance':
-            chart_data = viz_engine.create_ad_performance_scatter()
-        else:
+        if chart_type not in CHART_TYPES:
             return jsonify({
                 'error': 'Unknown chart type',
                 'status': 'error'
             }), 400
         
+        limit = request.args.get('limit')
+        if limit is not None:
+            limit = bind_params(CHART_QUERIES[chart_type], {'limit': limit})['limit']
+        chart_data, _ = visualization_flight.do((chart_type, limit), lambda: viz_engine.get_chart(chart_type, limit=limit))
+        
         if chart_data:
-            return jsonify({
-                'chart_data': chart_data,
+            return json_response({
+                'chart_data': raw_json(chart_data),
                 'status': 'success'
             })
         else:
@@ -216,6 +633,11 @@ def get_visualization(chart_type):
                 'status': 'error'
             }), 500
             
+    except ValueError as e:
+        return jsonify({
+            'error': str(e),
+            'status': 'error'
+        }), 400
     except Exception as e:
         logger.error(f"Error generating visualization: {str(e)}")
         return jsonify({
@@ -223,6 +645,136 @@ def get_visualization(chart_type):
             'status': 'error'
         }), 500
 
+@app.route('/ingest/<table>', methods=['POST'])
+def ingest_delta(table):
+    """Upsert a daily delta CSV (request body or multipart 'file') into eligibility, ad_sales or total_sales"""
+    denied = require_token(INGEST_TOKEN, 'INGEST_TOKEN')
+    if denied:
+        return denied
+    try:
+        stream = request.files['file'].stream if 'file' in request.files else request.stream
+        summary = delta_ingestor.ingest(table, stream)
+        return jsonify({
+            'ingest': summary,
+            'status': 'success'
+        })
+        
+    except DeltaValidationError as e:
+        return jsonify({
+            'error': str(e),
+            'errors': e.errors,
+            'status': 'error'
+        }), 422
+    except ValueError as e:
+        return jsonify({
+            'error': str(e),
+            'status': 'error'
+        }), 400
+    except Exception as e:
+        logger.error(f"Error ingesting delta: {str(e)}")
+        return jsonify({
+            'error': f'Ingest error: {str(e)}',
+            'status': 'error'
+        }), 500
+
+@app.route('/ingest/log', methods=['GET'])
+def ingest_log():
+    """Recent watched-file ingests and the directory watcher's queue state"""
+    watcher = get_watcher()
+    return jsonify({
+        'log': db_manager.get_ingest_log(request.args.get('limit', 50, type=int)),
+        'watcher': watcher.status() if watcher else None,
+        'status': 'success'
+    })
+
+@app.route('/admin/tenants/summary', methods=['GET'])
+def tenant_summary():
+    """Sales and ad metrics for every tenant shard and across all of them"""
+    denied = require_token(ADMIN_TOKEN, 'ADMIN_TOKEN')
+    if denied:
+        return denied
+    try:
+        return jsonify({
+            'summary': sharded_analytics.summary(),
+            'status': 'success'
+        })
+    except Exception as e:
+        logger.error(f"Error getting tenant summary: {str(e)}")
+        return jsonify({
+            'error': f'Error getting tenant summary: {str(e)}',
+            'status': 'error'
+        }), 500
+
+@app.route('/admin/tenants/daily', methods=['GET'])
+def tenant_daily():
+    """Daily metrics summed across every tenant shard"""
+    denied = require_token(ADMIN_TOKEN, 'ADMIN_TOKEN')
+    if denied:
+        return denied
+    try:
+        start, end = date_range_args()
+        return jsonify({
+            'daily': sharded_analytics.daily(start, end),
+            'status': 'success'
+        })
+    except ValueError as e:
+        return jsonify({
+            'error': str(e),
+            'status': 'error'
+        }), 400
+    except Exception as e:
+        logger.error(f"Error getting tenant daily metrics: {str(e)}")
+        return jsonify({
+            'error': f'Error getting tenant daily metrics: {str(e)}',
+            'status': 'error'
+        }), 500
+
+@app.route('/export', methods=['GET'])
+def export_results():
+    """Stream the full results of a saved question (?query_id=) or an analytics query (?query=)
+    as CSV, NDJSON or Parquet (?format=)"""
+    try:
+        fmt = request.args.get('format', 'csv').lower()
+        query_id = request.args.get('query_id', type=int)
+        name = request.args.get('query')
+        
+        if query_id is not None:
+            detail = db_manager.get_query_detail(query_id)
+            if not detail or not detail.get('sql_query'):
+                return jsonify({
+                    'error': 'Query not found',
+                    'status': 'error'
+                }), 404
+            sql_query = detail['sql_query']
+            filename = f"query-{query_id}"
+            params = None
+        elif name in FIXED_QUERIES:
+            sql_query = FIXED_QUERIES[name]
+            defaults = {'limit': 10, 'days': 30}
+            params = bind_params(name, {key: request.args.get(key, defaults[key]) for key in QUERY_PARAMS[name]})
+            filename = name
+        else:
+            return jsonify({
+                'error': f"Pass query_id or one of query={', '.join(FIXED_QUERIES)}",
+                'status': 'error'
+            }), 400
+        
+        chunks = exporter.export(sql_query, fmt, params)
+        return Response(chunks, mimetype=EXPORT_FORMATS[fmt],
+                        headers={'Content-Disposition': content_disposition(filename, fmt)})
+        
+    except ValueError as e:
+        return jsonify({
+            'error': str(e),
+            'status': 'error'
+        }), 400
+    except Exception as e:
+        logger.error(f"Error exporting results: {str(e)}")
+        return jsonify({
+            'error': f'Export error: {str(e)}',
+            'status': 'error'
+        }), 500
+
 @app.route('/history', methods=['GET'])
 def get_query_history():
     """Get query history with basic details"""
@@ -264,7 +816,7 @@ def get_query_detail(query_id):
 if __name__ == '__main__':
     # Initialize database with CSV data
     logger.info("Initializing database...")
-    db_manager.initialize_database()
+    run_ingest(db_manager)
     logger.info("Database initialized successfully")
     
     # Start Flask app
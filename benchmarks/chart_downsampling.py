@@ -0,0 +1,50 @@
+"""Payload size and render time of the large-series charts with and without downsampling.
+
+Run from the project root:
+    python -m benchmarks.chart_downsampling --sizes 1000 10000 100000
+"""
+import argparse
+import time
+
+import numpy as np
+import pandas as pd
+
+import visualization
+from benchmarks.chart_rendering import make_scatter_columns
+
+def make_trend_columns(points: int) -> dict:
+    """Synthetic daily sales series with `points` days"""
+    rng = np.random.default_rng(42)
+    dates = pd.date_range('2000-01-01', periods=points).strftime('%Y-%m-%d')
+    sales = 1000 + np.cumsum(rng.normal(0, 25, points))
+    return {'date': list(dates), 'daily_sales': list(sales)}
+
+def measure(renderer, columns: dict, point_budget: int) -> tuple:
+    """Render once with the given point budget; return (ms, bytes)"""
+    visualization.CHART_POINT_BUDGET = point_budget
+    start = time.perf_counter()
+    payload = renderer(columns)
+    return (time.perf_counter() - start) * 1000, len(payload)
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--sizes', type=int, nargs='+', default=[1000, 10000, 100000])
+    parser.add_argument('--budget', type=int, default=visualization.CHART_POINT_BUDGET)
+    args = parser.parse_args()
+
+    charts = {
+        'sales trend': (visualization.render_sales_trend_chart, make_trend_columns),
+        'ad scatter': (visualization.render_ad_performance_scatter, make_scatter_columns),
+    }
+
+    print(f"{'chart':<12} {'points':>8} {'full ms':>9} {'full KB':>9} {'sampled ms':>11} {'sampled KB':>11}")
+    for name, (renderer, make_columns) in charts.items():
+        for size in args.sizes:
+            columns = make_columns(size)
+            full_ms, full_bytes = measure(renderer, columns, point_budget=size + 1)
+            sampled_ms, sampled_bytes = measure(renderer, columns, point_budget=args.budget)
+            print(f"{name:<12} {size:>8,} {full_ms:>9.1f} {full_bytes / 1024:>9.1f} "
+                  f"{sampled_ms:>11.1f} {sampled_bytes / 1024:>11.1f}")
+
+if __name__ == '__main__':
+    main()
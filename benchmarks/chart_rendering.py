@@ -0,0 +1,73 @@
+"""Compare in-thread and process-pool chart rendering under concurrent load.
+
+Run from the project root:
+    python -m benchmarks.chart_rendering --points 20000 --concurrency 8 --requests 64
+"""
+import argparse
+import random
+import statistics
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from chart_pool import ChartRenderPool
+from visualization import render_ad_performance_scatter
+
+def make_scatter_columns(points: int) -> dict:
+    """Synthetic per-item ad performance data shaped like the scatter query output"""
+    rng = random.Random(42)
+    return {
+        'item_id': list(range(points)),
+        'total_spend': [rng.uniform(10, 500) for _ in range(points)],
+        'total_clicks': [rng.randint(1, 400) for _ in range(points)],
+        'total_conversions': [rng.randint(0, 40) for _ in range(points)],
+        'cpc': [rng.uniform(0.1, 8) for _ in range(points)],
+        'conversion_rate': [rng.uniform(0, 30) for _ in range(points)],
+    }
+
+def run(pool: ChartRenderPool, columns: dict, concurrency: int, requests: int) -> dict:
+    """Render the scatter `requests` times from `concurrency` threads"""
+    latencies = []
+
+    def one_request(_):
+        start = time.perf_counter()
+        pool.render(render_ad_performance_scatter, columns)
+        latencies.append(time.perf_counter() - start)
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as threads:
+        list(threads.map(one_request, range(requests)))
+    elapsed = time.perf_counter() - start
+
+    latencies.sort()
+    return {
+        'throughput_rps': requests / elapsed,
+        'p50_ms': statistics.median(latencies) * 1000,
+        'p95_ms': latencies[int(len(latencies) * 0.95) - 1] * 1000,
+    }
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--points', type=int, default=20000)
+    parser.add_argument('--concurrency', type=int, default=8)
+    parser.add_argument('--requests', type=int, default=64)
+    parser.add_argument('--workers', type=int, default=4)
+    args = parser.parse_args()
+
+    columns = make_scatter_columns(args.points)
+    modes = {
+        'in-thread': ChartRenderPool(max_workers=0),
+        f'process pool ({args.workers})': ChartRenderPool(max_workers=args.workers, max_pending=args.concurrency, timeout=60),
+    }
+
+    # Warm up the pool so process start-up isn't counted
+    modes[f'process pool ({args.workers})'].render(render_ad_performance_scatter, make_scatter_columns(10))
+
+    print(f"{args.points:,} points, {args.concurrency} concurrent clients, {args.requests} renders")
+    for name, pool in modes.items():
+        stats = run(pool, columns, args.concurrency, args.requests)
+        print(f"{name:>20}: {stats['throughput_rps']:7.2f} renders/s  "
+              f"p50 {stats['p50_ms']:8.1f} ms  p95 {stats['p95_ms']:8.1f} ms")
+        pool.shutdown()
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,60 @@
+"""Measure /dashboard payload size: double-encoded decimal JSON vs typed arrays, and compression.
+
+Needs an initialized database. Run from the project root:
+    python -m benchmarks.dashboard_payload
+"""
+import base64
+import gzip
+import json
+
+import numpy as np
+
+from app import app
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+def to_decimal_arrays(chart: dict) -> dict:
+    """Decode typed arrays back to plain lists, as fig.to_json() used to emit them"""
+    def decode(obj):
+        if isinstance(obj, dict):
+            if 'bdata' in obj and 'dtype' in obj:
+                array = np.frombuffer(base64.b64decode(obj['bdata']), dtype=np.dtype(obj['dtype']).newbyteorder('<'))
+                if 'shape' in obj:
+                    array = array.reshape([int(dim) for dim in obj['shape'].split(',')])
+                return array.tolist()
+            return {key: decode(value) for key, value in obj.items()}
+        if isinstance(obj, list):
+            return [decode(value) for value in obj]
+        return obj
+    return decode(chart)
+
+def report(label: str, body: bytes):
+    line = f"{label:<34} {len(body) / 1024:9.1f} KB  gzip {len(gzip.compress(body, 6)) / 1024:8.1f} KB"
+    if brotli is not None:
+        line += f"  br {len(brotli.compress(body, quality=5)) / 1024:8.1f} KB"
+    print(line)
+
+def main():
+    client = app.test_client()
+    response = client.get('/dashboard', headers={'Accept-Encoding': 'identity'})
+    current = response.get_data()
+    payload = json.loads(current)
+
+    legacy = dict(payload)
+    legacy['visualizations'] = {
+        name: json.dumps(to_decimal_arrays(chart)) if chart else None
+        for name, chart in payload['visualizations'].items()
+    }
+
+    report('legacy (string-embedded decimals)', json.dumps(legacy).encode())
+    report('current (embedded typed arrays)', current)
+
+    compressed = client.get('/dashboard', headers={'Accept-Encoding': 'br, gzip'})
+    print(f"served with Content-Encoding {compressed.headers.get('Content-Encoding')}: "
+          f"{len(compressed.get_data()) / 1024:.1f} KB on the wire")
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,92 @@
+"""Measure streaming export throughput and memory at millions of rows.
+
+Builds a synthetic ad_sales table in a scratch SQLite file, then exports it in
+each format in a fresh interpreter, next to the fully materialized
+execute_query + json.dumps path that raw_results takes. Run from the project root:
+    python -m benchmarks.export_throughput --rows 2000000
+"""
+import argparse
+import json
+import os
+import random
+import resource
+import sqlite3
+import subprocess
+import sys
+import time
+
+MODES = {
+    'csv': "streamed CSV",
+    'ndjson': "streamed NDJSON",
+    'parquet': "streamed Parquet (needs pyarrow)",
+    'materialized': "execute_query + json.dumps, as in raw_results",
+}
+
+def peak_rss_mb() -> float:
+    # ru_maxrss is in kilobytes on Linux
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+def build_database(path: str, rows: int):
+    """Fill a scratch database with rows of ad_sales-shaped data"""
+    if os.path.exists(path):
+        os.remove(path)
+    conn = sqlite3.connect(path)
+    conn.execute("""
+        CREATE TABLE ad_sales (date TEXT, item_id INTEGER, ad_sales REAL, impressions INTEGER,
+                               ad_spend REAL, clicks INTEGER, units_sold INTEGER)
+    """)
+    rng = random.Random(7)
+    batch = 100000
+    for start in range(0, rows, batch):
+        conn.executemany("INSERT INTO ad_sales VALUES (?, ?, ?, ?, ?, ?, ?)", [
+            (f"2025-{(i // 28) % 12 + 1:02d}-{i % 28 + 1:02d}", i % 5000, round(rng.uniform(0, 500), 2),
+             rng.randint(0, 5000), round(rng.uniform(0, 100), 2), rng.randint(0, 200), rng.randint(0, 20))
+            for i in range(start, min(start + batch, rows))
+        ])
+    conn.commit()
+    conn.close()
+
+def run_child(mode: str, chunk_rows: int):
+    """Export the table one way and print timing and memory as JSON"""
+    from database import DatabaseManager
+    from export import ResultExporter
+
+    sql = "SELECT * FROM ad_sales"
+    rows = DatabaseManager().execute_query("SELECT COUNT(*) AS n FROM ad_sales")[0]['n']
+    baseline = peak_rss_mb()
+    start = time.perf_counter()
+    if mode == 'materialized':
+        size = len(json.dumps(DatabaseManager().execute_query(sql)).encode())
+    else:
+        size = sum(len(chunk) for chunk in ResultExporter(chunk_rows).export(sql, mode))
+    elapsed = time.perf_counter() - start
+    print(json.dumps({'rows': rows, 'seconds': elapsed, 'mb': size / 1e6, 'rss_mb': peak_rss_mb() - baseline}))
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--rows', type=int, default=2000000)
+    parser.add_argument('--chunk-rows', type=int, default=10000)
+    parser.add_argument('--db', default='/tmp/export_benchmark.db')
+    parser.add_argument('--modes', default=','.join(MODES), help="comma-separated subset of " + ', '.join(MODES))
+    parser.add_argument('--child', choices=MODES, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child:
+        run_child(args.child, args.chunk_rows)
+        return
+
+    print(f"Building {args.rows:,} rows in {args.db}...")
+    build_database(args.db, args.rows)
+    env = {**os.environ, 'DATABASE_URL': f"sqlite:///{args.db}"}
+
+    print(f"{'mode':<14} {'rows':>11} {'seconds':>8} {'rows/s':>11} {'output MB':>10} {'peak RSS +MB':>13}  description")
+    for mode in args.modes.split(','):
+        output = subprocess.run([sys.executable, '-m', 'benchmarks.export_throughput', '--child', mode,
+                                 '--chunk-rows', str(args.chunk_rows)],
+                                check=True, capture_output=True, text=True, env=env).stdout
+        result = json.loads(output.strip().splitlines()[-1])
+        print(f"{mode:<14} {result['rows']:>11,} {result['seconds']:>8.2f} {result['rows'] / result['seconds']:>11,.0f} "
+              f"{result['mb']:>10.1f} {result['rss_mb']:>13.1f}  {MODES[mode]}")
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,56 @@
+"""Measure bound named queries against the same SQL with parameters inlined.
+
+Calls the parameterized fixed queries with a different limit/days on every
+call, the way chart and analytics requests arrive. With values inlined, each
+call has new statement text, so SQLAlchemy's compiled cache, sqlite3's
+statement cache and PostgreSQL plans can't be reused. With bound parameters
+the text never changes; on PostgreSQL the statements are also PREPAREd once
+per connection. Needs an initialized database (SQLite or PostgreSQL, from
+DATABASE_URL) and the query cache off. Run from the project root:
+    python -m benchmarks.named_queries --calls 2000
+"""
+import argparse
+import statistics
+import time
+
+from database import DatabaseManager
+from queries import FIXED_QUERIES, QUERY_PARAMS, run_fixed_query
+
+def inline(name: str, params: dict) -> str:
+    """The old f-string style: parameter values pasted into the SQL"""
+    sql = FIXED_QUERIES[name]
+    for key, value in params.items():
+        sql = sql.replace(f":{key}", str(int(value)))
+    return sql
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--calls', type=int, default=2000)
+    args = parser.parse_args()
+
+    db_manager = DatabaseManager()
+    names = [name for name in FIXED_QUERIES if QUERY_PARAMS[name]]
+    modes = {
+        'inlined': lambda name, params: db_manager.execute_query(inline(name, params), use_cache=False),
+        'bound': lambda name, params: run_fixed_query(db_manager, name, backend='sql', **params),
+    }
+
+    print(f"{'query':<22} {'mode':<8} {'mean ms':>8} {'p95 ms':>8}")
+    totals = {}
+    for name in names:
+        for mode, run in modes.items():
+            latencies = []
+            for call in range(args.calls):
+                params = {key: call % 200 + 1 for key in QUERY_PARAMS[name]}
+                start = time.perf_counter()
+                run(name, params)
+                latencies.append((time.perf_counter() - start) * 1000)
+            latencies.sort()
+            mean = statistics.fmean(latencies)
+            totals[mode] = totals.get(mode, 0) + mean
+            print(f"{name:<22} {mode:<8} {mean:>8.3f} {latencies[int(len(latencies) * 0.95)]:>8.3f}")
+    print(f"\nBound parameters: {(1 - totals['bound'] / totals['inlined']) * 100:.1f}% less time per call "
+          f"across {len(names)} queries ({'PostgreSQL' if db_manager.use_postgres else 'SQLite'})")
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,52 @@
+"""Measure memoized execute_query against uncached execution on the fixed analytics queries.
+
+Runs every fixed query repeatedly (as dashboard, chart and analytics requests
+do between ingests) with memoization off, with enough budget, and with a
+budget too small to hold them all. Needs an initialized database. Run from the
+project root:
+    python -m benchmarks.query_cache --rounds 50
+"""
+import argparse
+import time
+
+from database import DatabaseManager
+from queries import FIXED_QUERIES
+from query_cache import query_cache
+
+PARAMS = {'limit': 10, 'days': 30}
+
+def run_rounds(db_manager: DatabaseManager, rounds: int) -> float:
+    """Mean ms per round of all fixed queries"""
+    start = time.perf_counter()
+    for _ in range(rounds):
+        for sql in FIXED_QUERIES.values():
+            db_manager.execute_query(sql.format(**PARAMS))
+    return (time.perf_counter() - start) * 1000 / rounds
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--rounds', type=int, default=50)
+    args = parser.parse_args()
+
+    db_manager = DatabaseManager()
+    results = {}
+    # The small budget is half the working set: results over a quarter of it are
+    # not admitted, so the rest keep hitting instead of evicting each other
+    for label, budget in (('off', 0), ('16 MB', 16 << 20), ('small', None)):
+        query_cache.clear()
+        if budget is None:
+            query_cache.max_bytes = 16 << 20
+            run_rounds(db_manager, 1)
+            budget = query_cache.bytes * 2
+        query_cache.max_bytes = budget
+        query_cache.clear()
+        ms = run_rounds(db_manager, args.rounds)
+        stats = query_cache.stats()
+        results[label] = ms
+        hit_rate = f"{stats['hit_rate'] * 100:.1f}%" if stats['hit_rate'] is not None else '-'
+        print(f"cache {label:<6} budget {budget / 1024:>8.0f} KB  {ms:8.2f} ms/round  "
+              f"hit rate {hit_rate:>6}  evictions {stats['evictions']}")
+    print(f"\nSpeedup with a full budget: {results['off'] / results['16 MB']:.1f}x over {len(FIXED_QUERIES)} queries")
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,105 @@
+"""Compare approximate (sketch) answers with exact queries for speed and error.
+
+Builds synthetic total_sales and ad_sales tables in a scratch SQLite file,
+builds the per-day sketches, then answers distinct-product counts and CPC/RoAS
+quantiles both ways over the whole range and over the last 30 days. Run from
+the project root:
+    python -m benchmarks.sketch_accuracy --rows 1000000 --days 365
+"""
+import argparse
+import os
+import sqlite3
+import time
+from datetime import date, timedelta
+import numpy as np
+import pandas as pd
+from sqlalchemy import text
+
+QUANTILES = [0.5, 0.9, 0.99]
+
+def build_database(path: str, rows: int, days: int, items: int):
+    """Fill a scratch database with rows spread evenly over days"""
+    if os.path.exists(path):
+        os.remove(path)
+    rng = np.random.default_rng(7)
+    first_day = date(2025, 1, 1)
+    conn = sqlite3.connect(path)
+    conn.execute("CREATE TABLE total_sales (date TEXT, item_id INTEGER, total_sales REAL, total_units_ordered INTEGER)")
+    conn.execute("""
+        CREATE TABLE ad_sales (date TEXT, item_id INTEGER, ad_sales REAL, impressions INTEGER,
+                               ad_spend REAL, clicks INTEGER, units_sold INTEGER)
+    """)
+    day_names = [(first_day + timedelta(days=d)).isoformat() for d in range(days)]
+    batch = 200000
+    for start in range(0, rows, batch):
+        n = min(batch, rows - start)
+        day = rng.integers(0, days, n)
+        # Skewed item popularity, so distinct counts per day vary
+        item = np.minimum(rng.zipf(1.3, n), items)
+        clicks = rng.integers(0, 200, n)
+        spend = np.round(rng.lognormal(2, 1, n), 2)
+        conn.executemany("INSERT INTO total_sales VALUES (?, ?, ?, ?)", zip(
+            (day_names[d] for d in day), item.tolist(), np.round(rng.lognormal(4, 1, n), 2).tolist(),
+            rng.integers(1, 20, n).tolist()))
+        conn.executemany("INSERT INTO ad_sales VALUES (?, ?, ?, ?, ?, ?, ?)", zip(
+            (day_names[d] for d in day), item.tolist(), np.round(spend * rng.lognormal(1, 0.7, n), 2).tolist(),
+            (clicks * rng.integers(20, 100, n)).tolist(), spend.tolist(), clicks.tolist(), rng.integers(0, 20, n).tolist()))
+    conn.execute("CREATE INDEX idx_total_sales_date ON total_sales(date)")
+    conn.execute("CREATE INDEX idx_ad_sales_date ON ad_sales(date)")
+    conn.commit()
+    conn.close()
+    return day_names
+
+def timed(fn, repeat: int):
+    """Best-of-repeat wall time in ms, and the last result"""
+    best = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = fn()
+        elapsed = (time.perf_counter() - start) * 1000
+        best = elapsed if best is None else min(best, elapsed)
+    return best, result
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--rows', type=int, default=1000000)
+    parser.add_argument('--days', type=int, default=365)
+    parser.add_argument('--items', type=int, default=200000)
+    parser.add_argument('--repeat', type=int, default=3)
+    parser.add_argument('--db', default='/tmp/sketch_benchmark.db')
+    args = parser.parse_args()
+
+    print(f"Building {args.rows:,} rows per table over {args.days} days in {args.db}...")
+    day_names = build_database(args.db, args.rows, args.days, args.items)
+    os.environ['DATABASE_URL'] = f"sqlite:///{args.db}"
+    from sketches import SketchAnalytics, SKETCHES
+    analytics = SketchAnalytics()
+
+    start = time.perf_counter()
+    analytics.materialize_daily_sketches(1)
+    print(f"Built daily sketches in {time.perf_counter() - start:.1f}s")
+
+    ranges = {'all days': (None, None), 'last 30 days': (day_names[-30], day_names[-1])}
+    print(f"\n{'query':<34} {'range':<13} {'exact ms':>9} {'approx ms':>10}  error")
+    for label, (start, end) in ranges.items():
+        exact_ms, exact = timed(lambda: analytics.distinct_products(start, end), args.repeat)
+        approx_ms, approx = timed(lambda: analytics.distinct_products(start, end, approx=True), args.repeat)
+        for name in ('active_products', 'advertised_products'):
+            true, estimate = exact['counts'][name]['value'], approx['counts'][name]['value']
+            print(f"{'distinct ' + name:<34} {label:<13} {exact_ms:>9.1f} {approx_ms:>10.1f}  "
+                  f"{(estimate - true) / true * 100:+.2f}% (bound ±{approx['error']['relative_error'] * 200:.1f}% at 95%)")
+
+        for metric in ('cpc', 'roas'):
+            exact_ms, exact = timed(lambda: analytics.quantiles(metric, QUANTILES, start, end), args.repeat)
+            approx_ms, approx = timed(lambda: analytics.quantiles(metric, QUANTILES, start, end, approx=True), args.repeat)
+            # Rank error: where the approximate value falls in the exact distribution
+            filter_sql, params = analytics._range_filter(start, end)
+            with analytics.db_manager.engine.connect() as conn:
+                values = np.sort(pd.read_sql(text(SKETCHES[metric][1].format(filter=filter_sql)), conn, params=params)['value'].to_numpy())
+            errors = [abs(np.searchsorted(values, result['value'], side='right') / len(values) - result['q'])
+                      for result in approx['quantiles']]
+            print(f"{metric + ' p50/p90/p99':<34} {label:<13} {exact_ms:>9.1f} {approx_ms:>10.1f}  "
+                  f"max rank error {max(errors) * 100:.2f}% (bound {approx['error']['rank_error'] * 100:.2f}% at 99%)")
+
+if __name__ == '__main__':
+    main()
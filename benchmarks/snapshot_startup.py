@@ -0,0 +1,75 @@
+"""Compare startup time and memory of loading the fact tables from CSV vs an Arrow snapshot.
+
+Each mode runs in a fresh interpreter so peak RSS is not shared between them.
+Needs a snapshot (python snapshots.py export). Run from the project root:
+    python -m benchmarks.snapshot_startup
+"""
+import argparse
+import json
+import resource
+import subprocess
+import sys
+import time
+
+MODES = {
+    'csv': "read the source CSVs with pandas",
+    'csv+columnar': "read the source CSVs and build the columnar store",
+    'snapshot': "memory-map the snapshot tables",
+    'snapshot+columnar': "build the columnar store from the memory-mapped snapshot",
+}
+
+def peak_rss_mb() -> float:
+    # ru_maxrss is in kilobytes on Linux
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+def run_child(mode: str):
+    """Load the tables one way and print timing and memory as JSON"""
+    import pandas as pd
+    from columnar import ColumnarStore
+    from database import CSV_FILES
+    from snapshots import open_snapshot
+
+    baseline = peak_rss_mb()
+    start = time.perf_counter()
+    if mode.startswith('csv'):
+        tables = {
+            'eligibility': pd.read_csv(CSV_FILES['eligibility'], dtype={'eligibility': str}),
+            'ad_sales': pd.read_csv(CSV_FILES['ad_sales']),
+            'total_sales': pd.read_csv(CSV_FILES['total_sales']),
+        }
+        rows = sum(len(df) for df in tables.values())
+        if mode == 'csv+columnar':
+            ColumnarStore(tables['total_sales'], tables['ad_sales'], tables['eligibility'])
+    else:
+        snapshot = open_snapshot()
+        if snapshot is None:
+            sys.exit("No snapshot found; run `python snapshots.py export` first")
+        rows = sum(snapshot.table(name).num_rows for name in ('total_sales', 'ad_sales', 'eligibility'))
+        if mode == 'snapshot+columnar':
+            ColumnarStore.from_snapshot(snapshot)
+    elapsed = time.perf_counter() - start
+
+    print(json.dumps({'rows': rows, 'ms': elapsed * 1000, 'rss_mb': peak_rss_mb() - baseline}))
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--repeat', type=int, default=3, help="runs per mode (best time is reported)")
+    parser.add_argument('--child', choices=MODES, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child:
+        run_child(args.child)
+        return
+
+    print(f"{'mode':<20} {'rows':>8} {'best ms':>9} {'peak RSS +MB':>13}  description")
+    for mode, description in MODES.items():
+        results = []
+        for _ in range(args.repeat):
+            output = subprocess.run([sys.executable, '-m', 'benchmarks.snapshot_startup', '--child', mode],
+                                    check=True, capture_output=True, text=True).stdout
+            results.append(json.loads(output.strip().splitlines()[-1]))
+        best = min(results, key=lambda result: result['ms'])
+        print(f"{mode:<20} {best['rows']:>8,} {best['ms']:>9.1f} {best['rss_mb']:>13.1f}  {description}")
+
+if __name__ == '__main__':
+    main()
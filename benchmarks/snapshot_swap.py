@@ -0,0 +1,170 @@
+"""Check that a read node swaps database snapshots without downtime or torn reads.
+
+Builds a primary SQLite database in --dir from the source CSVs. Ingest
+publishes the first database snapshot, and a read node is started as a
+subprocess with SERVE_SNAPSHOTS=true. Its threads query the snapshot
+continuously while the primary applies --swaps delta ingests and publishes a
+snapshot after each one. Every result the reader saw must match the primary's
+total for the data version it reported. Each reader thread's versions must
+never go backwards, no query may fail, and the reader must end on the last
+version. Also reports query latency and how long each swap took to be picked
+up. Exits non-zero on any failure. Run from the project root:
+    python -m benchmarks.snapshot_swap --swaps 5
+"""
+import argparse
+import json
+import math
+import os
+import shutil
+import subprocess
+import sys
+import threading
+import time
+
+PROBE = """
+    SELECT (SELECT MAX(version) FROM data_version) AS version, SUM(total_sales) AS total
+    FROM total_sales
+"""
+
+def run_reader(args):
+    """Read node: query the served snapshot from several threads until --duration is up"""
+    from database import DatabaseManager
+    from snapshots import SnapshotFollower
+
+    follower = SnapshotFollower(args.snapshots, interval=args.poll)
+    follower.wait_for_snapshot(timeout=30)
+    follower.start()
+    db_manager = DatabaseManager()
+    print("READY", flush=True)
+
+    deadline = time.time() + args.duration
+    threads_seen, latencies, errors = [], [], []
+    first_seen = {}
+
+    def query_loop():
+        seen = []
+        while time.time() < deadline:
+            start = time.perf_counter()
+            try:
+                row = db_manager.execute_query(PROBE, use_cache=False)[0]
+            except Exception as e:
+                errors.append(str(e))
+                continue
+            latencies.append((time.perf_counter() - start) * 1000)
+            first_seen.setdefault(row['version'], time.time())
+            if not seen or seen[-1][0] != row['version'] or seen[-1][1] != row['total']:
+                seen.append((row['version'], row['total']))
+        threads_seen.append(seen)
+
+    threads = [threading.Thread(target=query_loop) for _ in range(args.threads)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    follower.stop()
+    latencies.sort()
+    print("RESULT " + json.dumps({
+        'threads': threads_seen,
+        'errors': errors[:5],
+        'error_count': len(errors),
+        'queries': len(latencies),
+        'p50_ms': latencies[len(latencies) // 2] if latencies else None,
+        'p99_ms': latencies[int(len(latencies) * 0.99)] if latencies else None,
+        'max_ms': latencies[-1] if latencies else None,
+        'first_seen': first_seen,
+        'final_version': follower.version,
+    }), flush=True)
+
+def bump_first_day(conn):
+    """Delta: add 1 to every sale on the first day"""
+    from sqlalchemy import text
+    day = conn.execute(text("SELECT MIN(date) FROM total_sales")).scalar()
+    items = {row[0] for row in conn.execute(text("SELECT item_id FROM total_sales WHERE date = :day"), {'day': day})}
+    conn.execute(text("UPDATE total_sales SET total_sales = total_sales + 1 WHERE date = :day"), {'day': day})
+    return {'total_sales': {'date': {day}, 'item_id': items}}
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--swaps', type=int, default=5)
+    parser.add_argument('--every', type=float, default=2.0, help="seconds between published versions")
+    parser.add_argument('--threads', type=int, default=4, help="reader query threads")
+    parser.add_argument('--poll', type=float, default=0.2, help="reader SNAPSHOT_POLL_INTERVAL")
+    parser.add_argument('--dir', default='/tmp/snapshot_swap')
+    parser.add_argument('--reader', action='store_true', help=argparse.SUPPRESS)
+    parser.add_argument('--snapshots', help=argparse.SUPPRESS)
+    parser.add_argument('--duration', type=float, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+    if args.reader:
+        return run_reader(args)
+
+    shutil.rmtree(args.dir, ignore_errors=True)
+    os.makedirs(args.dir)
+    snapshot_dir = os.path.join(args.dir, 'snapshots')
+    os.environ.update({'DATABASE_URL': f"sqlite:///{args.dir}/primary.db", 'SNAPSHOT_DIR': snapshot_dir,
+                       'SNAPSHOT_EXPORT': 'false', 'WARMUP': 'false'})
+    os.environ.pop('SERVE_SNAPSHOTS', None)
+    from database import DatabaseManager
+    from ingest import run_ingest
+    from snapshots import publish_database_snapshot
+
+    db_manager = DatabaseManager()
+    expected = {run_ingest(db_manager): db_manager.execute_query(PROBE, use_cache=False)[0]['total']}
+    print(f"Primary at data version {min(expected)}, snapshot published to {snapshot_dir}")
+
+    reader = subprocess.Popen(
+        [sys.executable, '-m', 'benchmarks.snapshot_swap', '--reader', '--snapshots', snapshot_dir,
+         '--duration', str(args.swaps * args.every + 3), '--threads', str(args.threads), '--poll', str(args.poll)],
+        env={**os.environ, 'SERVE_SNAPSHOTS': 'true', 'DATABASE_URL': f"sqlite:///{args.dir}/unused.db"},
+        stdout=subprocess.PIPE, text=True)
+    while reader.stdout.readline().strip() != 'READY':
+        if reader.poll() is not None:
+            print("❌ Reader failed to start")
+            sys.exit(1)
+
+    published = {}
+    for _ in range(args.swaps):
+        time.sleep(args.every)
+        version = db_manager.ingest_delta(bump_first_day)
+        expected[version] = db_manager.execute_query(PROBE, use_cache=False)[0]['total']
+        start = time.perf_counter()
+        publish_database_snapshot(db_manager, version, directory=snapshot_dir)
+        published[version] = time.time()
+        print(f"  published version {version} in {(time.perf_counter() - start) * 1000:.0f} ms")
+
+    result = None
+    for line in reader.stdout:
+        if line.startswith('RESULT '):
+            result = json.loads(line[len('RESULT '):])
+    reader.wait()
+    if result is None:
+        print("❌ Reader produced no result")
+        sys.exit(1)
+
+    problems = []
+    for seen in result['threads']:
+        versions = [version for version, _ in seen]
+        if versions != sorted(versions):
+            problems.append(f"versions went backwards: {versions}")
+        for version, total in seen:
+            if not math.isclose(total, expected[version], rel_tol=1e-12):
+                problems.append(f"version {version} read total {total}, primary had {expected[version]}")
+    if result['error_count']:
+        problems.append(f"{result['error_count']} failed queries, e.g. {result['errors'][0]}")
+    if result['final_version'] != max(expected):
+        problems.append(f"reader ended on version {result['final_version']}, last published {max(expected)}")
+
+    lags = [result['first_seen'][str(version)] - at for version, at in published.items()
+            if str(version) in result['first_seen']]
+    print(f"\nReader: {result['queries']:,} queries on {args.threads} threads, {result['error_count']} errors, "
+          f"p50 {result['p50_ms']:.2f} ms, p99 {result['p99_ms']:.2f} ms, max {result['max_ms']:.2f} ms")
+    if lags:
+        print(f"Swap picked up {sum(lags) / len(lags) * 1000:.0f} ms after publishing on average "
+              f"(max {max(lags) * 1000:.0f} ms, poll interval {args.poll * 1000:.0f} ms)")
+    for problem in problems:
+        print(f"❌ {problem}")
+    print("✅ Every read matched its snapshot's version and no query failed" if not problems
+          else f"{len(problems)} problems found")
+    sys.exit(1 if problems else 0)
+
+if __name__ == '__main__':
+    main()
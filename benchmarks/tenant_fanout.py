@@ -0,0 +1,105 @@
+"""Check and time cross-tenant scatter-gather over local SQLite shards.
+
+Splits the source CSVs into --tenants shards by item id, one SQLite file per
+tenant. It then checks that the merged /admin/tenants summary and daily
+series equal the same metrics computed over the unsplit data. RoAS, CPC and
+CTR must come from summed numerators and denominators. It also checks that a
+broken shard is reported without changing the other tenants' numbers, and
+times the parallel fan-out against querying the shards one by one. Exits
+non-zero on any mismatch. Run from the project root:
+    python -m benchmarks.tenant_fanout --tenants 8
+"""
+import argparse
+import math
+import os
+import shutil
+import sys
+import time
+
+import pandas as pd
+
+def build_shards(directory: str, tenants: int):
+    """Write each tenant's slice of the source CSVs into its own SQLite file; returns the full frames"""
+    from database import CSV_FILES, DatabaseManager
+    frames = {table: pd.read_csv(path, dtype={'eligibility': str}) for table, path in CSV_FILES.items()}
+    for index in range(tenants):
+        shard = DatabaseManager(f"seller_{index}")
+        for table, df in frames.items():
+            df[df['item_id'] % tenants == index].to_sql(table, shard.engine, index=False, if_exists='replace')
+        shard.engine.dispose()
+    return frames
+
+def expected_metrics(frames) -> dict:
+    """Business metrics over the unsplit data, straight from pandas"""
+    sales = frames['total_sales'][frames['total_sales']['total_sales'] > 0]
+    ads = frames['ad_sales'][frames['ad_sales']['ad_spend'] > 0]
+    return {
+        'total_sales': sales['total_sales'].sum(),
+        'active_products': sales['item_id'].nunique(),
+        'avg_sales_per_transaction': sales['total_sales'].mean(),
+        'roas': ads['ad_sales'].sum() / ads['ad_spend'].sum(),
+        'cpc': ads['ad_spend'].sum() / ads['clicks'].sum(),
+        'ctr': ads['clicks'].sum() * 100.0 / ads['impressions'].sum(),
+    }
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--tenants', type=int, default=8)
+    parser.add_argument('--dir', default='/tmp/tenant_shards')
+    parser.add_argument('--repeat', type=int, default=5)
+    args = parser.parse_args()
+
+    shutil.rmtree(args.dir, ignore_errors=True)
+    os.environ['TENANT_DATABASE_URL'] = f"sqlite:///{args.dir}/{{tenant}}.db"
+    os.environ.pop('TENANTS', None)
+    from tenants import ShardedAnalytics, PARTIAL_QUERIES, get_tenant_manager, list_tenants
+
+    frames = build_shards(args.dir, args.tenants)
+    print(f"Built {args.tenants} shards in {args.dir}: {', '.join(list_tenants())}")
+    problems = []
+
+    analytics = ShardedAnalytics()
+    summary = analytics.summary()
+    expected = expected_metrics(frames)
+    for metric, value in expected.items():
+        merged = summary['totals'][metric]
+        status = 'ok' if math.isclose(merged, value, rel_tol=1e-9) else 'MISMATCH'
+        if status != 'ok':
+            problems.append(metric)
+        print(f"  {metric:<26} merged {merged:>14.4f}  unsplit {value:>14.4f}  {status}")
+    # A mean of per-tenant RoAS is what summing numerators and denominators avoids
+    mean_roas = sum(tenant['roas'] for tenant in summary['tenants'].values()) / len(summary['tenants'])
+    print(f"  (mean of per-tenant RoAS would be {mean_roas:.4f})")
+
+    daily = analytics.daily()
+    unsplit = frames['total_sales'].groupby('date')['total_sales'].sum()
+    daily_ok = all(math.isclose(row['total_sales'], unsplit[row['date']], rel_tol=1e-9) for row in daily['series'])
+    daily_ok = daily_ok and len(daily['series']) == len(unsplit)
+    print(f"  daily series: {len(daily['series'])} days, {'ok' if daily_ok else 'MISMATCH'}")
+    if not daily_ok:
+        problems.append('daily')
+
+    # An empty shard has no tables: it must be reported and leave the totals alone
+    healthy = [f"seller_{index}" for index in range(args.tenants)]
+    degraded = ShardedAnalytics(healthy + ['seller_broken']).summary()
+    isolated = set(degraded['failed']) == {'seller_broken'} and degraded['totals'] == summary['totals']
+    print(f"  broken shard: failed={sorted(degraded['failed'])}, totals unchanged: {isolated}")
+    if not isolated:
+        problems.append('failure isolation')
+
+    timings = {}
+    for label, run in (('sequential', lambda: [get_tenant_manager(tenant).execute_query(query)
+                                                for query in PARTIAL_QUERIES.values() for tenant in healthy]),
+                       ('parallel', lambda: ShardedAnalytics(healthy).summary())):
+        start = time.perf_counter()
+        for _ in range(args.repeat):
+            run()
+        timings[label] = (time.perf_counter() - start) * 1000 / args.repeat
+    print(f"\nSummary over {args.tenants} shards: {timings['sequential']:.1f} ms sequential, "
+          f"{timings['parallel']:.1f} ms fanned out ({os.cpu_count()} CPUs)")
+
+    print("✅ Scatter-gather matches the unsplit data" if not problems else f"❌ Mismatches: {', '.join(problems)}")
+    sys.exit(1 if problems else 0)
+
+if __name__ == '__main__':
+    main()
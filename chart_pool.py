@@ -0,0 +1,79 @@
+import atexit
+import logging
+import multiprocessing
+import os
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures import TimeoutError as FutureTimeoutError
+from typing import Callable, Dict, Any, Optional
+
+logger = logging.getLogger(__name__)
+
+class ChartRenderPool:
+    """Offloads Plotly figure construction and serialization to worker processes.
+
+    Building a figure and calling fig.to_json() is pure CPU work that holds the
+    GIL, so rendering on the request thread stalls every other request served by
+    the same worker. Renderers are module-level functions that take plain column
+    data and return the figure JSON, which keeps the pickled payload small.
+    """
+
+    def __init__(self, max_workers: int = None, max_pending: int = None, timeout: float = None):
+        self.max_workers = max_workers if max_workers is not None else int(os.environ.get("CHART_RENDER_WORKERS", 0))
+        self.max_pending = max_pending if max_pending is not None else int(os.environ.get("CHART_RENDER_MAX_PENDING", max(self.max_workers * 4, 1)))
+        self.timeout = timeout if timeout is not None else float(os.environ.get("CHART_RENDER_TIMEOUT", 10))
+
+        self._executor = None
+        self._executor_lock = threading.Lock()
+        # Bounds the number of renders queued or running in the pool
+        self._slots = threading.BoundedSemaphore(self.max_pending)
+
+    @property
+    def enabled(self) -> bool:
+        return self.max_workers > 0
+
+    def render(self, renderer: Callable[..., str], columns: Dict[str, list], **params: Any) -> str:
+        """Run a renderer in the pool (or in-thread when the pool is disabled)"""
+        if not self.enabled:
+            return renderer(columns, **params)
+
+        if not self._slots.acquire(timeout=self.timeout):
+            raise TimeoutError(f"Chart render queue full ({self.max_pending} pending)")
+        try:
+            future = self._get_executor().submit(renderer, columns, **params)
+            try:
+                return future.result(timeout=self.timeout)
+            except FutureTimeoutError:
+                future.cancel()
+                raise TimeoutError(f"Chart render timed out after {self.timeout:.1f}s")
+        finally:
+            self._slots.release()
+
+    def shutdown(self):
+        """Stop the worker processes"""
+        with self._executor_lock:
+            if self._executor is not None:
+                self._executor.shutdown(wait=False, cancel_futures=True)
+                self._executor = None
+
+    def _get_executor(self) -> ProcessPoolExecutor:
+        """Start the worker processes on first use"""
+        with self._executor_lock:
+            if self._executor is None:
+                # spawn rather than fork: request workers are multi-threaded
+                context = multiprocessing.get_context(os.environ.get("CHART_RENDER_START_METHOD", "spawn"))
+                self._executor = ProcessPoolExecutor(max_workers=self.max_workers, mp_context=context)
+                logger.info(f"Started chart render pool with {self.max_workers} processes")
+            return self._executor
+
+_render_pool: Optional[ChartRenderPool] = None
+_render_pool_lock = threading.Lock()
+
+def get_render_pool() -> ChartRenderPool:
+    """Get the process-wide chart render pool"""
+    global _render_pool
+    with _render_pool_lock:
+        if _render_pool is None:
+            _render_pool = ChartRenderPool()
+            atexit.register(_render_pool.shutdown)
+        return _render_pool
@@ -0,0 +1,305 @@
+import logging
+import threading
+import time
+import numpy as np
+import pandas as pd
+from typing import List, Dict, Any, Optional
+from sqlalchemy import text
+from database import DatabaseManager
+from snapshots import Snapshot, pa, snapshot_path_for_version
+
+logger = logging.getLogger(__name__)
+
+def _day_numbers(dates: pd.Series) -> np.ndarray:
+    """Dates as integer days since the Unix epoch"""
+    return pd.to_datetime(dates).to_numpy(dtype='datetime64[D]').astype(np.int64)
+
+def _sums(keys: np.ndarray, values: np.ndarray, size: int) -> np.ndarray:
+    return np.bincount(keys, weights=values, minlength=size)
+
+def _ratio(numerator, denominator, scale: float = 1.0):
+    """CASE WHEN denominator > 0 THEN numerator * scale / denominator ELSE 0 END, elementwise"""
+    numerator = np.asarray(numerator, dtype=float)
+    denominator = np.asarray(denominator, dtype=float)
+    safe = np.where(denominator > 0, denominator, 1.0)
+    return np.where(denominator > 0, numerator * scale / safe, 0.0)
+
+class ColumnarStore:
+    """The three fact tables as NumPy arrays, answering the fixed dashboard queries in-process.
+
+    Item ids are dictionary-encoded to dense codes and dates stored as integer
+    day numbers, so every GROUP BY becomes an np.bincount over those codes.
+    Each query method returns rows shaped exactly like the SQL in queries.py.
+    """
+
+    def __init__(self, total_sales: pd.DataFrame, ad_sales: pd.DataFrame, eligibility: pd.DataFrame, version: int = 0):
+        self.version = version
+
+        self.item_ids, item_codes = np.unique(
+            np.concatenate([total_sales['item_id'].to_numpy(), ad_sales['item_id'].to_numpy(),
+                            eligibility['item_id'].to_numpy()]),
+            return_inverse=True
+        )
+        self.n_items = len(self.item_ids)
+        ts_end = len(total_sales)
+        ads_end = ts_end + len(ad_sales)
+
+        ts_days = _day_numbers(total_sales['date'])
+        ads_days = _day_numbers(ad_sales['date'])
+        all_days = np.concatenate([ts_days, ads_days])
+        self.first_day = int(all_days.min()) if len(all_days) else 0
+        self.n_days = int(all_days.max()) - self.first_day + 1 if len(all_days) else 0
+
+        self.ts_item = item_codes[:ts_end]
+        self.ts_day = ts_days - self.first_day
+        self.ts_sales = total_sales['total_sales'].to_numpy(dtype=float)
+        self.ts_units = total_sales['total_units_ordered'].to_numpy(dtype=float)
+
+        self.ads_item = item_codes[ts_end:ads_end]
+        self.ads_day = ads_days - self.first_day
+        self.ads_sales = ad_sales['ad_sales'].to_numpy(dtype=float)
+        self.ads_spend = ad_sales['ad_spend'].to_numpy(dtype=float)
+        self.ads_impressions = ad_sales['impressions'].to_numpy(dtype=float)
+        self.ads_clicks = ad_sales['clicks'].to_numpy(dtype=float)
+        self.ads_units = ad_sales['units_sold'].to_numpy(dtype=float)
+
+        self._build_latest_eligibility(item_codes[ads_end:], eligibility)
+
+    @classmethod
+    def from_database(cls, db_manager: DatabaseManager) -> 'ColumnarStore':
+        """Load the fact tables from the database"""
+        version = db_manager.get_data_version()
+        with db_manager.engine.connect() as conn:
+            tables = {
+                table: pd.read_sql(text(f"SELECT * FROM {table}"), conn)
+                for table in ('total_sales', 'ad_sales', 'eligibility')
+            }
+        return cls(tables['total_sales'], tables['ad_sales'], tables['eligibility'], version)
+
+    @classmethod
+    def from_snapshot(cls, snapshot: Snapshot) -> 'ColumnarStore':
+        """Load the fact tables from a memory-mapped Arrow snapshot instead of querying the database"""
+        return cls(snapshot.to_pandas('total_sales'), snapshot.to_pandas('ad_sales'),
+                   snapshot.to_pandas('eligibility'), snapshot.version)
+
+    def _build_latest_eligibility(self, item_codes: np.ndarray, eligibility: pd.DataFrame):
+        """Distinct (item, eligibility) pairs at each item's latest eligibility timestamp"""
+        # Timestamps are compared as text, like MAX(eligibility_datetime_utc) in SQL
+        _, timestamp_rank = np.unique(eligibility['eligibility_datetime_utc'].astype(str).to_numpy(), return_inverse=True)
+        latest_rank = np.full(self.n_items, -1)
+        np.maximum.at(latest_rank, item_codes, timestamp_rank)
+        latest = timestamp_rank == latest_rank[item_codes]
+
+        values = eligibility['eligibility'].to_numpy(dtype=object)[latest]
+        self.eligibility_values, value_codes = np.unique(values.astype(str), return_inverse=True)
+        pairs = np.unique(item_codes[latest] * len(self.eligibility_values) + value_codes)
+        self.latest_item = pairs // max(len(self.eligibility_values), 1)
+        self.latest_value = pairs % max(len(self.eligibility_values), 1)
+
+    def _date(self, day: int) -> str:
+        return str(np.datetime64(self.first_day + int(day), 'D'))
+
+    def run(self, name: str, **params: Any) -> List[Dict[str, Any]]:
+        """Answer a fixed query by name"""
+        return getattr(self, name)(**params)
+
+    # --- business summary -------------------------------------------------
+
+    def business_sales(self) -> List[Dict[str, Any]]:
+        mask = self.ts_sales > 0
+        sales = self.ts_sales[mask]
+        if not len(sales):
+            return [{'total_revenue': None, 'total_units': None, 'active_products': 0,
+                     'avg_sales_per_transaction': None, 'active_days': 0}]
+        return [{
+            'total_revenue': float(sales.sum()),
+            'total_units': int(self.ts_units[mask].sum()),
+            'active_products': int(np.count_nonzero(np.bincount(self.ts_item[mask], minlength=self.n_items))),
+            'avg_sales_per_transaction': float(sales.mean()),
+            'active_days': int(np.count_nonzero(np.bincount(self.ts_day[mask], minlength=self.n_days))),
+        }]
+
+    def business_ads(self) -> List[Dict[str, Any]]:
+        mask = self.ads_spend > 0
+        if not mask.any():
+            return [{'total_ad_revenue': None, 'total_ad_spend': None, 'total_impressions': None,
+                     'total_clicks': None, 'total_ad_units': None, 'overall_roas': 0, 'avg_cpc': 0,
+                     'overall_ctr': 0, 'overall_conversion_rate': 0}]
+        sales, spend = self.ads_sales[mask].sum(), self.ads_spend[mask].sum()
+        impressions, clicks = self.ads_impressions[mask].sum(), self.ads_clicks[mask].sum()
+        units = self.ads_units[mask].sum()
+        return [{
+            'total_ad_revenue': float(sales),
+            'total_ad_spend': float(spend),
+            'total_impressions': int(impressions),
+            'total_clicks': int(clicks),
+            'total_ad_units': int(units),
+            'overall_roas': float(_ratio(sales, spend)),
+            'avg_cpc': float(_ratio(spend, clicks)),
+            'overall_ctr': float(_ratio(clicks, impressions, 100.0)),
+            'overall_conversion_rate': float(_ratio(units, clicks, 100.0)),
+        }]
+
+    def business_eligibility(self) -> List[Dict[str, Any]]:
+        total = len(self.latest_item)
+        eligible = int(np.count_nonzero(self.eligibility_values[self.latest_value] == 'TRUE')) if total else None
+        return [{
+            'eligible_products': eligible,
+            'total_products_checked': total,
+            'eligibility_rate': eligible * 100.0 / total if total else None,
+        }]
+
+    # --- time based analysis ----------------------------------------------
+
+    def daily_sales(self, days: int) -> List[Dict[str, Any]]:
+        mask = self.ts_sales > 0
+        day, item = self.ts_day[mask], self.ts_item[mask]
+        row_counts = np.bincount(day, minlength=self.n_days)
+        sales = _sums(day, self.ts_sales[mask], self.n_days)
+        units = _sums(day, self.ts_units[mask], self.n_days)
+        distinct_items = np.bincount(np.unique(day * self.n_items + item) // self.n_items, minlength=self.n_days)
+        present = np.flatnonzero(row_counts)[::-1][:days]
+        return [{'date': self._date(d), 'daily_sales': float(sales[d]), 'daily_units': int(units[d]),
+                 'active_products': int(distinct_items[d])} for d in present]
+
+    def daily_ad_performance(self, days: int) -> List[Dict[str, Any]]:
+        mask = self.ads_spend > 0
+        day = self.ads_day[mask]
+        row_counts = np.bincount(day, minlength=self.n_days)
+        sales = _sums(day, self.ads_sales[mask], self.n_days)
+        spend = _sums(day, self.ads_spend[mask], self.n_days)
+        impressions = _sums(day, self.ads_impressions[mask], self.n_days)
+        clicks = _sums(day, self.ads_clicks[mask], self.n_days)
+        roas = _ratio(sales, spend)
+        present = np.flatnonzero(row_counts)[::-1][:days]
+        return [{'date': self._date(d), 'daily_ad_sales': float(sales[d]), 'daily_ad_spend': float(spend[d]),
+                 'daily_impressions': int(impressions[d]), 'daily_clicks': int(clicks[d]),
+                 'daily_roas': float(roas[d])} for d in present]
+
+    # --- product performance ----------------------------------------------
+
+    def product_performance(self) -> List[Dict[str, Any]]:
+        """Per-product metrics with the SQL's join semantics.
+
+        total_sales LEFT JOIN ad_sales ON item_id pairs every sales row with every
+        ad row of the item, so sales sums are multiplied by the item's ad row count
+        and ad sums by its (filtered) sales row count.
+        """
+        mask = self.ts_sales > 0
+        ts_rows = np.bincount(self.ts_item[mask], minlength=self.n_items)
+        ts_sales = _sums(self.ts_item[mask], self.ts_sales[mask], self.n_items)
+        ts_units = _sums(self.ts_item[mask], self.ts_units[mask], self.n_items)
+
+        ad_rows = np.bincount(self.ads_item, minlength=self.n_items)
+        ad_sums = {
+            'ad_revenue': _sums(self.ads_item, self.ads_sales, self.n_items) * ts_rows,
+            'ad_spend': _sums(self.ads_item, self.ads_spend, self.n_items) * ts_rows,
+            'impressions': _sums(self.ads_item, self.ads_impressions, self.n_items) * ts_rows,
+            'clicks': _sums(self.ads_item, self.ads_clicks, self.n_items) * ts_rows,
+            'ad_units': _sums(self.ads_item, self.ads_units, self.n_items) * ts_rows,
+        }
+        multiplier = np.maximum(ad_rows, 1)
+        total_revenue = ts_sales * multiplier
+        total_units = ts_units * multiplier
+        roas = _ratio(ad_sums['ad_revenue'], ad_sums['ad_spend'])
+        cpc = _ratio(ad_sums['ad_spend'], ad_sums['clicks'])
+        ctr = _ratio(ad_sums['clicks'], ad_sums['impressions'], 100.0)
+        conversion_rate = _ratio(ad_sums['ad_units'], ad_sums['clicks'], 100.0)
+
+        # An item joins one row per distinct latest eligibility value (or NULL)
+        eligibility_by_item = {}
+        for item, value in zip(self.latest_item, self.latest_value):
+            eligibility_by_item.setdefault(int(item), []).append(self.eligibility_values[value])
+
+        rows = []
+        for item in np.flatnonzero(ts_rows):
+            has_ads = ad_rows[item] > 0
+            for is_eligible in eligibility_by_item.get(int(item), [None]):
+                rows.append({
+                    'item_id': int(self.item_ids[item]),
+                    'total_revenue': float(total_revenue[item]),
+                    'total_units': int(total_units[item]),
+                    'ad_revenue': float(ad_sums['ad_revenue'][item]) if has_ads else None,
+                    'ad_spend': float(ad_sums['ad_spend'][item]) if has_ads else None,
+                    'impressions': int(ad_sums['impressions'][item]) if has_ads else None,
+                    'clicks': int(ad_sums['clicks'][item]) if has_ads else None,
+                    'ad_units': int(ad_sums['ad_units'][item]) if has_ads else None,
+                    'roas': float(roas[item]),
+                    'cpc': float(cpc[item]),
+                    'ctr': float(ctr[item]),
+                    'conversion_rate': float(conversion_rate[item]),
+                    'is_eligible': is_eligible,
+                })
+        return rows
+
+    # --- charts -----------------------------------------------------------
+
+    def sales_trend(self) -> List[Dict[str, Any]]:
+        mask = self.ts_sales > 0
+        day = self.ts_day[mask]
+        row_counts = np.bincount(day, minlength=self.n_days)
+        sales = _sums(day, self.ts_sales[mask], self.n_days)
+        units = _sums(day, self.ts_units[mask], self.n_days)
+        return [{'date': self._date(d), 'daily_sales': float(sales[d]), 'daily_units': int(units[d])}
+                for d in np.flatnonzero(row_counts)]
+
+    def top_products(self, limit: int) -> List[Dict[str, Any]]:
+        mask = self.ts_sales > 0
+        item = self.ts_item[mask]
+        row_counts = np.bincount(item, minlength=self.n_items)
+        sales = _sums(item, self.ts_sales[mask], self.n_items)
+        units = _sums(item, self.ts_units[mask], self.n_items)
+        present = np.flatnonzero(row_counts)
+        top = present[np.argsort(-sales[present], kind='stable')][:limit]
+        return [{'item_id': int(self.item_ids[i]), 'total_product_sales': float(sales[i]), 'total_units': int(units[i])}
+                for i in top]
+
+    def roas_by_product(self, limit: int) -> List[Dict[str, Any]]:
+        mask = (self.ads_spend > 0) & (self.ads_sales > 0)
+        item = self.ads_item[mask]
+        row_counts = np.bincount(item, minlength=self.n_items)
+        sales = _sums(item, self.ads_sales[mask], self.n_items)
+        spend = _sums(item, self.ads_spend[mask], self.n_items)
+        roas = _ratio(sales, spend)
+        present = np.flatnonzero(row_counts)
+        top = present[np.argsort(-roas[present], kind='stable')][:limit]
+        return [{'item_id': int(self.item_ids[i]), 'total_ad_sales': float(sales[i]),
+                 'total_ad_spend': float(spend[i]), 'roas': float(roas[i])} for i in top]
+
+    def eligibility_distribution(self) -> List[Dict[str, Any]]:
+        counts = np.bincount(self.latest_value, minlength=len(self.eligibility_values))
+        return [{'eligibility': str(value), 'count': int(count)}
+                for value, count in zip(self.eligibility_values, counts) if count]
+
+    def ad_performance(self) -> List[Dict[str, Any]]:
+        mask = (self.ads_clicks > 0) & (self.ads_spend > 0)
+        item = self.ads_item[mask]
+        row_counts = np.bincount(item, minlength=self.n_items)
+        spend = _sums(item, self.ads_spend[mask], self.n_items)
+        clicks = _sums(item, self.ads_clicks[mask], self.n_items)
+        units = _sums(item, self.ads_units[mask], self.n_items)
+        cpc = _ratio(spend, clicks)
+        conversion_rate = _ratio(units, clicks, 100.0)
+        selected = np.flatnonzero((row_counts > 0) & (spend > 10))
+        return [{'item_id': int(self.item_ids[i]), 'total_spend': float(spend[i]), 'total_clicks': int(clicks[i]),
+                 'total_conversions': int(units[i]), 'cpc': float(cpc[i]), 'conversion_rate': float(conversion_rate[i])}
+                for i in selected]
+
+_store: Optional[ColumnarStore] = None
+_store_lock = threading.Lock()
+
+def get_columnar_store(db_manager: DatabaseManager) -> ColumnarStore:
+    """Get the process-wide columnar store, reloading it when the data version changes"""
+    global _store
+    version = db_manager.get_data_version()
+    with _store_lock:
+        if _store is None or _store.version != version:
+            start_time = time.perf_counter()
+            snapshot_path = snapshot_path_for_version(version) if pa is not None else None
+            if snapshot_path:
+                _store = ColumnarStore.from_snapshot(Snapshot(snapshot_path))
+            else:
+                _store = ColumnarStore.from_database(db_manager)
+            source = snapshot_path or 'database'
+            logger.info(f"Loaded columnar store for data version {version} from {source} in {(time.perf_counter() - start_time) * 1000:.0f} ms")
+        return _store
@@ -1,46 +1,173 @@
 import psycopg2
 import psycopg2.extras
 import pandas as pd
+import hashlib
 import logging
 import os
-from typing import List, Dict, Any
-from sqlalchemy import create_engine
+import re
+import time
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from urllib.parse import quote
+from typing import Callable, Iterator, List, Dict, Any, Optional, Tuple, Union
+from sqlalchemy import create_engine, inspect, make_url, text
+from sqlalchemy.sql.elements import TextClause
+from query_cache import query_cache, register_cacheable_tables
+
+try:
+    import fcntl
+except ImportError:  # Windows has no fcntl; ingestion then runs unguarded
+    fcntl = None
 
 logger = logging.getLogger(__name__)
 
+# Source CSV files, in load order
+CSV_FILES = {
+    'eligibility': 'attached_assets/Product-Level Eligibility Table (mapped) - Product-Level Eligibility Table (mapped)_1753169615993.csv',
+    'ad_sales': 'attached_assets/Product-Level Ad Sales and Metrics (mapped) - Product-Level Ad Sales and Metrics (mapped)_1753169682186.csv',
+    'total_sales': 'attached_assets/Product-Level Total Sales and Metrics (mapped) - Product-Level Total Sales and Metrics (mapped)_1753169682185.csv',
+}
+
+# Fact tables are loaded, and changed by deltas, before the data version is bumped
+register_cacheable_tables(*CSV_FILES)
+
+# Bump when the CSV loading changes so existing databases are reloaded
+LOADER_VERSION = 2
+
+# Key for pg_advisory_lock so only one process ingests at a time
+INGEST_LOCK_KEY = 7028026
+
+# Where each tenant's data lives: a URL with a {tenant} placeholder (one SQLite file
+# or database per tenant), or a PostgreSQL URL without one (one schema per tenant)
+TENANT_DATABASE_URL = os.environ.get("TENANT_DATABASE_URL", "sqlite:///tenants/{tenant}.db")
+TENANT_KEY = re.compile(r'^[a-z0-9_]{1,48}$')
+
+def tenant_database_url(tenant: str) -> str:
+    """Database URL of a tenant's shard"""
+    if not TENANT_KEY.match(tenant or ''):
+        raise ValueError("Tenant keys are 1-48 lowercase letters, digits or underscores")
+    if '{tenant}' in TENANT_DATABASE_URL:
+        return TENANT_DATABASE_URL.format(tenant=tenant)
+    separator = '&' if '?' in TENANT_DATABASE_URL else '?'
+    return f"{TENANT_DATABASE_URL}{separator}options=-csearch_path%3Dtenant_{tenant}"
+
+# Read nodes serve the newest published database snapshot instead of DATABASE_URL
+SERVE_SNAPSHOTS = os.environ.get("SERVE_SNAPSHOTS", "false").lower() == "true"
+
+# The snapshot a read node is serving: engine, version, path and when it was swapped
+# in. Replaced as a whole by snapshots.SnapshotFollower, so readers never see a mix
+_serving_snapshot: Optional[Dict[str, Any]] = None
+
+def serve_snapshot(engine, version: int, path: str) -> Optional[Dict[str, Any]]:
+    """Atomically point every DatabaseManager of a read node at a snapshot; returns the previous one"""
+    global _serving_snapshot
+    previous = _serving_snapshot
+    _serving_snapshot = {'engine': engine, 'version': version, 'path': path, 'since': time.time()}
+    return previous
+
+def serving_status() -> Dict[str, Any]:
+    """What this process serves: the primary database, or a snapshot and its version"""
+    if not SERVE_SNAPSHOTS:
+        return {'mode': 'primary'}
+    serving = _serving_snapshot
+    if serving is None:
+        return {'mode': 'snapshot', 'version': None}
+    return {'mode': 'snapshot', 'version': serving['version'], 'path': serving['path'],
+            'serving_seconds': round(time.time() - serving['since'], 1)}
+
+# A :name bound parameter (not a ::type cast or a time literal)
+BIND_PARAM = re.compile(r'(?<![:\w]):(\w+)')
+
+# Callbacks run with the new data version after every ingest (registered in ingest.py)
+_post_ingest_hooks: List[Callable[[int], None]] = []
+
+def register_post_ingest_hook(hook: Callable[[int], None]):
+    """Register a callback that rebuilds derived data for a new data version"""
+    if hook not in _post_ingest_hooks:
+        _post_ingest_hooks.append(hook)
+
+# Callbacks run as (connection, version, changes) inside an incremental ingest's
+# transaction, where changes maps table -> key column -> changed values
+_delta_ingest_hooks: List[Callable[[Any, int, Dict[str, Dict[str, set]]], None]] = []
+# Post-ingest hooks a delta hook keeps up to date, so they don't rerun after a delta
+_delta_replaced_hooks = set()
+# Post-ingest hooks still rerun after a delta, one refresh at a time and in version order
+_deferred_refresh = ThreadPoolExecutor(max_workers=1, thread_name_prefix='deferred-refresh')
+
+def register_delta_ingest_hook(hook: Callable[[Any, int, Dict[str, Dict[str, set]]], None], replaces: Callable[[int], None] = None):
+    """Register a callback that updates derived data for just the keys an incremental ingest changed"""
+    if hook not in _delta_ingest_hooks:
+        _delta_ingest_hooks.append(hook)
+    if replaces is not None:
+        _delta_replaced_hooks.add(replaces)
+
 class DatabaseManager:
-    def __init__(self):
-        self.database_url = os.environ.get("DATABASE_URL")
-        if not self.database_url:
+    def __init__(self, tenant: str = None, read_only: bool = False):
+        self.tenant = tenant
+        self.database_url = tenant_database_url(tenant) if tenant is not None else os.environ.get("DATABASE_URL")
+        # Snapshots are SQLite files, whatever the primary database is
+        self.serves_snapshot = tenant is None and SERVE_SNAPSHOTS
+        if self.serves_snapshot:
+            self.database_url = "sqlite:///snapshot"
+            self.use_postgres = False
+            logger.info("Serving read-only database snapshots")
+        elif not self.database_url:
             # Fallback to SQLite for development
             self.database_url = "sqlite:///ecommerce_data.db"
             self.use_postgres = False
             logger.info("Using SQLite database (PostgreSQL URL not found)")
         else:
-            self.use_postgres = True
-            logger.info("Using PostgreSQL database")
+            self.use_postgres = self.database_url.startswith("postgres")
+            logger.info(f"Using {'PostgreSQL' if self.use_postgres else self.database_url.split(':')[0]} database")
         
-        self.engine = create_engine(self.database_url)
+        if read_only and not self.use_postgres and not self.serves_snapshot:
+            # mode=ro fails on a missing file instead of creating an empty one
+            path = make_url(self.database_url).database
+            self.database_url = f"sqlite:///file:{quote(os.path.abspath(path))}?mode=ro&uri=true"
+        self._engine = None if self.serves_snapshot else create_engine(self.database_url)
+        if tenant is not None and not read_only:
+            self._create_tenant_storage()
+    
+    @property
+    def engine(self):
+        """The engine queries run on; on a read node, that of the snapshot being served right now"""
+        if not self.serves_snapshot:
+            return self._engine
+        serving = _serving_snapshot
+        if serving is None:
+            raise RuntimeError("No database snapshot is being served yet")
+        return serving['engine']
         
+    def _create_tenant_storage(self):
+        """Create the tenant's SQLite directory or PostgreSQL schema on first write"""
+        if self.use_postgres:
+            if '{tenant}' not in TENANT_DATABASE_URL:
+                with self.engine.connect() as conn:
+                    conn.execute(text(f"CREATE SCHEMA IF NOT EXISTS tenant_{self.tenant}"))
+                    conn.commit()
+        elif self.engine.url.database:
+            os.makedirs(os.path.dirname(os.path.abspath(self.engine.url.database)), exist_ok=True)
+    
     def initialize_database(self):
         """Initialize the database and load CSV data"""
         try:
             # Load eligibility data
-            eligibility_file = 'attached_assets/Product-Level Eligibility Table (mapped) - Product-Level Eligibility Table (mapped)_1753169615993.csv'
+            eligibility_file = CSV_FILES['eligibility']
             if os.path.exists(eligibility_file):
-                df_eligibility = pd.read_csv(eligibility_file)
+                # Keep TRUE/FALSE as text; queries compare eligibility = 'TRUE'
+                df_eligibility = pd.read_csv(eligibility_file, dtype={'eligibility': str})
                 df_eligibility.to_sql('eligibility', self.engine, index=False, if_exists='replace')
                 logger.info(f"Loaded {len(df_eligibility)} eligibility records")
             
             # Load ad sales data
-            ad_sales_file = 'attached_assets/Product-Level Ad Sales and Metrics (mapped) - Product-Level Ad Sales and Metrics (mapped)_1753169682186.csv'
+            ad_sales_file = CSV_FILES['ad_sales']
             if os.path.exists(ad_sales_file):
                 df_ad_sales = pd.read_csv(ad_sales_file)
                 df_ad_sales.to_sql('ad_sales', self.engine, index=False, if_exists='replace')
                 logger.info(f"Loaded {len(df_ad_sales)} ad sales records")
             
             # Load total sales data
-            total_sales_file = 'attached_assets/Product-Level Total Sales and Metrics (mapped) - Product-Level Total Sales and Metrics (mapped)_1753169682185.csv'
+            total_sales_file = CSV_FILES['total_sales']
             if os.path.exists(total_sales_file):
                 df_total_sales = pd.read_csv(total_sales_file)
                 df_total_sales.to_sql('total_sales', self.engine, index=False, if_exists='replace')
@@ -70,18 +197,182 @@ class DatabaseManager:
                 conn.execute(text("CREATE INDEX IF NOT EXISTS idx_history_created_at ON query_history(created_at)"))
                 conn.commit()
             
-            logger.info("Database initialized successfully")
+            version = self._bump_data_version(self._source_fingerprint())
+            logger.info(f"Database initialized successfully (data version {version})")
+            self._run_post_ingest_hooks(version)
             
         except Exception as e:
             logger.error(f"Error initializing database: {str(e)}")
             raise
     
-    def execute_query(self, query: str) -> List[Dict[str, Any]]:
-        """Execute a SQL query and return results as list of dictionaries"""
+    def initialize_database_once(self) -> int:
+        """Ingest under the ingest lock, skipping the reload if these CSV files are already loaded"""
+        with self.ingest_lock():
+            latest = self._latest_data_version()
+            if latest and latest['source_fingerprint'] == self._source_fingerprint():
+                logger.info(f"Source files unchanged, reusing data version {latest['version']}")
+                return latest['version']
+            
+            self.initialize_database()
+            return self.get_data_version()
+    
+    @contextmanager
+    def ingest_lock(self):
+        """Hold an exclusive cross-process lock for the duration of an ingest"""
+        if self.use_postgres:
+            with self.engine.connect() as conn:
+                conn.execute(text("SELECT pg_advisory_lock(:key)"), {'key': INGEST_LOCK_KEY})
+                try:
+                    yield
+                finally:
+                    conn.execute(text("SELECT pg_advisory_unlock(:key)"), {'key': INGEST_LOCK_KEY})
+            return
+        
+        if fcntl is None:
+            logger.warning("fcntl not available, ingesting without a lock")
+            yield
+            return
+        
+        db_file = self.engine.url.database or 'ecommerce_data.db'
+        lock_path = os.environ.get("INGEST_LOCK_FILE", f"{db_file}.lock")
+        with open(lock_path, 'w') as lock_file:
+            fcntl.flock(lock_file, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(lock_file, fcntl.LOCK_UN)
+    
+    def get_data_version(self) -> int:
+        """Get the current data version (0 if nothing has been ingested yet)"""
+        latest = self._latest_data_version()
+        return latest['version'] if latest else 0
+    
+    def wait_for_data_version(self, min_version: int = 1, timeout: float = None, poll_interval: float = 0.5) -> int:
+        """Block until ingestion has published at least min_version, then return the current version"""
+        if timeout is None:
+            timeout = float(os.environ.get("INGEST_WAIT_TIMEOUT", 300))
+        
+        deadline = time.monotonic() + timeout
+        while True:
+            version = self.get_data_version()
+            if version >= min_version:
+                return version
+            if time.monotonic() >= deadline:
+                raise TimeoutError(f"Data version {min_version} not published after {timeout:.0f}s")
+            time.sleep(poll_interval)
+    
+    def _latest_data_version(self) -> Optional[Dict[str, Any]]:
+        """Get the most recent data_version row, if any"""
         try:
             with self.engine.connect() as conn:
-                from sqlalchemy import text
-                result = conn.execute(text(query))
+                row = conn.execute(text("""
+                    SELECT version, source_fingerprint FROM data_version
+                    ORDER BY version DESC LIMIT 1
+                """)).fetchone()
+                return {'version': row[0], 'source_fingerprint': row[1]} if row else None
+        except Exception:
+            # Table does not exist until the first ingest finishes
+            return None
+    
+    def _bump_data_version(self, fingerprint: str) -> int:
+        """Record a new data version after a successful ingest"""
+        with self.engine.connect() as conn:
+            version = self._insert_data_version(conn, fingerprint)
+            conn.commit()
+        return version
+    
+    @staticmethod
+    def _insert_data_version(conn, fingerprint: str) -> int:
+        conn.execute(text("""
+            CREATE TABLE IF NOT EXISTS data_version (
+                version INTEGER PRIMARY KEY,
+                source_fingerprint TEXT,
+                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+            )
+        """))
+        current = conn.execute(text("SELECT COALESCE(MAX(version), 0) FROM data_version")).scalar()
+        version = current + 1
+        conn.execute(text("""
+            INSERT INTO data_version (version, source_fingerprint) VALUES (:version, :fingerprint)
+        """), {'version': version, 'fingerprint': fingerprint})
+        return version
+    
+    def ingest_delta(self, apply: Callable[[Any], Dict[str, Dict[str, set]]]) -> int:
+        """Apply an incremental change and publish it as a new data version, atomically.
+        
+        apply(conn) writes the rows and returns what changed. The new version
+        and the delta hooks' incremental rollup updates commit in the same
+        transaction; the remaining post-ingest hooks rebuild in the background.
+        The source fingerprint is carried over, so a restart with the same CSV
+        files keeps the delta instead of reloading over it.
+        """
+        with self.ingest_lock():
+            latest = self._latest_data_version()
+            with self.engine.begin() as conn:
+                changes = apply(conn)
+                version = self._insert_data_version(conn, latest['source_fingerprint'] if latest else None)
+                if self.tenant is None:
+                    for hook in _delta_ingest_hooks:
+                        hook(conn, version, changes)
+        
+        logger.info(f"Published incremental data version {version}")
+        if self.tenant is None:
+            _deferred_refresh.submit(self._run_deferred_refresh, version)
+        return version
+    
+    def _run_deferred_refresh(self, version: int):
+        # A later version's refresh is queued behind this one and covers it
+        if version < self.get_data_version():
+            logger.info(f"Skipping refresh of data version {version}, a newer version is published")
+            return
+        self._run_post_ingest_hooks(version, skip=_delta_replaced_hooks)
+    
+    def _run_post_ingest_hooks(self, version: int, skip: set = frozenset()):
+        """Run registered post-ingest hooks; a failing hook doesn't fail the ingest"""
+        if self.tenant is not None:
+            # Derived data is built for the serving database; tenant shards only hold facts
+            return
+        for hook in _post_ingest_hooks:
+            if hook in skip:
+                continue
+            try:
+                hook(version)
+            except Exception as e:
+                logger.error(f"Post-ingest hook {hook.__name__} failed for data version {version}: {str(e)}")
+    
+    def _source_fingerprint(self) -> str:
+        """Fingerprint the source CSV files by name, size and modification time"""
+        digest = hashlib.sha1(f"loader:{LOADER_VERSION}".encode())
+        for table, path in CSV_FILES.items():
+            if os.path.exists(path):
+                stat = os.stat(path)
+                digest.update(f"{table}:{stat.st_size}:{stat.st_mtime_ns}".encode())
+        return digest.hexdigest()
+    
+    def execute_query(self, query: Union[str, TextClause], params: Dict[str, Any] = None, use_cache: bool = True,
+                      prepare_as: str = None) -> List[Dict[str, Any]]:
+        """Execute a SQL query and return results as list of dictionaries.
+
+        With QUERY_CACHE_MB set, SELECT results are memoized per data version.
+        On PostgreSQL, prepare_as names a server-side prepared statement to
+        plan the query once per connection.
+        """
+        sql = query.text if isinstance(query, TextClause) else query
+        cache_key = None
+        if use_cache and query_cache.enabled:
+            # Read the version first, so a result is never filed under a newer version than its data
+            cache_key = query_cache.key(self.database_url, sql, params, self.get_data_version())
+            if cache_key is not None:
+                cached = query_cache.get(cache_key)
+                if cached is not None:
+                    return cached
+        
+        try:
+            with self.engine.connect() as conn:
+                if prepare_as and self.use_postgres:
+                    result = self._execute_prepared(conn, prepare_as, sql, params or {})
+                else:
+                    result = conn.execute(text(sql) if isinstance(query, str) else query, params or {})
                 rows = result.fetchall()
                 
                 # Convert to list of dictionaries and handle Decimal types
@@ -100,14 +391,80 @@ class DatabaseManager:
                 else:
                     results = []
                 
+                if cache_key is not None:
+                    query_cache.put(cache_key, results)
                 return results
             
         except Exception as e:
             logger.error(f"Error executing query: {str(e)}")
             raise
     
+    @staticmethod
+    def _execute_prepared(conn, name: str, sql: str, params: Dict[str, Any]):
+        """EXECUTE a statement PREPAREd once per pooled connection, re-preparing it if the tables changed"""
+        names = list(dict.fromkeys(BIND_PARAM.findall(sql)))
+        prepared = conn.info.setdefault('prepared_statements', set())
+        statement = f"prepared_{name}"
+        execute = f"EXECUTE {statement}" + (f"({', '.join(['%s'] * len(names))})" if names else "")
+        values = tuple(params[key] for key in names)
+        for attempt in range(2):
+            if statement not in prepared:
+                positional = BIND_PARAM.sub(lambda match: f"${names.index(match.group(1)) + 1}", sql)
+                conn.exec_driver_sql(f"PREPARE {statement} AS {positional}")
+                prepared.add(statement)
+            try:
+                return conn.exec_driver_sql(execute, values)
+            except Exception:
+                # A reload that changed a table's columns invalidates the plan ("cached plan must not change result type")
+                if attempt:
+                    raise
+                conn.rollback()
+                conn.exec_driver_sql(f"DEALLOCATE {statement}")
+                prepared.discard(statement)
+    
+    def iter_query(self, query: str, chunk_rows: int = 10000, params: Dict[str, Any] = None) -> Iterator[Tuple[List[str], List[tuple]]]:
+        """Stream a query's results as (columns, rows) chunks from a server-side cursor.
+
+        Memory stays bounded by chunk_rows however large the result is. An
+        empty result still yields one chunk, so callers always see the columns.
+        """
+        with self.engine.connect() as conn:
+            result = conn.execution_options(stream_results=True).execute(text(query), params or {})
+            columns = list(result.keys())
+            rows = result.fetchmany(chunk_rows)
+            yield columns, [tuple(row) for row in rows]
+            while rows:
+                rows = result.fetchmany(chunk_rows)
+                if rows:
+                    yield columns, [tuple(row) for row in rows]
+    
+    def start_watch(self, directory: str = None):
+        """Ingest delta CSV files dropped into a directory (WATCH_DIR by default) in the background"""
+        # watcher.py builds on this module, so it is imported on demand
+        from watcher import start_watcher
+        return start_watcher(directory)
+    
+    def get_ingest_log(self, limit: int = 50) -> List[Dict[str, Any]]:
+        """Recent watched-file ingests with row counts, rows/sec and lag"""
+        try:
+            with self.engine.connect() as conn:
+                result = conn.execute(text("""
+                    SELECT path, table_name, status, rows, rows_per_sec, lag_seconds, elapsed_ms,
+                           data_version, error, ingested_at
+                    FROM ingest_log
+                    ORDER BY ingested_at DESC
+                    LIMIT :limit
+                """), {'limit': limit})
+                return [dict(row._mapping) for row in result]
+        except Exception as e:
+            logger.error(f"Error getting ingest log: {str(e)}")
+            return []
+    
     def save_query_history(self, question: str, sql_query: str, response_summary: str, execution_time_ms: int = None):
         """Save query to history table"""
+        if self.serves_snapshot:
+            # Snapshots are immutable; history is recorded where questions reach the primary
+            return
         try:
             with self.engine.connect() as conn:
                 from sqlalchemy import text
@@ -125,6 +482,26 @@ class DatabaseManager:
         except Exception as e:
             logger.error(f"Error saving query history: {str(e)}")
     
+    def save_query_history_batch(self, entries: List[Dict[str, Any]]):
+        """Save several history entries (question, sql_query, response_summary, execution_time_ms) in one write"""
+        if not entries or self.serves_snapshot:
+            return
+        try:
+            with self.engine.connect() as conn:
+                conn.execute(text("""
+                    INSERT INTO query_history (question, sql_query, response_summary, execution_time_ms)
+                    VALUES (:question, :sql_query, :response_summary, :execution_time_ms)
+                """), [{
+                    'question': entry['question'],
+                    'sql_query': entry.get('sql_query'),
+                    'response_summary': entry['response_summary'][:500] if entry.get('response_summary') else None,
+                    'execution_time_ms': entry.get('execution_time_ms')
+                } for entry in entries])
+                conn.commit()
+                
+        except Exception as e:
+            logger.error(f"Error saving query history batch: {str(e)}")
+    
     def get_query_history(self, limit: int = 20) -> List[Dict[str, Any]]:
         """Get query history with basic details"""
         try:
@@ -177,32 +554,22 @@ class DatabaseManager:
             logger.error(f"Error getting query detail: {str(e)}")
             return {}
     
-    def get_schema_info(self) -> str:
+    def get_schema_info(self, tables: List[str] = None) -> str:
         """Get database schema information for AI context"""
         try:
-            conn = sqlite3.connect(self.db_path)
-            cursor = conn.cursor()
+            inspector = inspect(self.engine)
             
             schema_info = []
             
-            # Get table names
-            cursor.execute("SELECT name FROM sqlite_master WHERE type='table'")
-            tables = cursor.fetchall()
-            
-            for table in tables:
-                table_name = table[0]
-                cursor.execute(f"PRAGMA table_info({table_name})")
-                columns = cursor.fetchall()
-                
+            for table_name in tables or inspector.get_table_names():
                 column_info = []
-                for col in columns:
-                    column_info.append(f"{col[1]} ({col[2]})")
+                for col in inspector.get_columns(table_name):
+                    column_info.append(f"{col['name']} ({col['type']})")
                 
                 schema_info.append(f"Table: {table_name}")
                 schema_info.append(f"Columns: {', '.join(column_info)}")
                 schema_info.append("")
             
-            conn.close()
             return "\n".join(schema_info)
             
         except Exception as e:
@@ -0,0 +1,164 @@
+import csv
+import io
+import logging
+import os
+import re
+import time
+from datetime import date
+from typing import Dict, Any, Iterator, List
+from sqlalchemy import text
+from database import DatabaseManager
+
+logger = logging.getLogger(__name__)
+
+# Rows upserted per executemany round trip
+DELTA_BATCH_ROWS = int(os.environ.get("DELTA_BATCH_ROWS", 5000))
+# Validation errors collected before an upload is rejected
+DELTA_MAX_ERRORS = int(os.environ.get("DELTA_MAX_ERRORS", 20))
+
+ELIGIBILITY_TIMESTAMP = re.compile(r'^\d{4}-\d{2}-\d{2} \d{1,2}:\d{2}:\d{2}$')
+
+def _day(value: str) -> str:
+    return date.fromisoformat(value).isoformat()
+
+def _timestamp(value: str) -> str:
+    if not ELIGIBILITY_TIMESTAMP.match(value):
+        raise ValueError("expected YYYY-MM-DD H:MM:SS")
+    date.fromisoformat(value[:10])
+    return value
+
+def _flag(value: str) -> str:
+    if value.upper() not in ('TRUE', 'FALSE'):
+        raise ValueError("expected TRUE or FALSE")
+    return value.upper()
+
+def _text(value: str) -> str:
+    return value or None
+
+# Per table: column parsers in source CSV order, and the key a row replaces
+DELTA_TABLES = {
+    'eligibility': {
+        'columns': {'eligibility_datetime_utc': _timestamp, 'item_id': int, 'eligibility': _flag, 'message': _text},
+        'key': ('eligibility_datetime_utc', 'item_id'),
+    },
+    'ad_sales': {
+        'columns': {'date': _day, 'item_id': int, 'ad_sales': float, 'impressions': int,
+                    'ad_spend': float, 'clicks': int, 'units_sold': int},
+        'key': ('date', 'item_id'),
+    },
+    'total_sales': {
+        'columns': {'date': _day, 'item_id': int, 'total_sales': float, 'total_units_ordered': int},
+        'key': ('date', 'item_id'),
+    },
+}
+
+class DeltaValidationError(ValueError):
+    """An uploaded delta failed validation; nothing from it was written"""
+
+    def __init__(self, errors: List[str]):
+        super().__init__(f"{len(errors)} invalid row(s): {'; '.join(errors[:3])}")
+        self.errors = errors
+
+class DeltaIngestor:
+    """Upsert daily delta files into the fact tables as a new data version"""
+
+    def __init__(self):
+        self.db_manager = DatabaseManager()
+
+    def ingest(self, table: str, stream) -> Dict[str, Any]:
+        """Validate and upsert a CSV delta (a binary or text stream) in one transaction.
+
+        Rows replace existing rows with the same key; the delta hooks then
+        update the rollups for just the touched days and items.
+        """
+        if table not in DELTA_TABLES:
+            raise ValueError(f"table must be one of {', '.join(DELTA_TABLES)}")
+        if not isinstance(stream, io.TextIOBase):
+            stream = io.TextIOWrapper(stream, encoding='utf-8-sig', newline='')
+
+        start = time.perf_counter()
+        stats = {'rows': 0, 'replaced': 0}
+        version = self.db_manager.ingest_delta(lambda conn: self._upsert(conn, table, self._validate(table, stream), stats))
+        elapsed = time.perf_counter() - start
+
+        summary = {
+            'table': table,
+            'rows': stats['rows'],
+            'inserted': stats['rows'] - stats['replaced'],
+            'replaced': stats['replaced'],
+            'data_version': version,
+            'elapsed_ms': int(elapsed * 1000),
+            'rows_per_sec': int(stats['rows'] / elapsed) if elapsed > 0 else None
+        }
+        logger.info(f"Delta ingest into {table}: {summary}")
+        return summary
+
+    def _validate(self, table: str, stream) -> Iterator[Dict[str, Any]]:
+        """Parse rows one at a time; raises DeltaValidationError at the end if any row was invalid"""
+        spec = DELTA_TABLES[table]['columns']
+        reader = csv.DictReader(stream)
+        header = [name.strip() for name in reader.fieldnames or []]
+        missing = [name for name in spec if name not in header]
+        unknown = [name for name in header if name not in spec]
+        if missing or unknown:
+            raise DeltaValidationError([f"header: missing {missing or 'nothing'}, unexpected {unknown or 'nothing'}"])
+        reader.fieldnames = header
+
+        errors = []
+        for line, raw in enumerate(reader, start=2):
+            row = {}
+            for name, parse in spec.items():
+                value = (raw.get(name) or '').strip()
+                try:
+                    if not value and parse is not _text:
+                        raise ValueError("missing value")
+                    row[name] = parse(value)
+                except ValueError as e:
+                    errors.append(f"line {line}, {name}={value!r}: {str(e)}")
+                    break
+            else:
+                if not errors:
+                    yield row
+            if len(errors) >= DELTA_MAX_ERRORS:
+                break
+        if errors:
+            raise DeltaValidationError(errors)
+
+    def _upsert(self, conn, table: str, rows: Iterator[Dict[str, Any]], stats: Dict[str, int]) -> Dict[str, Dict[str, set]]:
+        """Replace rows by key, a batch at a time; returns the changed key values per key column.
+
+        stats counts distinct keys: 'rows' written and 'replaced' rows that existed before the delta.
+        """
+        key = DELTA_TABLES[table]['key']
+        columns = list(DELTA_TABLES[table]['columns'])
+        delete = text(f"DELETE FROM {table} WHERE {' AND '.join(f'{column} = :{column}' for column in key)}")
+        insert = text(f"INSERT INTO {table} ({', '.join(columns)}) VALUES ({', '.join(f':{column}' for column in columns)})")
+        changed = {column: set() for column in key}
+        written = set()
+
+        for batch in _batches(rows, DELTA_BATCH_ROWS):
+            # The last row for a key within the delta wins; a key repeated from an earlier
+            # batch deletes this delta's own row, which is neither a replacement nor a new row
+            latest = {tuple(row[column] for column in key): row for row in batch}
+            repeated = sum(1 for values in latest if values in written)
+            deleted = conn.execute(delete, [dict(zip(key, values)) for values in latest]).rowcount or 0
+            conn.execute(insert, list(latest.values()))
+            stats['replaced'] += deleted - repeated
+            stats['rows'] += len(latest) - repeated
+            written.update(latest)
+            for values in latest:
+                for column, value in zip(key, values):
+                    changed[column].add(value)
+        if not stats['rows']:
+            raise DeltaValidationError(["no rows"])
+        return {table: changed}
+
+def _batches(rows: Iterator[Dict[str, Any]], size: int) -> Iterator[List[Dict[str, Any]]]:
+    batch = []
+    for row in rows:
+        batch.append(row)
+        if len(batch) >= size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
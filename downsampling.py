@@ -0,0 +1,64 @@
+import numpy as np
+from typing import Dict
+
+def lttb(x: np.ndarray, y: np.ndarray, threshold: int) -> np.ndarray:
+    """Pick `threshold` point indices that preserve the visual shape of a series.
+
+    Largest-Triangle-Three-Buckets: the first and last points are always kept,
+    the interior is split into threshold - 2 buckets and from each bucket the
+    point forming the largest triangle with the previously kept point and the
+    average of the next bucket is kept. x must be sorted ascending.
+    """
+    n = len(x)
+    if threshold >= n or threshold < 3:
+        return np.arange(n)
+
+    x = np.asarray(x, dtype=float)
+    y = np.asarray(y, dtype=float)
+    edges = np.linspace(1, n - 1, threshold - 1).astype(np.int64)
+
+    indices = np.empty(threshold, dtype=np.int64)
+    indices[0] = 0
+    indices[-1] = n - 1
+    kept = 0
+    for i in range(threshold - 2):
+        start, end = edges[i], edges[i + 1]
+        if i + 2 < len(edges):
+            next_start, next_end = edges[i + 1], edges[i + 2]
+            avg_x = x[next_start:next_end].mean()
+            avg_y = y[next_start:next_end].mean()
+        else:
+            avg_x, avg_y = x[-1], y[-1]
+
+        areas = np.abs(
+            (x[kept] - avg_x) * (y[start:end] - y[kept])
+            - (x[kept] - x[start:end]) * (avg_y - y[kept])
+        )
+        kept = start + int(np.argmax(areas))
+        indices[i + 1] = kept
+
+    return indices
+
+def bin_scatter(x: np.ndarray, y: np.ndarray, budget: int, weights: np.ndarray = None) -> Dict[str, np.ndarray]:
+    """Aggregate scatter points into at most `budget` grid cells.
+
+    Returns one entry per non-empty cell: the centroid of its points, the
+    number of points in it and the sum of `weights` over them.
+    """
+    x = np.asarray(x, dtype=float)
+    y = np.asarray(y, dtype=float)
+    side = max(int(np.sqrt(budget)), 1)
+
+    def cell_index(values: np.ndarray) -> np.ndarray:
+        span = np.ptp(values) or 1.0
+        return np.clip(((values - values.min()) / span * side).astype(np.int64), 0, side - 1)
+
+    cells = cell_index(x) * side + cell_index(y)
+    _, inverse, counts = np.unique(cells, return_inverse=True, return_counts=True)
+
+    return {
+        'x': np.bincount(inverse, weights=x) / counts,
+        'y': np.bincount(inverse, weights=y) / counts,
+        'count': counts,
+        'weight': np.bincount(inverse, weights=weights) if weights is not None else counts.astype(float),
+    }
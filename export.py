@@ -0,0 +1,119 @@
+import csv
+import io
+import itertools
+import json
+import logging
+import os
+import re
+from decimal import Decimal
+from typing import Any, Dict, Iterator, List
+from database import DatabaseManager
+from query_cache import is_read_only
+
+try:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+except ImportError:  # pyarrow is optional; CSV and NDJSON exports work without it
+    pa = None
+
+logger = logging.getLogger(__name__)
+
+# Rows fetched from the cursor (and written) per chunk
+EXPORT_CHUNK_ROWS = int(os.environ.get("EXPORT_CHUNK_ROWS", 10000))
+
+EXPORT_FORMATS = {
+    'csv': 'text/csv',
+    'ndjson': 'application/x-ndjson',
+    'parquet': 'application/vnd.apache.parquet',
+}
+
+def _json_default(value):
+    if isinstance(value, Decimal):
+        return float(value)
+    return str(value)
+
+class _ChunkSink:
+    """File-like target for ParquetWriter that hands written bytes back to the stream"""
+
+    def __init__(self):
+        self.chunks = []
+        self.position = 0
+        self.closed = False
+
+    def write(self, data) -> int:
+        data = bytes(data)
+        self.chunks.append(data)
+        self.position += len(data)
+        return len(data)
+
+    def flush(self):
+        pass
+
+    def tell(self) -> int:
+        return self.position
+
+    def close(self):
+        self.closed = True
+
+    def drain(self) -> bytes:
+        data = b''.join(self.chunks)
+        self.chunks = []
+        return data
+
+class ResultExporter:
+    """Stream query results as CSV, NDJSON or Parquet without materializing them"""
+
+    def __init__(self, chunk_rows: int = EXPORT_CHUNK_ROWS):
+        self.db_manager = DatabaseManager()
+        self.chunk_rows = chunk_rows
+
+    def available_formats(self) -> List[str]:
+        return [name for name in EXPORT_FORMATS if name != 'parquet' or pa is not None]
+
+    def export(self, sql: str, fmt: str, params: Dict[str, Any] = None) -> Iterator[bytes]:
+        """Encoded chunks of the query's results in the given format"""
+        if fmt not in self.available_formats():
+            raise ValueError(f"Unsupported export format: {fmt}")
+        if not is_read_only(sql):
+            raise ValueError("Only SELECT queries can be exported")
+        chunks = self.db_manager.iter_query(sql, self.chunk_rows, params)
+        # Run the query now, so SQL errors surface before the response starts
+        chunks = itertools.chain([next(chunks)], chunks)
+        return getattr(self, f"_export_{fmt}")(chunks)
+
+    def _export_csv(self, chunks) -> Iterator[bytes]:
+        header_written = False
+        for columns, rows in chunks:
+            buffer = io.StringIO()
+            writer = csv.writer(buffer)
+            if not header_written:
+                writer.writerow(columns)
+                header_written = True
+            writer.writerows(rows)
+            yield buffer.getvalue().encode()
+
+    def _export_ndjson(self, chunks) -> Iterator[bytes]:
+        for columns, rows in chunks:
+            yield ''.join(json.dumps(dict(zip(columns, row)), default=_json_default) + '\n' for row in rows).encode()
+
+    def _export_parquet(self, chunks) -> Iterator[bytes]:
+        """One row group per chunk; column types come from the first chunk"""
+        sink = _ChunkSink()
+        writer = None
+        schema = None
+        for columns, rows in chunks:
+            data = {column: [row[i] for row in rows] for i, column in enumerate(columns)}
+            if writer is None:
+                inferred = pa.Table.from_pydict(data).schema
+                # An all-NULL first chunk says nothing about the type; fall back to text
+                schema = pa.schema([pa.field(field.name, pa.string()) if pa.types.is_null(field.type) else field
+                                    for field in inferred])
+                writer = pq.ParquetWriter(sink, schema)
+            writer.write_table(pa.Table.from_pydict(data, schema=schema))
+            yield sink.drain()
+        writer.close()
+        yield sink.drain()
+
+def content_disposition(name: str, fmt: str) -> str:
+    safe_name = re.sub(r'[^A-Za-z0-9_.-]', '_', name)
+    return f'attachment; filename="{safe_name}.{fmt}"'
@@ -0,0 +1,30 @@
+# Production serving config: gunicorn -c gunicorn.conf.py main:app
+#
+# Ingestion runs exactly once in the master process before any worker is
+# forked. Workers start with INGEST_MODE=leader and only wait for the
+# published data version instead of reloading the CSV files themselves.
+import multiprocessing
+import os
+
+bind = os.environ.get("GUNICORN_BIND", f"0.0.0.0:{os.environ.get('PORT', 5000)}")
+workers = int(os.environ.get("WEB_CONCURRENCY", multiprocessing.cpu_count()))
+threads = int(os.environ.get("GUNICORN_THREADS", 1))
+timeout = int(os.environ.get("GUNICORN_TIMEOUT", 120))
+reuse_port = True
+
+os.environ.setdefault("INGEST_MODE", "leader")
+
+
+def on_starting(server):
+    """Run the single-leader ingest before workers are forked"""
+    from database import DatabaseManager, SERVE_SNAPSHOTS
+    from ingest import run_ingest
+
+    if SERVE_SNAPSHOTS:
+        # Read nodes don't ingest; each worker follows the published snapshots
+        return
+    db_manager = DatabaseManager()
+    version = run_ingest(db_manager)
+    # Don't hand pooled connections down to forked workers
+    db_manager.engine.dispose()
+    server.log.info(f"Ingest complete, serving data version {version}")
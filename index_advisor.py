@@ -0,0 +1,339 @@
+import argparse
+import logging
+import re
+import statistics
+import sys
+import time
+from typing import List, Dict, Any, Optional, Set
+from sqlalchemy import inspect, text
+from database import DatabaseManager
+
+logger = logging.getLogger(__name__)
+
+# Tables the advisor may index; derived tables are rebuilt wholesale each ingest
+ADVISED_TABLES = ('total_sales', 'ad_sales', 'eligibility')
+
+MAX_KEY_COLUMNS = 3
+MAX_INCLUDE_COLUMNS = 4
+
+SQL_KEYWORDS = {
+    'where', 'join', 'left', 'right', 'inner', 'outer', 'full', 'cross', 'on', 'group', 'order',
+    'limit', 'having', 'union', 'as', 'select', 'from', 'and', 'or', 'not', 'using', 'natural',
+}
+CLAUSE_END = r'(?=\bGROUP\s+BY\b|\bORDER\s+BY\b|\bLIMIT\b|\bHAVING\b|\bUNION\b|\bWHERE\b|\b(?:LEFT|RIGHT|INNER|FULL|CROSS)?\s*JOIN\b|\)|$)'
+COMPARISON = re.compile(
+    r'((?:[A-Za-z_]\w*\.)?[A-Za-z_]\w*)\s*(=|>=|<=|<>|!=|>|<|\bBETWEEN\b|\bIN\b)\s*((?:[A-Za-z_]\w*\.)?[A-Za-z_]\w*|\?|[\d.]+)?',
+    re.IGNORECASE
+)
+
+def _strip_sql(sql: str) -> str:
+    """Drop comments and replace string literals so they can't be mistaken for identifiers"""
+    sql = re.sub(r'--[^\n]*', ' ', sql)
+    sql = re.sub(r'/\*.*?\*/', ' ', sql, flags=re.DOTALL)
+    return re.sub(r"'(?:[^']|'')*'", '?', sql)
+
+def is_replayable(sql: str) -> bool:
+    """Only single read-only statements are explained and replayed"""
+    body = _strip_sql(sql).strip().rstrip(';')
+    return bool(re.match(r'(?is)^\s*(SELECT|WITH)\b', body)) and ';' not in body
+
+def normalize_sql(sql: str) -> str:
+    return re.sub(r'\s+', ' ', sql.strip().rstrip(';')).lower()
+
+class QueryShape:
+    """Per-table column usage of one query: equality and range predicates, GROUP BY/ORDER BY and references"""
+
+    def __init__(self, sql: str, columns_by_table: Dict[str, Set[str]]):
+        self.sql = sql
+        stripped = _strip_sql(sql)
+        self.aliases = {}
+        for match in re.finditer(r'\b(?:FROM|JOIN)\s+([A-Za-z_]\w*)(?:\s+(?:AS\s+)?([A-Za-z_]\w*))?', stripped, re.IGNORECASE):
+            table, alias = match.group(1).lower(), (match.group(2) or '').lower()
+            if table in columns_by_table:
+                self.aliases[table] = table
+                if alias and alias not in SQL_KEYWORDS:
+                    self.aliases[alias] = table
+        self.tables = set(self.aliases.values())
+        self._columns_by_table = columns_by_table
+
+        self.equality = {table: [] for table in self.tables}
+        self.range = {table: [] for table in self.tables}
+        self.ordering = {table: [] for table in self.tables}
+        self.referenced = {table: set() for table in self.tables}
+
+        for segment in re.findall(r'\b(?:WHERE|ON|HAVING)\b(.*?)' + CLAUSE_END, stripped, re.IGNORECASE | re.DOTALL):
+            for left, operator, right in COMPARISON.findall(segment):
+                left_column = self._resolve(left)
+                right_column = self._resolve(right) if right else None
+                operator = operator.upper()
+                kind = 'equality' if operator in ('=', 'IN') else None if operator in ('<>', '!=') else 'range'
+                for resolved in (left_column, right_column if operator == '=' else None):
+                    if resolved and kind:
+                        self._add(getattr(self, kind)[resolved[0]], resolved[1])
+
+        for segment in re.findall(r'\b(?:GROUP|ORDER)\s+BY\b(.*?)' + CLAUSE_END, stripped, re.IGNORECASE | re.DOTALL):
+            for token in segment.split(','):
+                resolved = self._resolve(re.sub(r'(?i)\s+(ASC|DESC)\s*$', '', token.strip()))
+                if resolved:
+                    self._add(self.ordering[resolved[0]], resolved[1])
+
+        # Table names can double as column names (ad_sales.ad_sales), so skip FROM/JOIN targets
+        without_tables = re.sub(r'\b(FROM|JOIN)\s+[A-Za-z_]\w*', ' ', stripped, flags=re.IGNORECASE)
+        for token in re.findall(r'(?:[A-Za-z_]\w*\.)?[A-Za-z_]\w*', without_tables):
+            resolved = self._resolve(token)
+            if resolved:
+                self.referenced[resolved[0]].add(resolved[1])
+
+    @staticmethod
+    def _add(columns: List[str], column: str):
+        if column not in columns:
+            columns.append(column)
+
+    def _resolve(self, token: str) -> Optional[tuple]:
+        """(table, column) for alias.column or an unambiguous bare column, else None"""
+        token = token.strip().lower()
+        if '.' in token:
+            alias, column = token.split('.', 1)
+            table = self.aliases.get(alias)
+            return (table, column) if table and column in self._columns_by_table[table] else None
+        owners = [table for table in self.tables if token in self._columns_by_table[table]]
+        return (owners[0], token) if len(owners) == 1 else None
+
+    def candidate(self, table: str) -> Optional[Dict[str, Any]]:
+        """Composite index for one table: equality columns, then GROUP/ORDER BY, then range columns"""
+        key = []
+        for column in self.equality[table] + self.ordering[table] + self.range[table]:
+            if column not in key:
+                key.append(column)
+        key = key[:MAX_KEY_COLUMNS]
+        if not key:
+            return None
+        include = sorted(self.referenced[table] - set(key))
+        if len(include) > MAX_INCLUDE_COLUMNS:
+            include = []
+        return {'table': table, 'columns': key, 'include': include}
+
+def explain(db_manager: DatabaseManager, sql: str) -> Dict[str, Any]:
+    """Plan problems for a query: relations read by full scans and whether it sorts in a temp structure"""
+    full_scans, details = set(), []
+    temp_sort = False
+    with db_manager.engine.connect() as conn:
+        if db_manager.use_postgres:
+            plan = conn.execute(text(f"EXPLAIN (FORMAT JSON) {sql}")).scalar()
+            nodes = [plan[0]['Plan']]
+            while nodes:
+                node = nodes.pop()
+                details.append(node['Node Type'])
+                if node['Node Type'] == 'Seq Scan':
+                    full_scans.add(node.get('Alias') or node.get('Relation Name'))
+                if node['Node Type'] in ('Sort', 'Incremental Sort'):
+                    temp_sort = True
+                nodes.extend(node.get('Plans', []))
+        else:
+            for row in conn.execute(text(f"EXPLAIN QUERY PLAN {sql}")).fetchall():
+                detail = row[-1]
+                details.append(detail)
+                scan = re.match(r'SCAN (?:TABLE )?(\w+)', detail)
+                if scan and 'COVERING INDEX' not in detail:
+                    full_scans.add(scan.group(1))
+                if 'USE TEMP B-TREE' in detail:
+                    temp_sort = True
+    return {'full_scans': {name.lower() for name in full_scans if name}, 'temp_sort': temp_sort, 'plan': details}
+
+class IndexAdvisor:
+    def __init__(self):
+        self.db_manager = DatabaseManager()
+        self._ensure_table()
+
+    def _ensure_table(self):
+        with self.db_manager.engine.connect() as conn:
+            conn.execute(text("""
+                CREATE TABLE IF NOT EXISTS advised_indexes (
+                    name TEXT PRIMARY KEY,
+                    ddl TEXT NOT NULL,
+                    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+                )
+            """))
+            conn.commit()
+
+    def _columns_by_table(self) -> Dict[str, Set[str]]:
+        inspector = inspect(self.db_manager.engine)
+        existing = set(inspector.get_table_names())
+        return {table: {column['name'].lower() for column in inspector.get_columns(table)}
+                for table in ADVISED_TABLES if table in existing}
+
+    def _existing_indexes(self, tables) -> Dict[str, List[List[str]]]:
+        inspector = inspect(self.db_manager.engine)
+        return {table: [[column.lower() for column in index['column_names'] if column]
+                        for index in inspector.get_indexes(table)]
+                for table in tables}
+
+    def history_queries(self, limit: int = 500) -> List[str]:
+        """Distinct replayable SQL from the most recent query history"""
+        try:
+            with self.db_manager.engine.connect() as conn:
+                rows = conn.execute(text("""
+                    SELECT sql_query FROM query_history
+                    WHERE sql_query IS NOT NULL
+                    ORDER BY created_at DESC
+                    LIMIT :limit
+                """), {'limit': limit}).fetchall()
+        except Exception as e:
+            logger.error(f"Error reading query history: {str(e)}")
+            return []
+
+        queries, seen = [], set()
+        for (sql,) in rows:
+            key = normalize_sql(sql)
+            if key not in seen and is_replayable(sql):
+                seen.add(key)
+                queries.append(sql.strip().rstrip(';'))
+        return queries
+
+    def recommend(self, queries: List[str]) -> List[Dict[str, Any]]:
+        """Index recommendations for the tables these queries scan fully or sort"""
+        columns_by_table = self._columns_by_table()
+        existing = self._existing_indexes(columns_by_table)
+        candidates = {}
+
+        for sql in queries:
+            try:
+                plan = explain(self.db_manager, sql)
+            except Exception as e:
+                logger.error(f"Error explaining query: {str(e)}")
+                continue
+            shape = QueryShape(sql, columns_by_table)
+            scanned = {shape.aliases.get(name, name) for name in plan['full_scans']}
+            for table in shape.tables:
+                reasons = []
+                if table in scanned:
+                    reasons.append('full scan')
+                if plan['temp_sort'] and shape.ordering[table]:
+                    reasons.append('temp sort for GROUP BY/ORDER BY')
+                candidate = shape.candidate(table) if reasons else None
+                if not candidate:
+                    continue
+                key = (table, tuple(candidate['columns']))
+                entry = candidates.setdefault(key, {**candidate, 'include': set(), 'queries': 0, 'reasons': set(), 'sql': []})
+                entry['include'].update(candidate['include'])
+                entry['queries'] += 1
+                entry['reasons'].update(reasons)
+                entry['sql'].append(sql)
+
+        recommendations = []
+        for (table, columns), entry in candidates.items():
+            # An existing index with these leading columns already serves the lookup
+            include = sorted(entry['include'])
+            wanted = list(columns) + ([] if self.db_manager.use_postgres else include)
+            if any(index[:len(wanted)] == wanted for index in existing[table]):
+                continue
+            # Longer candidates on the same table cover shorter prefixes of themselves
+            if any(other_table == table and len(other) > len(columns) and list(other[:len(columns)]) == list(columns)
+                   for other_table, other in candidates):
+                continue
+            recommendations.append(self._describe(table, list(columns), include, entry))
+
+        return sorted(recommendations, key=lambda rec: -rec['queries'])
+
+    def _describe(self, table: str, columns: List[str], include: List[str], entry: Dict[str, Any]) -> Dict[str, Any]:
+        name = f"idx_adv_{table}_{'_'.join(columns)}"[:63]
+        if self.db_manager.use_postgres:
+            ddl = f"CREATE INDEX IF NOT EXISTS {name} ON {table} ({', '.join(columns)})"
+            if include:
+                ddl += f" INCLUDE ({', '.join(include)})"
+        else:
+            # SQLite has no INCLUDE; trailing key columns make the index covering
+            if include:
+                name = f"{name}_cov"[:63]
+            ddl = f"CREATE INDEX IF NOT EXISTS {name} ON {table} ({', '.join(columns + include)})"
+        return {
+            'name': name,
+            'table': table,
+            'columns': columns,
+            'include': include,
+            'ddl': ddl,
+            'queries': entry['queries'],
+            'reasons': sorted(entry['reasons']),
+            'sql': entry['sql'],
+        }
+
+    def replay(self, queries: List[str], repeat: int = 5) -> Dict[str, float]:
+        """Median latency in ms of each query over `repeat` runs"""
+        latencies = {}
+        with self.db_manager.engine.connect() as conn:
+            for sql in queries:
+                timings = []
+                for _ in range(repeat):
+                    start = time.perf_counter()
+                    conn.execute(text(sql)).fetchall()
+                    timings.append((time.perf_counter() - start) * 1000)
+                latencies[sql] = statistics.median(timings)
+        return latencies
+
+    def apply(self, recommendations: List[Dict[str, Any]], repeat: int = 5) -> Dict[str, Any]:
+        """Create the recommended indexes, remembering them across re-ingests, and measure replayed latency"""
+        queries = list(dict.fromkeys(sql for rec in recommendations for sql in rec['sql']))
+        before = self.replay(queries, repeat)
+
+        with self.db_manager.engine.connect() as conn:
+            for rec in recommendations:
+                conn.execute(text(rec['ddl']))
+                conn.execute(text("DELETE FROM advised_indexes WHERE name = :name"), {'name': rec['name']})
+                conn.execute(text("INSERT INTO advised_indexes (name, ddl) VALUES (:name, :ddl)"),
+                             {'name': rec['name'], 'ddl': rec['ddl']})
+            conn.execute(text("ANALYZE"))
+            conn.commit()
+
+        after = self.replay(queries, repeat)
+        for rec in recommendations:
+            logger.info(f"Created {rec['name']}: {rec['ddl']}")
+        return {
+            'applied': [rec['name'] for rec in recommendations],
+            'queries': [{'sql': sql, 'before_ms': before[sql], 'after_ms': after[sql]} for sql in queries],
+            'before_ms': sum(before.values()),
+            'after_ms': sum(after.values()),
+        }
+
+    def reapply(self):
+        """Recreate previously applied indexes; loading the CSVs replaces the tables and drops them"""
+        with self.db_manager.engine.connect() as conn:
+            rows = conn.execute(text("SELECT name, ddl FROM advised_indexes")).fetchall()
+            for name, ddl in rows:
+                try:
+                    conn.execute(text(ddl))
+                except Exception as e:
+                    logger.error(f"Error recreating advised index {name}: {str(e)}")
+            conn.commit()
+        if rows:
+            logger.info(f"Recreated {len(rows)} advised indexes")
+
+def main(argv: List[str] = None) -> int:
+    parser = argparse.ArgumentParser(description="Recommend indexes from the SQL in query_history")
+    parser.add_argument('--limit', type=int, default=500, help="most recent history entries to analyze")
+    parser.add_argument('--apply', action='store_true', help="create the recommended indexes")
+    parser.add_argument('--repeat', type=int, default=5, help="runs per replayed query when measuring")
+    args = parser.parse_args(argv)
+
+    advisor = IndexAdvisor()
+    queries = advisor.history_queries(args.limit)
+    recommendations = advisor.recommend(queries)
+    print(f"Analyzed {len(queries)} distinct queries from query_history")
+    if not recommendations:
+        print("✅ No index recommendations")
+        return 0
+
+    for rec in recommendations:
+        print(f"💡 {rec['ddl']}")
+        print(f"   {rec['queries']} queries; {', '.join(rec['reasons'])}")
+
+    if args.apply:
+        report = advisor.apply(recommendations, args.repeat)
+        for entry in report['queries']:
+            print(f"   {entry['before_ms']:8.2f} ms -> {entry['after_ms']:8.2f} ms  {normalize_sql(entry['sql'])[:90]}")
+        print(f"✅ Applied {len(report['applied'])} indexes; replayed queries "
+              f"{report['before_ms']:.1f} ms -> {report['after_ms']:.1f} ms")
+    return 0
+
+if __name__ == '__main__':
+    logging.basicConfig(level=logging.INFO)
+    sys.exit(main())
@@ -0,0 +1,90 @@
+import logging
+from database import DatabaseManager, register_post_ingest_hook, register_delta_ingest_hook
+from visualization import VisualizationEngine
+from analytics import AdvancedAnalytics
+from timeseries import TimeSeriesAnalytics
+from columnar import get_columnar_store
+from queries import ANALYTICS_BACKEND
+from snapshots import export_snapshot_hook, publish_database_snapshot_hook
+from index_advisor import IndexAdvisor
+from query_rewriter import QueryRewriter
+from schema_catalog import SchemaCatalog
+from anomalies import AnomalyDetector
+from sketches import SketchAnalytics
+
+logger = logging.getLogger(__name__)
+
+# Derived data rebuilt after every ingest, in order
+
+def reapply_advised_indexes(version: int):
+    """Recreate indexes applied by the index advisor, which reloading the tables drops"""
+    IndexAdvisor().reapply()
+
+def precompute_chart_payloads(version: int):
+    """Render the fixed charts once for the new data version"""
+    VisualizationEngine().precompute_chart_payloads(version)
+
+def materialize_product_scores(version: int):
+    """Score the whole catalog once for the new data version"""
+    AdvancedAnalytics().materialize_product_scores(version)
+
+def materialize_daily_metrics(version: int):
+    """Roll the fact tables up per day for prefix-sum time series"""
+    TimeSeriesAnalytics().materialize_daily_metrics(version)
+
+def materialize_query_rollups(version: int):
+    """Build the rollups the query rewriter answers generated SQL from"""
+    QueryRewriter().materialize_rollups(version)
+
+def refresh_schema_catalog(version: int):
+    """Recompute the column statistics the SQL prompt is built from"""
+    SchemaCatalog().refresh(version)
+
+def materialize_anomalies(version: int):
+    """Scan every item and metric for anomalous days"""
+    AnomalyDetector().materialize_anomalies(version)
+
+def materialize_daily_sketches(version: int):
+    """Build the per-day distinct-count and quantile sketches approximate queries merge"""
+    SketchAnalytics().materialize_daily_sketches(version)
+
+def load_columnar_store(version: int):
+    """Load the fact tables into the in-process columnar store"""
+    if ANALYTICS_BACKEND == 'columnar':
+        get_columnar_store(DatabaseManager())
+
+# Incremental updates run inside a delta ingest's transaction instead
+
+def refresh_query_rollups(conn, version: int, changes):
+    """Update the query rewriter's rollups for the days and items a delta touched"""
+    QueryRewriter().refresh_rollups(conn, version, changes)
+
+def refresh_daily_metrics(conn, version: int, changes):
+    """Update the daily metrics rollup for the days a delta touched"""
+    TimeSeriesAnalytics().refresh_daily_metrics(conn, version, changes)
+
+def refresh_daily_sketches(conn, version: int, changes):
+    """Rebuild the sketches of the days a delta touched"""
+    SketchAnalytics().refresh_daily_sketches(conn, version, changes)
+
+register_post_ingest_hook(reapply_advised_indexes)
+register_post_ingest_hook(export_snapshot_hook)
+register_post_ingest_hook(load_columnar_store)
+register_post_ingest_hook(precompute_chart_payloads)
+register_post_ingest_hook(materialize_product_scores)
+register_post_ingest_hook(materialize_daily_metrics)
+register_post_ingest_hook(materialize_query_rollups)
+register_post_ingest_hook(refresh_schema_catalog)
+register_post_ingest_hook(materialize_anomalies)
+register_post_ingest_hook(materialize_daily_sketches)
+# Last, so read nodes get the derived tables of the version they serve
+register_post_ingest_hook(publish_database_snapshot_hook)
+
+register_delta_ingest_hook(refresh_query_rollups, replaces=materialize_query_rollups)
+register_delta_ingest_hook(refresh_daily_metrics, replaces=materialize_daily_metrics)
+register_delta_ingest_hook(refresh_daily_sketches, replaces=materialize_daily_sketches)
+
+def run_ingest(db_manager: DatabaseManager = None) -> int:
+    """Ingest the source CSVs (once across processes) and return the data version to serve"""
+    db_manager = db_manager or DatabaseManager()
+    return db_manager.initialize_database_once()
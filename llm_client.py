@@ -0,0 +1,261 @@
+import json
+import logging
+import os
+import random
+import re
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from concurrent.futures import TimeoutError as FutureTimeoutError
+from typing import Callable, Dict, Any, Optional
+from google import genai
+from google.genai import types
+
+logger = logging.getLogger(__name__)
+
+LLM_BACKEND = os.environ.get("LLM_BACKEND", "gemini")
+LLM_MODEL = os.environ.get("LLM_MODEL", "gemini-2.5-flash")
+
+class LLMError(Exception):
+    """The language model could not produce an answer"""
+
+class LLMTimeoutError(LLMError):
+    """A call or the overall deadline ran out"""
+
+class LLMUnavailableError(LLMError):
+    """The circuit breaker is open, so calls fail fast without reaching the upstream"""
+
+class RetryableError(LLMError):
+    """A transient upstream failure (5xx, 429, connection problems) worth retrying"""
+
+def is_retryable(error: Exception) -> bool:
+    """Timeouts, rate limits, 5xx responses and transport errors are transient"""
+    if isinstance(error, (RetryableError, LLMTimeoutError, TimeoutError, ConnectionError)):
+        return True
+    code = getattr(error, 'code', None)
+    if isinstance(code, int):
+        return code == 429 or code >= 500
+    try:
+        import httpx
+        return isinstance(error, httpx.TransportError)
+    except ImportError:
+        return False
+
+class GeminiBackend:
+    """Gemini generate_content with a per-call HTTP timeout"""
+
+    def __init__(self, api_key: str = None, model: str = LLM_MODEL):
+        self.client = genai.Client(api_key=api_key or os.environ.get("GEMINI_API_KEY"))
+        self.model = model
+
+    def generate(self, prompt: str, timeout: float) -> str:
+        response = self.client.models.generate_content(
+            model=self.model,
+            contents=[types.Content(role="user", parts=[types.Part(text=prompt)])],
+            config=types.GenerateContentConfig(http_options=types.HttpOptions(timeout=int(timeout * 1000)))
+        )
+        return response.text or ""
+
+class FakeBackend:
+    """Local stand-in for the upstream: canned answers with configurable latency and failures.
+
+    `failures` makes the next N calls raise `error`; `responder` maps a prompt
+    to the reply. The default answers SQL prompts with a total-sales query.
+    """
+
+    def __init__(self, responder: Callable[[str], str] = None, latency: float = 0.0,
+                 failures: int = 0, error: Exception = None):
+        self.responder = responder or self._default_responder
+        self.latency = latency
+        self.failures = failures
+        self.error = error or RetryableError("fake upstream failure")
+        self.calls = 0
+        self.active = 0
+        self.max_active = 0
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def _default_responder(prompt: str) -> str:
+        if 'Generate SQL queries for these numbered questions' in prompt:
+            numbers = re.findall(r'^\s*(\d+)\. ', prompt.split('numbered questions', 1)[1], re.MULTILINE)
+            return json.dumps({number: "SELECT SUM(total_sales) AS total_sales FROM total_sales;" for number in numbers})
+        if 'Generate a SQL query' in prompt:
+            return "SELECT SUM(total_sales) AS total_sales FROM total_sales;"
+        return "This is a canned analysis from the fake LLM backend."
+
+    def generate(self, prompt: str, timeout: float) -> str:
+        with self._lock:
+            self.calls += 1
+            self.active += 1
+            self.max_active = max(self.max_active, self.active)
+            fail = self.failures > 0
+            if fail:
+                self.failures -= 1
+        try:
+            if self.latency:
+                time.sleep(self.latency)
+            if fail:
+                raise self.error
+            return self.responder(prompt)
+        finally:
+            with self._lock:
+                self.active -= 1
+
+class CircuitBreaker:
+    """Closed -> open after `failure_threshold` consecutive failures; half-open after `reset_timeout`.
+
+    While open every call fails fast. Half-open lets one trial call through:
+    success closes the circuit, failure opens it again, and a neutral outcome
+    (a request the upstream rejected) frees the trial slot for the next call.
+    """
+
+    def __init__(self, failure_threshold: int = 5, reset_timeout: float = 30.0):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.state = 'closed'
+        self.failures = 0
+        self.opened_at = 0.0
+        self._trial_in_flight = False
+        self._lock = threading.Lock()
+
+    def allow(self) -> bool:
+        with self._lock:
+            if self.state == 'closed':
+                return True
+            if self.state == 'open' and time.monotonic() - self.opened_at >= self.reset_timeout:
+                self.state = 'half_open'
+            if self.state == 'half_open' and not self._trial_in_flight:
+                self._trial_in_flight = True
+                return True
+            return False
+
+    def record_success(self):
+        with self._lock:
+            if self.state != 'closed':
+                logger.info("LLM circuit closed")
+            self.state = 'closed'
+            self.failures = 0
+            self._trial_in_flight = False
+
+    def record_neutral(self):
+        """An outcome that says nothing about upstream health: release a half-open trial, change nothing else"""
+        with self._lock:
+            self._trial_in_flight = False
+
+    def record_failure(self):
+        with self._lock:
+            self.failures += 1
+            self._trial_in_flight = False
+            if self.state == 'half_open' or self.failures >= self.failure_threshold:
+                if self.state != 'open':
+                    logger.error(f"LLM circuit opened after {self.failures} consecutive failures")
+                self.state = 'open'
+                self.opened_at = time.monotonic()
+
+class ResilientLLMClient:
+    """Bounded, deadline-aware access to an LLM backend with retries and a circuit breaker.
+
+    Calls run on a small thread pool so a request thread stops waiting when its
+    deadline passes even if the upstream call hangs; the concurrency slot is
+    only released when the upstream call actually returns.
+    """
+
+    def __init__(self, backend=None, max_concurrency: int = None, timeout: float = None, deadline: float = None,
+                 max_retries: int = None, base_delay: float = None, max_delay: float = None,
+                 breaker: CircuitBreaker = None):
+        self.backend = backend if backend is not None else make_backend()
+        self.max_concurrency = max_concurrency if max_concurrency is not None else int(os.environ.get("LLM_MAX_CONCURRENCY", 4))
+        self.timeout = timeout if timeout is not None else float(os.environ.get("LLM_TIMEOUT", 20))
+        self.deadline = deadline if deadline is not None else float(os.environ.get("LLM_DEADLINE", 45))
+        self.max_retries = max_retries if max_retries is not None else int(os.environ.get("LLM_MAX_RETRIES", 3))
+        self.base_delay = base_delay if base_delay is not None else float(os.environ.get("LLM_RETRY_BASE_DELAY", 0.5))
+        self.max_delay = max_delay if max_delay is not None else float(os.environ.get("LLM_RETRY_MAX_DELAY", 8))
+        self.breaker = breaker or CircuitBreaker(
+            failure_threshold=int(os.environ.get("LLM_BREAKER_THRESHOLD", 5)),
+            reset_timeout=float(os.environ.get("LLM_BREAKER_RESET", 30))
+        )
+
+        self._slots = threading.BoundedSemaphore(self.max_concurrency)
+        self._executor = ThreadPoolExecutor(max_workers=self.max_concurrency, thread_name_prefix='llm')
+        self._stats_lock = threading.Lock()
+        self.stats = {'calls': 0, 'succeeded': 0, 'failed': 0, 'retries': 0, 'timeouts': 0, 'rejected': 0}
+
+    def _count(self, key: str):
+        with self._stats_lock:
+            self.stats[key] += 1
+
+    def generate(self, prompt: str, deadline: float = None) -> str:
+        """Generate text, retrying transient failures until the deadline (seconds from now)"""
+        self._count('calls')
+        expires = time.monotonic() + (deadline if deadline is not None else self.deadline)
+
+        for attempt in range(self.max_retries + 1):
+            if not self.breaker.allow():
+                self._count('rejected')
+                raise LLMUnavailableError("LLM upstream is unhealthy; circuit is open")
+            try:
+                text = self._call(prompt, expires)
+            except Exception as e:
+                retryable = is_retryable(e)
+                if retryable:
+                    self.breaker.record_failure()
+                else:
+                    # A request the upstream rejects says nothing about its health
+                    self.breaker.record_neutral()
+                remaining = expires - time.monotonic()
+                if not retryable or attempt == self.max_retries or remaining <= 0:
+                    self._count('failed')
+                    if isinstance(e, LLMError):
+                        raise
+                    raise LLMError(f"LLM call failed: {str(e)}") from e
+                # Full jitter keeps retrying clients from synchronizing
+                delay = min(random.uniform(0, min(self.max_delay, self.base_delay * 2 ** attempt)), remaining)
+                logger.warning(f"LLM call failed ({str(e)}); retry {attempt + 1}/{self.max_retries} in {delay:.2f}s")
+                self._count('retries')
+                time.sleep(delay)
+                continue
+
+            self.breaker.record_success()
+            self._count('succeeded')
+            return text
+
+    def _call(self, prompt: str, expires: float) -> str:
+        """One attempt, bounded by the per-call timeout and the overall deadline"""
+        remaining = expires - time.monotonic()
+        if remaining <= 0 or not self._slots.acquire(timeout=remaining):
+            self._count('timeouts')
+            raise LLMTimeoutError("No LLM slot available before the deadline")
+        timeout = min(self.timeout, max(expires - time.monotonic(), 0.001))
+        try:
+            future = self._executor.submit(self.backend.generate, prompt, timeout)
+        except Exception:
+            self._slots.release()
+            raise
+        future.add_done_callback(lambda _: self._slots.release())
+        try:
+            return future.result(timeout=timeout)
+        except FutureTimeoutError:
+            self._count('timeouts')
+            raise LLMTimeoutError(f"LLM call timed out after {timeout:.1f}s")
+
+    def health(self) -> Dict[str, Any]:
+        with self._stats_lock:
+            stats = dict(self.stats)
+        return {'backend': type(self.backend).__name__, 'circuit': self.breaker.state, **stats}
+
+def make_backend():
+    """The backend selected by LLM_BACKEND: 'gemini' or 'fake'"""
+    if LLM_BACKEND == 'fake':
+        return FakeBackend(latency=float(os.environ.get("LLM_FAKE_LATENCY", 0)))
+    return GeminiBackend()
+
+_client: Optional[ResilientLLMClient] = None
+_client_lock = threading.Lock()
+
+def get_llm_client() -> ResilientLLMClient:
+    """Get the process-wide LLM client, so the concurrency limit and circuit are shared"""
+    global _client
+    with _client_lock:
+        if _client is None:
+            _client = ResilientLLMClient()
+        return _client
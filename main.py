@@ -6,10 +6,12 @@ try:
 except ImportError:
     print("ℹ️ python-dotenv not installed, using system environment variables")
 
-from app import app
+from app import app, start_warmup
 import logging
 import os
-from database import DatabaseManager
+from database import DatabaseManager, SERVE_SNAPSHOTS
+from ingest import run_ingest
+from snapshots import start_snapshot_follower
 
 # Configure logging
 logging.basicConfig(level=logging.DEBUG)
@@ -17,9 +19,25 @@ logger = logging.getLogger(__name__)
 
 # Initialize database on startup
 db_manager = DatabaseManager()
-logger.info("Initializing database...")
-db_manager.initialize_database()
-logger.info("Database initialized successfully")
+if SERVE_SNAPSHOTS:
+    # Read node: serve the newest published database snapshot and follow new ones
+    logger.info("Waiting for a published database snapshot...")
+    version = start_snapshot_follower().version
+elif os.environ.get("INGEST_MODE") == "leader":
+    # The gunicorn master already ingested before forking (see gunicorn.conf.py),
+    # so workers only wait for the published data version
+    logger.info("Waiting for data version from ingest leader...")
+    version = db_manager.wait_for_data_version()
+else:
+    logger.info("Initializing database...")
+    version = run_ingest(db_manager)
+logger.info(f"Database ready (data version {version})")
+if not SERVE_SNAPSHOTS:
+    # Ingest already started it when it ran here; otherwise this worker may claim it.
+    # Read nodes can't store warm payloads in an immutable snapshot
+    start_warmup(version)
+    # Ingest delta files from WATCH_DIR in the background, if configured
+    db_manager.start_watch()
 
 if __name__ == '__main__':
     port = int(os.environ.get("PORT", 5000))
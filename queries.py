@@ -0,0 +1,194 @@
+import os
+from typing import List, Dict, Any
+from sqlalchemy import text
+from database import DatabaseManager, BIND_PARAM
+from columnar import get_columnar_store
+
+# Which engine answers the fixed dashboard queries: 'sql' or 'columnar'
+ANALYTICS_BACKEND = os.environ.get("ANALYTICS_BACKEND", "sql")
+
+# Fixed analytics and dashboard queries by name, with :name bound parameters.
+# The columnar backend answers each of these from in-memory arrays; see
+# ColumnarStore in columnar.py.
+FIXED_QUERIES = {
+    'business_sales': """
+        SELECT 
+            SUM(total_sales) as total_revenue,
+            SUM(total_units_ordered) as total_units,
+            COUNT(DISTINCT item_id) as active_products,
+            AVG(total_sales) as avg_sales_per_transaction,
+            COUNT(DISTINCT date) as active_days
+        FROM total_sales WHERE total_sales > 0
+    """,
+    'business_ads': """
+        SELECT 
+            SUM(ad_sales) as total_ad_revenue,
+            SUM(ad_spend) as total_ad_spend,
+            SUM(impressions) as total_impressions,
+            SUM(clicks) as total_clicks,
+            SUM(units_sold) as total_ad_units,
+            CASE WHEN SUM(ad_spend) > 0 THEN SUM(ad_sales) / SUM(ad_spend) ELSE 0 END as overall_roas,
+            CASE WHEN SUM(clicks) > 0 THEN SUM(ad_spend) / SUM(clicks) ELSE 0 END as avg_cpc,
+            CASE WHEN SUM(impressions) > 0 THEN SUM(clicks) * 100.0 / SUM(impressions) ELSE 0 END as overall_ctr,
+            CASE WHEN SUM(clicks) > 0 THEN SUM(units_sold) * 100.0 / SUM(clicks) ELSE 0 END as overall_conversion_rate
+        FROM ad_sales WHERE ad_spend > 0
+    """,
+    'business_eligibility': """
+        SELECT 
+            SUM(CASE WHEN eligibility = 'TRUE' THEN 1 ELSE 0 END) as eligible_products,
+            COUNT(*) as total_products_checked,
+            SUM(CASE WHEN eligibility = 'TRUE' THEN 1 ELSE 0 END) * 100.0 / COUNT(*) as eligibility_rate
+        FROM (
+            SELECT DISTINCT item_id, eligibility 
+            FROM eligibility 
+            WHERE eligibility_datetime_utc = (
+                SELECT MAX(eligibility_datetime_utc) 
+                FROM eligibility e2 
+                WHERE e2.item_id = eligibility.item_id
+            )
+        ) latest_eligibility
+    """,
+    'daily_sales': """
+        SELECT 
+            date,
+            SUM(total_sales) as daily_sales,
+            SUM(total_units_ordered) as daily_units,
+            COUNT(DISTINCT item_id) as active_products
+        FROM total_sales 
+        WHERE total_sales > 0 
+        GROUP BY date 
+        ORDER BY date DESC 
+        LIMIT :days
+    """,
+    'daily_ad_performance': """
+        SELECT 
+            date,
+            SUM(ad_sales) as daily_ad_sales,
+            SUM(ad_spend) as daily_ad_spend,
+            SUM(impressions) as daily_impressions,
+            SUM(clicks) as daily_clicks,
+            CASE WHEN SUM(ad_spend) > 0 THEN SUM(ad_sales) / SUM(ad_spend) ELSE 0 END as daily_roas
+        FROM ad_sales 
+        WHERE ad_spend > 0 
+        GROUP BY date 
+        ORDER BY date DESC 
+        LIMIT :days
+    """,
+    'product_performance': """
+        SELECT 
+            ts.item_id,
+            SUM(ts.total_sales) as total_revenue,
+            SUM(ts.total_units_ordered) as total_units,
+            SUM(ads.ad_sales) as ad_revenue,
+            SUM(ads.ad_spend) as ad_spend,
+            SUM(ads.impressions) as impressions,
+            SUM(ads.clicks) as clicks,
+            SUM(ads.units_sold) as ad_units,
+            CASE WHEN SUM(ads.ad_spend) > 0 THEN SUM(ads.ad_sales) / SUM(ads.ad_spend) ELSE 0 END as roas,
+            CASE WHEN SUM(ads.clicks) > 0 THEN SUM(ads.ad_spend) / SUM(ads.clicks) ELSE 0 END as cpc,
+            CASE WHEN SUM(ads.impressions) > 0 THEN SUM(ads.clicks) * 100.0 / SUM(ads.impressions) ELSE 0 END as ctr,
+            CASE WHEN SUM(ads.clicks) > 0 THEN SUM(ads.units_sold) * 100.0 / SUM(ads.clicks) ELSE 0 END as conversion_rate,
+            e.eligibility as is_eligible
+        FROM total_sales ts
+        LEFT JOIN ad_sales ads ON ts.item_id = ads.item_id
+        LEFT JOIN (
+            SELECT DISTINCT item_id, eligibility 
+            FROM eligibility 
+            WHERE eligibility_datetime_utc = (
+                SELECT MAX(eligibility_datetime_utc) 
+                FROM eligibility e2 
+                WHERE e2.item_id = eligibility.item_id
+            )
+        ) e ON ts.item_id = e.item_id
+        WHERE ts.total_sales > 0
+        GROUP BY ts.item_id, e.eligibility
+    """,
+    'sales_trend': """
+        SELECT date, SUM(total_sales) as daily_sales, SUM(total_units_ordered) as daily_units
+        FROM total_sales 
+        WHERE total_sales > 0
+        GROUP BY date 
+        ORDER BY date
+    """,
+    'top_products': """
+        SELECT item_id, SUM(total_sales) as total_product_sales, SUM(total_units_ordered) as total_units
+        FROM total_sales 
+        WHERE total_sales > 0
+        GROUP BY item_id 
+        ORDER BY total_product_sales DESC 
+        LIMIT :limit
+    """,
+    'roas_by_product': """
+        SELECT 
+            item_id,
+            SUM(ad_sales) as total_ad_sales,
+            SUM(ad_spend) as total_ad_spend,
+            CASE 
+                WHEN SUM(ad_spend) > 0 THEN SUM(ad_sales) / SUM(ad_spend)
+                ELSE 0 
+            END as roas
+        FROM ad_sales 
+        WHERE ad_spend > 0 AND ad_sales > 0
+        GROUP BY item_id 
+        ORDER BY roas DESC 
+        LIMIT :limit
+    """,
+    'eligibility_distribution': """
+        SELECT 
+            eligibility,
+            COUNT(*) as count
+        FROM (
+            SELECT DISTINCT item_id, eligibility 
+            FROM eligibility 
+            WHERE eligibility_datetime_utc = (
+                SELECT MAX(eligibility_datetime_utc) 
+                FROM eligibility e2 
+                WHERE e2.item_id = eligibility.item_id
+            )
+        ) latest_eligibility
+        GROUP BY eligibility
+    """,
+    'ad_performance': """
+        SELECT 
+            item_id,
+            SUM(ad_spend) as total_spend,
+            SUM(clicks) as total_clicks,
+            SUM(units_sold) as total_conversions,
+            CASE 
+                WHEN SUM(clicks) > 0 THEN SUM(ad_spend) * 1.0 / SUM(clicks)
+                ELSE 0 
+            END as cpc,
+            CASE 
+                WHEN SUM(clicks) > 0 THEN SUM(units_sold) * 100.0 / SUM(clicks)
+                ELSE 0 
+            END as conversion_rate
+        FROM ad_sales 
+        WHERE clicks > 0 AND ad_spend > 0
+        GROUP BY item_id
+        HAVING SUM(ad_spend) > 10
+    """,
+}
+
+# Compiled once; every call reuses the same statement text, so statement and plan caches hit
+NAMED_QUERIES = {name: text(sql) for name, sql in FIXED_QUERIES.items()}
+QUERY_PARAMS = {name: set(BIND_PARAM.findall(sql)) for name, sql in FIXED_QUERIES.items()}
+
+def bind_params(name: str, params: Dict[str, Any]) -> Dict[str, int]:
+    """Check a fixed query's parameters (all positive integers) against the ones it binds"""
+    if name not in FIXED_QUERIES:
+        raise ValueError(f"Unknown query: {name}")
+    expected = QUERY_PARAMS[name]
+    if set(params) != expected:
+        raise ValueError(f"{name} takes parameters {sorted(expected) or 'none'}, got {sorted(params) or 'none'}")
+    bound = {key: int(value) for key, value in params.items()}
+    if any(value < 1 for value in bound.values()):
+        raise ValueError(f"{name} parameters must be positive")
+    return bound
+
+def run_fixed_query(db_manager: DatabaseManager, name: str, backend: str = None, **params: Any) -> List[Dict[str, Any]]:
+    """Run a fixed query on the selected analytics backend"""
+    backend = backend or ANALYTICS_BACKEND
+    params = bind_params(name, params)
+    if backend == 'columnar':
+        return get_columnar_store(db_manager).run(name, **params)
+    return db_manager.execute_query(NAMED_QUERIES[name], params, prepare_as=name)
@@ -0,0 +1,162 @@
+import logging
+import os
+import re
+import sys
+import threading
+from collections import OrderedDict
+from typing import List, Dict, Any, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+# Memory budget for memoized execute_query results; 0 turns memoization off
+QUERY_CACHE_MB = float(os.environ.get("QUERY_CACHE_MB", 0))
+# Statements whose hit rates are tracked (least recently run are dropped first)
+QUERY_CACHE_STATEMENTS = 1000
+
+STRING_LITERAL = re.compile(r"('(?:[^']|'')*')")
+# Functions whose result changes between calls with the same data
+VOLATILE_FUNCTIONS = re.compile(r'(?i)\b(random|now|current_date|current_time|current_timestamp|localtimestamp|'
+                                r'clock_timestamp|statement_timestamp|date\s*\(\s*\'now\')')
+
+# Tables whose rows only change in the transaction that publishes a new data version
+_cacheable_tables = set()
+
+def register_cacheable_tables(*tables: str):
+    """Allow memoizing statements that read only these tables (and their own CTEs)"""
+    _cacheable_tables.update(table.lower() for table in tables)
+
+SQL_TOKEN = re.compile(r'"[^"]*"|[a-z_][\w$]*(?:\.[a-z_][\w$]*)*|[(),]')
+CTE_NAME = re.compile(r'(?:\bwith(?:\s+recursive)?|,)\s*([a-z_]\w*)\s*(?:\([^)]*\))?\s+as\s*\(')
+# Words that end a FROM list; any other word after a table is its alias
+CLAUSE_KEYWORDS = {'where', 'on', 'using', 'group', 'order', 'having', 'limit', 'offset', 'union', 'intersect',
+                   'except', 'window', 'left', 'right', 'inner', 'outer', 'full', 'cross', 'natural', 'select'}
+
+def referenced_tables(sql: str) -> set:
+    """Names read after FROM or JOIN (including comma lists and subqueries), minus the statement's CTEs"""
+    statement = STRING_LITERAL.sub("''", re.sub(r'--[^\n]*|/\*.*?\*/', ' ', sql, flags=re.DOTALL)).lower()
+    tables, state, stack = set(), None, []
+    for token in SQL_TOKEN.findall(statement):
+        if token in ('from', 'join'):
+            state = 'table'
+        elif token == '(':
+            # After the parenthesized subquery the FROM list goes on
+            stack.append('alias' if state == 'table' else state)
+            state = None
+        elif token == ')':
+            state = stack.pop() if stack else None
+        elif token == ',':
+            state = 'table' if state == 'alias' else state
+        elif state == 'table':
+            tables.add(token.strip('"').split('.')[-1])
+            state = 'alias'
+        elif state == 'alias' and token in CLAUSE_KEYWORDS:
+            state = None
+    return tables - set(CTE_NAME.findall(statement))
+
+def is_read_only(sql: str) -> bool:
+    """Only a single SELECT (or WITH ... SELECT) statement is read-only"""
+    statement = re.sub(r'--[^\n]*|/\*.*?\*/', ' ', sql, flags=re.DOTALL).strip().rstrip(';').strip()
+    return bool(re.match(r'(?i)(select|with)\b', statement)) and ';' not in statement
+
+def normalize_sql(sql: str) -> str:
+    """Collapse whitespace and lowercase everything outside string literals"""
+    parts = STRING_LITERAL.split(sql.strip().rstrip(';'))
+    # split() with a capture group puts the literals at the odd indexes
+    return ''.join(part if i % 2 else re.sub(r'\s+', ' ', part).lower() for i, part in enumerate(parts)).strip()
+
+def estimate_bytes(rows: List[Dict[str, Any]]) -> int:
+    """Approximate memory held by result rows, extrapolated from a sample"""
+    if not rows:
+        return sys.getsizeof(rows)
+    sample = rows[:100]
+    sampled = sum(sys.getsizeof(row) + sum(sys.getsizeof(value) for value in row.values()) for row in sample)
+    return sys.getsizeof(rows) + sampled * len(rows) // len(sample)
+
+class QueryCache:
+    """LRU memo of query results by normalized SQL, bound parameters and data version, evicted by size"""
+
+    def __init__(self, max_bytes: int):
+        self.max_bytes = max_bytes
+        self._entries: "OrderedDict[Tuple, Tuple[List[Dict[str, Any]], int]]" = OrderedDict()
+        self._statements: "OrderedDict[str, Dict[str, int]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.bytes = 0
+        self.evictions = 0
+
+    @property
+    def enabled(self) -> bool:
+        return self.max_bytes > 0
+
+    def key(self, database_url: str, sql: str, params: Optional[Dict[str, Any]], version: int) -> Optional[Tuple]:
+        """Cache key for a statement, or None when it must not be memoized"""
+        if not is_read_only(sql) or VOLATILE_FUNCTIONS.search(sql):
+            return None
+        # Other tables (history, warm-up state, derived data rebuilt after the bump) change within a version
+        if not referenced_tables(sql) <= _cacheable_tables:
+            return None
+        bound = repr(sorted(params.items())) if params else ''
+        return (database_url, normalize_sql(sql), bound, version)
+
+    def _count(self, statement: str, outcome: str):
+        counts = self._statements.get(statement)
+        if counts is None:
+            counts = self._statements[statement] = {'hits': 0, 'misses': 0}
+            while len(self._statements) > QUERY_CACHE_STATEMENTS:
+                self._statements.popitem(last=False)
+        self._statements.move_to_end(statement)
+        counts[outcome] += 1
+
+    def get(self, key: Tuple) -> Optional[List[Dict[str, Any]]]:
+        with self._lock:
+            entry = self._entries.get(key)
+            self._count(key[1], 'hits' if entry else 'misses')
+            if entry is None:
+                return None
+            self._entries.move_to_end(key)
+        # Callers may modify the rows they get back
+        return [dict(row) for row in entry[0]]
+
+    def put(self, key: Tuple, rows: List[Dict[str, Any]]):
+        size = estimate_bytes(rows)
+        # One huge result would flush everything else
+        if size > self.max_bytes // 4:
+            return
+        with self._lock:
+            if key in self._entries:
+                return
+            self._entries[key] = ([dict(row) for row in rows], size)
+            self.bytes += size
+            while self.bytes > self.max_bytes:
+                _, (_, evicted) = self._entries.popitem(last=False)
+                self.bytes -= evicted
+                self.evictions += 1
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._statements.clear()
+            self.bytes = 0
+
+    def stats(self, limit: int = 20) -> Dict[str, Any]:
+        """Overall and per-statement hit rates, most-run statements first"""
+        with self._lock:
+            statements = [{'sql': sql, **counts, 'hit_rate': counts['hits'] / (counts['hits'] + counts['misses'])}
+                          for sql, counts in self._statements.items()]
+            hits = sum(statement['hits'] for statement in statements)
+            misses = sum(statement['misses'] for statement in statements)
+            entries = len(self._entries)
+        statements.sort(key=lambda statement: statement['hits'] + statement['misses'], reverse=True)
+        return {
+            'enabled': self.enabled,
+            'entries': entries,
+            'bytes': self.bytes,
+            'max_bytes': self.max_bytes,
+            'evictions': self.evictions,
+            'hits': hits,
+            'misses': misses,
+            'hit_rate': hits / (hits + misses) if hits + misses else None,
+            'statements': statements[:limit],
+        }
+
+# Shared by every DatabaseManager in the process
+query_cache = QueryCache(int(QUERY_CACHE_MB * 1024 * 1024))
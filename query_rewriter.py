@@ -0,0 +1,490 @@
+import logging
+import math
+import os
+import random
+import re
+import threading
+import time
+from typing import List, Dict, Any, Optional, Tuple
+from sqlalchemy import bindparam, text
+from database import DatabaseManager
+from query_cache import register_cacheable_tables
+
+logger = logging.getLogger(__name__)
+
+QUERY_REWRITE = os.environ.get("QUERY_REWRITE", "true").lower() == "true"
+# Fraction of rewritten queries also run as written, to measure time saved and check results
+QUERY_REWRITE_SAMPLE_RATE = float(os.environ.get("QUERY_REWRITE_SAMPLE_RATE", 0.05))
+
+# Fact tables with rollups: additive measure columns and the grains they are rolled up by
+ROLLUP_SOURCES = {
+    'total_sales': ['total_sales', 'total_units_ordered'],
+    'ad_sales': ['ad_sales', 'impressions', 'ad_spend', 'clicks', 'units_sold'],
+}
+ROLLUP_GRAINS = ('date', 'item_id')
+LATEST_ELIGIBILITY_TABLE = 'eligibility_latest'
+
+def rollup_table(source: str, grain: str) -> str:
+    return f"{source}_by_{'day' if grain == 'date' else 'item'}"
+
+ROLLUP_TABLES = [rollup_table(source, grain) for source in ROLLUP_SOURCES for grain in ROLLUP_GRAINS] + [LATEST_ELIGIBILITY_TABLE]
+# Deltas update the rollups in the bump's transaction, and full rebuilds are only read
+# once every rollup carries the served version (see _rollups_ready)
+register_cacheable_tables(*ROLLUP_TABLES)
+
+KEEP = object()   # an aggregate call that reads the same on the rollup
+
+AGGREGATES = {'SUM', 'TOTAL', 'COUNT', 'AVG', 'MIN', 'MAX'}
+# Deterministic row-by-row functions that give the same value on a rollup row as on the
+# rows it summarizes. Any other call (GROUP_CONCAT, string_agg, random ...) stops the rewrite
+SCALAR_FUNCTIONS = {
+    'ROUND', 'ABS', 'SIGN', 'CEIL', 'CEILING', 'FLOOR', 'COALESCE', 'IFNULL', 'NULLIF', 'CAST',
+    'GREATEST', 'LEAST', 'UPPER', 'LOWER', 'LENGTH', 'SUBSTR', 'SUBSTRING', 'TRIM', 'REPLACE', 'INSTR',
+    'PRINTF', 'STRFTIME', 'DATE', 'DATETIME', 'JULIANDAY', 'DATE_TRUNC', 'TO_CHAR',
+}
+KEYWORDS = {
+    'SELECT', 'FROM', 'WHERE', 'GROUP', 'BY', 'ORDER', 'HAVING', 'LIMIT', 'OFFSET', 'AS', 'AND', 'OR',
+    'NOT', 'IN', 'IS', 'NULL', 'BETWEEN', 'LIKE', 'CASE', 'WHEN', 'THEN', 'ELSE', 'END', 'ASC', 'DESC',
+    'DISTINCT', 'TRUE', 'FALSE', 'NULLS', 'FIRST', 'LAST', 'ESCAPE',
+}
+# Constructs whose presence means the aggregate rewrite can't reason about the query
+UNSUPPORTED = {'JOIN', 'UNION', 'INTERSECT', 'EXCEPT', 'WITH', 'OVER', 'WINDOW', 'INTO', 'VALUES'}
+
+TOKEN = re.compile(r"""
+    (?P<space>\s+)
+  | (?P<string>'(?:[^']|'')*')
+  | (?P<number>\d+(?:\.\d+)?)
+  | (?P<name>[A-Za-z_]\w*(?:\.[A-Za-z_]\w*)?)
+  | (?P<op><=|>=|<>|!=|\|\||[(),*=<>+\-/%;])
+""", re.VERBOSE)
+
+# (SELECT MAX(eligibility_datetime_utc) FROM eligibility [e2] [WHERE e2.item_id = outer.item_id])
+LATEST_ELIGIBILITY = re.compile(r"""
+    \(\s*SELECT\s+MAX\s*\(\s*(?:(?P<q1>\w+)\.)?eligibility_datetime_utc\s*\)
+    \s+FROM\s+eligibility(?:\s+(?:AS\s+)?(?P<alias>(?!WHERE\b)\w+))?
+    (?:\s+WHERE\s+(?:
+        (?:(?P<q2>\w+)\.)?item_id\s*=\s*(?P<outer1>\w+\.item_id)
+      | (?P<outer2>\w+\.item_id)\s*=\s*(?:(?P<q3>\w+)\.)?item_id
+    ))?\s*\)
+""", re.IGNORECASE | re.VERBOSE)
+
+class Token:
+    __slots__ = ('kind', 'value', 'start', 'end')
+
+    def __init__(self, kind: str, value: str, start: int, end: int):
+        self.kind, self.value, self.start, self.end = kind, value, start, end
+
+    @property
+    def upper(self) -> str:
+        return self.value.upper()
+
+def tokenize(sql: str) -> Optional[List[Token]]:
+    """Split SQL into tokens (whitespace dropped), or None if it has anything unrecognized"""
+    tokens, position = [], 0
+    while position < len(sql):
+        match = TOKEN.match(sql, position)
+        if not match:
+            return None
+        if match.lastgroup != 'space':
+            tokens.append(Token(match.lastgroup, match.group(), match.start(), match.end()))
+        position = match.end()
+    return tokens
+
+def _rewrite_latest_eligibility(sql: str) -> Optional[str]:
+    """Answer MAX(eligibility_datetime_utc) subqueries from the per-item latest timestamp"""
+    def substitute(match):
+        inner = (match.group('alias') or 'eligibility').lower()
+        qualifiers = [q.lower() for q in (match.group('q1'), match.group('q2'), match.group('q3')) if q]
+        if any(q not in (inner, 'eligibility') for q in qualifiers):
+            return match.group()
+        outer = match.group('outer1') or match.group('outer2')
+        if outer is None:
+            return f"(SELECT MAX(eligibility_datetime_utc) FROM {LATEST_ELIGIBILITY_TABLE})"
+        # outer.item_id must point outside the subquery, or the correlation changes meaning
+        if outer.split('.')[0].lower() in (inner, 'eligibility'):
+            return match.group()
+        return (f"(SELECT latest.eligibility_datetime_utc FROM {LATEST_ELIGIBILITY_TABLE} latest "
+                f"WHERE latest.item_id = {outer})")
+
+    rewritten = LATEST_ELIGIBILITY.sub(substitute, sql)
+    return rewritten if rewritten != sql else None
+
+def _matching_paren(tokens: List[Token], open_index: int) -> int:
+    depth = 0
+    for index in range(open_index, len(tokens)):
+        if tokens[index].value == '(':
+            depth += 1
+        elif tokens[index].value == ')':
+            depth -= 1
+            if depth == 0:
+                return index
+    return -1
+
+def _select_items(tokens: List[Token], end: int) -> List[Tuple[int, int, Optional[str]]]:
+    """(first, last token index, output alias) of each top-level item of the SELECT list before `end`"""
+    bounds, depth, first = [], 0, 1
+    for index in range(1, end + 1):
+        if index == end or (tokens[index].value == ',' and depth == 0):
+            bounds.append((first, index - 1))
+            first = index + 1
+        elif tokens[index].value == '(':
+            depth += 1
+        elif tokens[index].value == ')':
+            depth -= 1
+
+    items = []
+    for first, last in bounds:
+        alias = None
+        if last > first and tokens[last].kind == 'name' and tokens[last].upper not in KEYWORDS:
+            previous = tokens[last - 1]
+            if previous.upper in ('AS', 'END') or previous.value == ')' or (
+                    previous.kind in ('name', 'number', 'string') and previous.upper not in KEYWORDS):
+                alias = tokens[last].value
+        items.append((first, last, alias))
+    return items
+
+def _quote(name: str) -> str:
+    return '"' + name.replace('"', '""') + '"'
+
+def _rewrite_aggregate(sql: str, postgres: bool = False) -> Optional[Tuple[str, str]]:
+    """Rewrite a single-table aggregate over a fact table to its per-day or per-item rollup.
+
+    Only queries that provably give the same rows are rewritten: one table, no
+    joins or subqueries, every filter, grouping and bare column on a single
+    grain column, every measure used only inside SUM/TOTAL/COUNT/AVG/MIN/MAX, and
+    no other function outside SCALAR_FUNCTIONS.
+    """
+    tokens = tokenize(sql)
+    if not tokens or tokens[0].upper != 'SELECT':
+        return None
+    if sum(token.upper == 'SELECT' for token in tokens) != 1 or any(token.upper in UNSUPPORTED for token in tokens):
+        return None
+    if len(tokens) > 1 and tokens[1].upper == 'DISTINCT':
+        return None
+
+    # FROM <source> [[AS] alias] followed by a clause keyword or the end
+    from_index = next((i for i, token in enumerate(tokens) if token.upper == 'FROM'), None)
+    if from_index is None or from_index + 1 >= len(tokens):
+        return None
+    source_token = tokens[from_index + 1]
+    source = source_token.value.lower()
+    if source not in ROLLUP_SOURCES:
+        return None
+    after = from_index + 2
+    alias = None
+    if after < len(tokens) and tokens[after].upper == 'AS':
+        after += 1
+    if after < len(tokens) and tokens[after].kind == 'name' and tokens[after].upper not in KEYWORDS:
+        alias = tokens[after].value
+        after += 1
+    if after < len(tokens) and tokens[after].upper not in ('WHERE', 'GROUP', 'ORDER', 'HAVING', 'LIMIT'):
+        return None
+    qualifiers = {source} | ({alias.lower()} if alias else set())
+    measures = set(ROLLUP_SOURCES[source])
+    columns = measures | set(ROLLUP_GRAINS)
+
+    select_items = _select_items(tokens, from_index)
+    select_aliases = {alias.lower() for _, _, alias in select_items if alias}
+    if select_aliases & columns - set(ROLLUP_GRAINS):
+        # An output alias shadowing a measure makes ORDER BY/HAVING resolution ambiguous
+        return None
+
+    def column_of(token: Token) -> Optional[str]:
+        name = token.value.lower()
+        if '.' in name:
+            qualifier, name = name.split('.', 1)
+            if qualifier not in qualifiers:
+                raise ValueError(f"unknown qualifier {qualifier}")
+        return name if name in columns else None
+
+    replacements = {}   # token index -> replacement text (None drops the token)
+    grain_refs, grouped, bare = set(), set(), set()
+    calls = {}   # first token -> closing paren of each rewritten aggregate call
+    has_aggregate = False
+    clause = 'SELECT'
+    index = 0
+    try:
+        while index < len(tokens):
+            token = tokens[index]
+            if from_index < index < after:
+                index += 1   # the FROM table and its alias
+                continue
+            if token.upper in ('SELECT', 'WHERE', 'HAVING', 'LIMIT') or (token.upper in ('GROUP', 'ORDER')
+                                                                         and index + 1 < len(tokens) and tokens[index + 1].upper == 'BY'):
+                clause = token.upper
+            if token.kind != 'name' or token.upper in KEYWORDS:
+                index += 1
+                continue
+            if index > 0 and tokens[index - 1].upper == 'AS':
+                index += 1   # output alias or CAST target type
+                continue
+
+            is_call = index + 1 < len(tokens) and tokens[index + 1].value == '('
+            if is_call and token.upper in AGGREGATES:
+                close = _matching_paren(tokens, index + 1)
+                if close < 0:
+                    return None
+                argument = tokens[index + 2:close]
+                rewritten, grain = _rewrite_aggregate_call(token.upper, argument, column_of, measures)
+                if rewritten is None:
+                    return None
+                if grain:
+                    grain_refs.add(grain)
+                if rewritten is not KEEP:
+                    for drop in range(index, close + 1):
+                        replacements[drop] = None
+                    replacements[index] = rewritten
+                    calls[index] = close
+                has_aggregate = True
+                index = close + 1
+                continue
+            if is_call:
+                if token.upper not in SCALAR_FUNCTIONS:
+                    return None   # an aggregate or function the rewrite doesn't know
+                index += 1   # arguments are checked as we go
+                continue
+
+            column = column_of(token)
+            if column is None:
+                if token.value.lower() not in select_aliases:
+                    return None
+            elif column in measures:
+                return None   # a measure outside an aggregate needs the raw rows
+            else:
+                grain_refs.add(column)
+                if clause == 'GROUP':
+                    grouped.add(column)
+                elif clause != 'WHERE':
+                    bare.add(column)
+            index += 1
+    except ValueError:
+        return None
+
+    if not has_aggregate or len(grain_refs) > 1:
+        return None
+    if not bare <= grouped:
+        return None   # bare non-grouped columns pick an arbitrary row in SQLite
+    grain = next(iter(grain_refs)) if grain_refs else 'date'
+    target = rollup_table(source, grain)
+
+    # Keep the output column names of unaliased items whose aggregates were rewritten:
+    # SQLite names them after the expression text, PostgreSQL after the function
+    suffixes = {}
+    for first, last, item_alias in select_items:
+        if item_alias or not any(first <= call <= last for call in calls):
+            continue
+        if not postgres:
+            suffixes[last] = f" AS {_quote(sql[tokens[first].start:tokens[last].end])}"
+        elif calls.get(first) == last:
+            suffixes[last] = f" AS {_quote(tokens[first].value.lower())}"
+
+    pieces, position = [], 0
+    for token_index, token in enumerate(tokens):
+        if token_index == from_index + 1:
+            pieces.append(sql[position:token.start])
+            pieces.append(target if alias else f"{target} AS {source}")
+            position = token.end
+        elif token_index in replacements:
+            # Gaps between the tokens of a replaced call are dropped with them
+            if replacements[token_index] is not None:
+                pieces.append(sql[position:token.start])
+                pieces.append(replacements[token_index])
+            position = token.end
+        if token_index in suffixes:
+            pieces.append(sql[position:token.end] if position < token.end else '')
+            pieces.append(suffixes[token_index])
+            position = token.end
+    pieces.append(sql[position:])
+    return ''.join(pieces), target
+
+def _rewrite_aggregate_call(function: str, argument: List[Token], column_of, measures) -> Tuple[Optional[str], Optional[str]]:
+    """Rollup form of one aggregate call, plus the grain column it touches (if any)"""
+    if function == 'COUNT' and len(argument) == 1 and argument[0].value == '*':
+        return "COALESCE(SUM(row_count), 0)", None
+
+    distinct = bool(argument) and argument[0].upper == 'DISTINCT'
+    if distinct:
+        argument = argument[1:]
+    if len(argument) != 1 or argument[0].kind != 'name' or argument[0].upper in KEYWORDS:
+        return None, None
+    column = column_of(argument[0])
+    if column is None:
+        return None, None
+    prefix = argument[0].value.rsplit('.', 1)[0] + '.' if '.' in argument[0].value else ''
+
+    if column not in measures:
+        # COUNT(DISTINCT date), MIN(date) ... are unchanged on rows keyed by that grain
+        if (function == 'COUNT' and distinct) or (function in ('MIN', 'MAX') and not distinct):
+            return KEEP, column
+        return None, None
+    if distinct:
+        return None, None
+    if function in ('SUM', 'TOTAL'):
+        return f"{function}({prefix}sum_{column})", None
+    if function == 'COUNT':
+        return f"COALESCE(SUM({prefix}count_{column}), 0)", None
+    if function == 'AVG':
+        return f"(SUM({prefix}sum_{column}) * 1.0 / NULLIF(SUM({prefix}count_{column}), 0))", None
+    return f"{function}({prefix}{function.lower()}_{column})", None
+
+def _values_match(expected: Any, actual: Any) -> bool:
+    if expected is None or actual is None:
+        return expected is None and actual is None
+    if isinstance(expected, (int, float)) and isinstance(actual, (int, float)):
+        return math.isclose(expected, actual, rel_tol=1e-9, abs_tol=1e-6)
+    return str(expected) == str(actual)
+
+def results_match(expected: List[Dict[str, Any]], actual: List[Dict[str, Any]], ordered: bool) -> bool:
+    """Same rows (floats compared with a tolerance for summation order), in order if the query orders them"""
+    if len(expected) != len(actual):
+        return False
+    if not ordered:
+        key = lambda row: [str(value) for value in row.values()]
+        expected, actual = sorted(expected, key=key), sorted(actual, key=key)
+    return all(
+        list(e.keys()) == list(a.keys()) and all(_values_match(e[k], a[k]) for k in e)
+        for e, a in zip(expected, actual)
+    )
+
+class QueryRewriter:
+    """Rewrites generated SQL to read precomputed rollups when the answer is provably the same"""
+
+    def __init__(self):
+        self.db_manager = DatabaseManager()
+        self._ready_version = None
+        self._lock = threading.Lock()
+        self.stats = {'queries': 0, 'rewritten': 0, 'by_rule': {}, 'sampled': 0,
+                      'saved_ms': 0.0, 'mismatches': 0, 'fallbacks': 0}
+
+    def materialize_rollups(self, version: int):
+        """Build the per-day, per-item and latest-eligibility rollups for this data version"""
+        with self.db_manager.engine.connect() as conn:
+            for source, measures in ROLLUP_SOURCES.items():
+                for grain in ROLLUP_GRAINS:
+                    measure_columns = ', '.join(
+                        f"SUM({m}) AS sum_{m}, COUNT({m}) AS count_{m}, MIN({m}) AS min_{m}, MAX({m}) AS max_{m}"
+                        for m in measures
+                    )
+                    self._replace_table(conn, rollup_table(source, grain), f"""
+                        SELECT {grain}, COUNT(*) AS row_count, {measure_columns}, {int(version)} AS data_version
+                        FROM {source} GROUP BY {grain}
+                    """, grain)
+            self._replace_table(conn, LATEST_ELIGIBILITY_TABLE, f"""
+                SELECT item_id, MAX(eligibility_datetime_utc) AS eligibility_datetime_utc, {int(version)} AS data_version
+                FROM eligibility GROUP BY item_id
+            """, 'item_id')
+            conn.commit()
+        logger.info(f"Materialized {len(ROLLUP_TABLES)} query rollups (data version {version})")
+
+    def refresh_rollups(self, conn, version: int, changes: Dict[str, Dict[str, set]]):
+        """Recompute only the rollup rows for changed days and items, inside an incremental ingest"""
+        for source, measures in ROLLUP_SOURCES.items():
+            for grain in ROLLUP_GRAINS:
+                table = rollup_table(source, grain)
+                keys = changes.get(source, {}).get(grain)
+                if keys:
+                    measure_columns = ', '.join(
+                        f"SUM({m}) AS sum_{m}, COUNT({m}) AS count_{m}, MIN({m}) AS min_{m}, MAX({m}) AS max_{m}"
+                        for m in measures
+                    )
+                    self._replace_rows(conn, table, grain, keys, f"""
+                        SELECT {grain}, COUNT(*) AS row_count, {measure_columns}, {int(version)} AS data_version
+                        FROM {source} WHERE {grain} IN :keys GROUP BY {grain}
+                    """)
+                conn.execute(text(f"UPDATE {table} SET data_version = :version"), {'version': version})
+        
+        items = changes.get('eligibility', {}).get('item_id')
+        if items:
+            self._replace_rows(conn, LATEST_ELIGIBILITY_TABLE, 'item_id', items, f"""
+                SELECT item_id, MAX(eligibility_datetime_utc) AS eligibility_datetime_utc, {int(version)} AS data_version
+                FROM eligibility WHERE item_id IN :keys GROUP BY item_id
+            """)
+        conn.execute(text(f"UPDATE {LATEST_ELIGIBILITY_TABLE} SET data_version = :version"), {'version': version})
+        logger.info(f"Refreshed query rollups incrementally (data version {version})")
+
+    @staticmethod
+    def _replace_rows(conn, table: str, key: str, keys: set, select: str):
+        keys_param = bindparam('keys', expanding=True)
+        conn.execute(text(f"DELETE FROM {table} WHERE {key} IN :keys").bindparams(keys_param), {'keys': list(keys)})
+        conn.execute(text(f"INSERT INTO {table} {select}").bindparams(keys_param), {'keys': list(keys)})
+
+    @staticmethod
+    def _replace_table(conn, table: str, select: str, key: str):
+        conn.execute(text(f"DROP TABLE IF EXISTS {table}"))
+        conn.execute(text(f"CREATE TABLE {table} AS {select}"))
+        conn.execute(text(f"CREATE INDEX IF NOT EXISTS idx_{table}_{key} ON {table}({key})"))
+
+    def _rollups_ready(self) -> bool:
+        """Whether every rollup was built for the data version currently served"""
+        version = self.db_manager.get_data_version()
+        if self._ready_version == version:
+            return True
+        try:
+            with self.db_manager.engine.connect() as conn:
+                versions = {conn.execute(text(f"SELECT MIN(data_version) FROM {table}")).scalar() for table in ROLLUP_TABLES}
+        except Exception:
+            return False
+        if versions == {version}:
+            self._ready_version = version
+            return True
+        return False
+
+    def rewrite(self, sql: str) -> Tuple[str, Optional[str]]:
+        """(SQL to run, name of the rollup it reads or None if it is the original)"""
+        if not QUERY_REWRITE or not sql:
+            return sql, None
+        body = sql.strip().rstrip(';').strip()
+        if ';' in body or not self._rollups_ready():
+            return sql, None
+
+        rule = None
+        latest = _rewrite_latest_eligibility(body)
+        if latest:
+            body, rule = latest, LATEST_ELIGIBILITY_TABLE
+        aggregate = _rewrite_aggregate(body, self.db_manager.use_postgres)
+        if aggregate:
+            body, rule = aggregate
+        return (body, rule) if rule else (sql, None)
+
+    def execute(self, sql: str) -> List[Dict[str, Any]]:
+        """Execute generated SQL, through a rollup when possible"""
+        rewritten, rule = self.rewrite(sql)
+        with self._lock:
+            self.stats['queries'] += 1
+        if rule is None:
+            return self.db_manager.execute_query(sql)
+
+        start = time.perf_counter()
+        try:
+            results = self.db_manager.execute_query(rewritten)
+        except Exception as e:
+            logger.error(f"Rewritten query failed, running the original: {str(e)}")
+            with self._lock:
+                self.stats['fallbacks'] += 1
+            return self.db_manager.execute_query(sql)
+        rewritten_ms = (time.perf_counter() - start) * 1000
+
+        with self._lock:
+            self.stats['rewritten'] += 1
+            self.stats['by_rule'][rule] = self.stats['by_rule'].get(rule, 0) + 1
+
+        if random.random() < QUERY_REWRITE_SAMPLE_RATE:
+            start = time.perf_counter()
+            original = self.db_manager.execute_query(sql)
+            original_ms = (time.perf_counter() - start) * 1000
+            ordered = re.search(r'\bORDER\s+BY\b', sql, re.IGNORECASE) is not None
+            with self._lock:
+                self.stats['sampled'] += 1
+                self.stats['saved_ms'] += original_ms - rewritten_ms
+            if not results_match(original, results, ordered):
+                logger.error(f"Rewrite via {rule} changed the results; serving the original. SQL: {sql}")
+                with self._lock:
+                    self.stats['mismatches'] += 1
+                return original
+
+        with self._lock:
+            stats = self.stats
+            saved = stats['saved_ms'] / stats['sampled'] if stats['sampled'] else 0.0
+            logger.info(f"Rewrote query via {rule} in {rewritten_ms:.1f} ms "
+                        f"(hit rate {stats['rewritten']}/{stats['queries']}, ~{saved:.1f} ms saved per sampled query)")
+        return results
@@ -0,0 +1,91 @@
+import gzip
+import json
+import logging
+import os
+import uuid
+from typing import Any, Optional
+from flask import Flask, current_app, request
+
+try:
+    import brotli
+except ImportError:  # brotli is optional; gzip is always available
+    brotli = None
+
+logger = logging.getLogger(__name__)
+
+# Responses smaller than this aren't worth compressing
+COMPRESS_MIN_BYTES = int(os.environ.get("COMPRESS_MIN_BYTES", 1024))
+GZIP_LEVEL = int(os.environ.get("GZIP_LEVEL", 6))
+BROTLI_QUALITY = int(os.environ.get("BROTLI_QUALITY", 5))
+COMPRESSIBLE_MIMETYPES = {'application/json', 'text/html', 'text/css', 'application/javascript', 'text/csv'}
+
+class RawJSON:
+    """Already-serialized JSON to embed in a response as an object, not a string"""
+    __slots__ = ('text',)
+
+    def __init__(self, text: str):
+        self.text = text
+
+def raw_json(text: Optional[str]) -> Optional[RawJSON]:
+    """Wrap a serialized payload (e.g. a chart) for json_response, passing None through"""
+    return RawJSON(text) if text is not None else None
+
+def dumps_json(body: Any) -> str:
+    """Serialize like jsonify, but splice RawJSON values in verbatim instead of re-encoding them"""
+    nonce = uuid.uuid4().hex
+    raw_values = []
+
+    def default(obj):
+        if isinstance(obj, RawJSON):
+            raw_values.append(obj.text)
+            return f"__raw_json_{nonce}_{len(raw_values) - 1}__"
+        return current_app.json.default(obj)
+
+    text = json.dumps(body, default=default)
+    for index, raw in enumerate(raw_values):
+        text = text.replace(f'"__raw_json_{nonce}_{index}__"', raw, 1)
+    return text
+
+def json_response(body: Any, status: int = 200):
+    """Like jsonify, but splices RawJSON values in verbatim instead of re-encoding them"""
+    return current_app.response_class(dumps_json(body), status=status, mimetype='application/json')
+
+def negotiate_encoding() -> Optional[str]:
+    """Pick the best supported Content-Encoding from the request's Accept-Encoding"""
+    accepted = request.accept_encodings
+    if brotli is not None and accepted['br'] > 0:
+        return 'br'
+    if accepted['gzip'] > 0:
+        return 'gzip'
+    return None
+
+def compress_response(response):
+    """Compress eligible responses with brotli or gzip"""
+    if (response.direct_passthrough
+            or response.is_streamed
+            or response.status_code < 200 or response.status_code == 204
+            or 'Content-Encoding' in response.headers
+            or response.mimetype not in COMPRESSIBLE_MIMETYPES):
+        return response
+
+    response.vary.add('Accept-Encoding')
+    data = response.get_data()
+    if len(data) < COMPRESS_MIN_BYTES:
+        return response
+
+    encoding = negotiate_encoding()
+    if encoding == 'br':
+        compressed = brotli.compress(data, quality=BROTLI_QUALITY)
+    elif encoding == 'gzip':
+        compressed = gzip.compress(data, compresslevel=GZIP_LEVEL)
+    else:
+        return response
+
+    response.set_data(compressed)
+    response.headers['Content-Encoding'] = encoding
+    logger.debug(f"Compressed {request.path} with {encoding}: {len(data):,} -> {len(compressed):,} bytes")
+    return response
+
+def enable_compression(app: Flask):
+    """Compress responses based on the client's Accept-Encoding"""
+    app.after_request(compress_response)
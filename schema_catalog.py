@@ -0,0 +1,203 @@
+import json
+import logging
+import re
+import sys
+import threading
+from typing import List, Dict, Any, Optional
+from sqlalchemy import inspect, text
+from database import DatabaseManager
+
+logger = logging.getLogger(__name__)
+
+# Tables the model may query, with what they hold and the words that make them relevant
+CATALOG_TABLES = {
+    'eligibility': {
+        'description': "Product eligibility status for advertising",
+        'keywords': ['eligib', 'ineligib', 'status', 'why', 'reason', 'message', 'allowed', 'qualif'],
+    },
+    'ad_sales': {
+        'description': "Advertising performance metrics and sales attributed to ads",
+        'keywords': ['ad', 'ads', 'advert', 'roas', 'cpc', 'ctr', 'click', 'impression', 'spend', 'campaign',
+                     'conversion', 'convert', 'cost', 'acos', 'return'],
+    },
+    'total_sales': {
+        'description': "Total sales performance per product and day",
+        'keywords': ['sales', 'revenue', 'sold', 'order', 'unit', 'sell', 'selling', 'top', 'best', 'worst',
+                     'trend', 'income', 'earn', 'negative'],
+    },
+}
+
+# Columns only included when the question mentions them (others of a relevant table are always kept)
+COLUMN_KEYWORDS = {
+    'ad_sales': {
+        'ad_sales': ['ad', 'ads', 'sales', 'revenue', 'roas', 'return', 'acos'],
+        'impressions': ['impression', 'ctr', 'view', 'reach'],
+        'ad_spend': ['spend', 'cost', 'cpc', 'roas', 'budget', 'acos', 'return'],
+        'clicks': ['click', 'cpc', 'ctr', 'conversion', 'convert'],
+        'units_sold': ['unit', 'sold', 'conversion', 'convert'],
+    },
+}
+
+METRICS = [
+    {'text': "RoAS (Return on Ad Spend) = ad_sales / ad_spend", 'keywords': ['roas', 'return'], 'columns': ['ad_sales', 'ad_spend']},
+    {'text': "CPC (Cost Per Click) = ad_spend / clicks", 'keywords': ['cpc', 'cost'], 'columns': ['ad_spend', 'clicks']},
+    {'text': "Conversion Rate = units_sold / clicks", 'keywords': ['conversion', 'convert'], 'columns': ['units_sold', 'clicks']},
+    {'text': "CTR (Click Through Rate) = clicks / impressions", 'keywords': ['ctr', 'through'], 'columns': ['clicks', 'impressions']},
+]
+
+# Text columns whose most common values are listed (small domains the model filters on)
+VALUE_COLUMNS = {'eligibility': 10, 'message': 3}
+
+def _words(question: str) -> List[str]:
+    return re.findall(r'[a-z0-9]+', question.lower())
+
+def _mentions(words: List[str], keywords: List[str]) -> bool:
+    return any(word.startswith(keyword) for word in words for keyword in keywords)
+
+class SchemaCatalog:
+    """Schema plus column statistics for the queryable tables, rebuilt per data version.
+
+    The catalog is stored in the schema_catalog table so every process shares
+    one build, and each question gets a prompt section with only the tables,
+    columns and metrics relevant to it.
+    """
+
+    def __init__(self):
+        self.db_manager = DatabaseManager()
+        self._catalog = None
+        self._lock = threading.Lock()
+
+    def build(self) -> Dict[str, Any]:
+        """Inspect the tables and gather row counts, ranges, distinct counts and common values"""
+        inspector = inspect(self.db_manager.engine)
+        existing = set(inspector.get_table_names())
+        catalog = {'tables': {}}
+        with self.db_manager.engine.connect() as conn:
+            for table, info in CATALOG_TABLES.items():
+                if table not in existing:
+                    continue
+                columns = []
+                for column in inspector.get_columns(table):
+                    name = column['name']
+                    stats = {}
+                    if name not in VALUE_COLUMNS:
+                        row = conn.execute(text(f"SELECT MIN({name}), MAX({name}) FROM {table}")).fetchone()
+                        stats['min'], stats['max'] = row[0], row[1]
+                    if name == 'item_id':
+                        stats['distinct'] = conn.execute(text(f"SELECT COUNT(DISTINCT {name}) FROM {table}")).scalar()
+                    if name in VALUE_COLUMNS:
+                        rows = conn.execute(text(f"""
+                            SELECT {name}, COUNT(*) AS n FROM {table}
+                            GROUP BY {name} ORDER BY n DESC LIMIT {VALUE_COLUMNS[name]}
+                        """)).fetchall()
+                        stats['values'] = [str(value)[:80] for value, _ in rows if value is not None]
+                    columns.append({'name': name, 'type': str(column['type']), 'stats': stats})
+                catalog['tables'][table] = {
+                    'rows': conn.execute(text(f"SELECT COUNT(*) FROM {table}")).scalar(),
+                    'description': info['description'],
+                    'columns': columns,
+                }
+        return json.loads(json.dumps(catalog, default=str))
+
+    def refresh(self, version: int):
+        """Rebuild and store the catalog for a new data version"""
+        catalog = self.build()
+        catalog['version'] = version
+        with self.db_manager.engine.connect() as conn:
+            conn.execute(text("""
+                CREATE TABLE IF NOT EXISTS schema_catalog (
+                    data_version INTEGER PRIMARY KEY,
+                    catalog TEXT NOT NULL
+                )
+            """))
+            conn.execute(text("DELETE FROM schema_catalog"))
+            conn.execute(text("INSERT INTO schema_catalog (data_version, catalog) VALUES (:version, :catalog)"),
+                         {'version': version, 'catalog': json.dumps(catalog)})
+            conn.commit()
+        with self._lock:
+            self._catalog = catalog
+        logger.info(f"Refreshed schema catalog for data version {version}")
+
+    def get_catalog(self) -> Optional[Dict[str, Any]]:
+        """The catalog for the current data version, from memory, the database or a fresh build"""
+        version = self.db_manager.get_data_version()
+        with self._lock:
+            if self._catalog is not None and self._catalog.get('version') == version:
+                return self._catalog
+        try:
+            with self.db_manager.engine.connect() as conn:
+                row = conn.execute(text("SELECT catalog FROM schema_catalog WHERE data_version = :version"),
+                                   {'version': version}).fetchone()
+            catalog = json.loads(row[0]) if row else None
+        except Exception:
+            catalog = None   # table doesn't exist until the first refresh
+        if catalog is None:
+            catalog = self.build()
+            catalog['version'] = version
+        with self._lock:
+            self._catalog = catalog
+        return catalog
+
+    def relevant(self, question: str) -> Dict[str, List[str]]:
+        """Tables and columns a question needs; every table when nothing matches"""
+        words = _words(question)
+        catalog = self.get_catalog() or {'tables': {}}
+        tables = [table for table in catalog['tables'] if _mentions(words, CATALOG_TABLES[table]['keywords'])]
+        if not tables:
+            tables = list(catalog['tables'])
+
+        metric_columns = {column for metric in METRICS if _mentions(words, metric['keywords']) for column in metric['columns']}
+        selection = {}
+        for table in tables:
+            names = [column['name'] for column in catalog['tables'][table]['columns']]
+            optional = COLUMN_KEYWORDS.get(table, {})
+            wanted = {name for name, keywords in optional.items() if _mentions(words, keywords)} | (metric_columns & set(optional))
+            if wanted:
+                names = [name for name in names if name not in optional or name in wanted]
+            selection[table] = names
+        return selection
+
+    def context_for(self, question: str) -> str:
+        """Schema prompt section with only what the question needs, annotated with column statistics"""
+        catalog = self.get_catalog()
+        selection = self.relevant(question)
+        words = _words(question)
+
+        lines = ["Database Schema:", ""]
+        for table, names in selection.items():
+            entry = catalog['tables'][table]
+            columns = {column['name']: column for column in entry['columns']}
+            lines.append(f"Table: {table} ({entry['rows']:,} rows)")
+            lines.append("Columns: " + ", ".join(self._describe_column(columns[name]) for name in names))
+            lines.append(f"Description: {entry['description']}")
+            lines.append("")
+
+        selected = {name for names in selection.values() for name in names}
+        metrics = [metric['text'] for metric in METRICS
+                   if set(metric['columns']) <= selected and (_mentions(words, metric['keywords']) or len(selection) == len(catalog['tables']))]
+        if metrics:
+            lines.append("Key Business Metrics:")
+            lines.extend(f"- {metric}" for metric in metrics)
+        return "\n".join(lines).strip()
+
+    @staticmethod
+    def _describe_column(column: Dict[str, Any]) -> str:
+        stats = column['stats']
+        notes = [column['type']]
+        if 'min' in stats and stats['min'] is not None:
+            notes.append(f"{stats['min']} to {stats['max']}")
+        if 'distinct' in stats:
+            notes.append(f"{stats['distinct']} distinct")
+        if stats.get('values'):
+            notes.append("values: " + ", ".join(repr(value) for value in stats['values']))
+        return f"{column['name']} ({'; '.join(notes)})"
+
+if __name__ == '__main__':
+    # python schema_catalog.py "question"  -- show the schema context a question would get
+    logging.basicConfig(level=logging.WARNING)
+    schema_catalog = SchemaCatalog()
+    question = ' '.join(sys.argv[1:]) or "What is my total sales?"
+    context = schema_catalog.context_for(question)
+    full = schema_catalog.context_for("")
+    print(context)
+    print(f"\n{len(context):,} of {len(full):,} characters for the full catalog")
@@ -0,0 +1,84 @@
+import numpy as np
+from typing import Dict, List, Any
+
+# Score components as (upper bin edges, points per bin). A value scores the
+# points of the first bin it exceeds, e.g. revenue > 10000 -> 40, > 5000 -> 30.
+REVENUE_BINS = (np.array([0, 1000, 5000, 10000]), np.array([0, 10, 20, 30, 40]))    # 40%
+ROAS_BINS = (np.array([1, 2, 3, 5, 10]), np.array([0, 10, 15, 20, 25, 30]))          # 30%
+CONVERSION_BINS = (np.array([1, 2, 5, 10]), np.array([0, 5, 10, 15, 20]))            # 20%
+ELIGIBLE_POINTS = 10                                                                  # 10%
+
+# Recommendation bits, in the order they are listed for a product
+RECOMMENDATIONS = [
+    "⚠️ Low RoAS: Consider optimizing ad targeting or reducing ad spend",
+    "🚀 Excellent RoAS: Consider increasing ad budget to scale",
+    "💰 High CPC: Review keyword bidding strategy and ad relevance",
+    "💡 Low CPC: Opportunity to increase bids for better visibility",
+    "📈 Low conversion rate: Optimize product page and ad copy",
+    "✅ Excellent conversion rate: This product converts very well",
+    "👁️ Low CTR: Improve ad creative and targeting",
+    "🎯 Great CTR: Ad creative is engaging audiences well",
+    "❌ Not eligible for ads: Review eligibility requirements",
+]
+MAX_RECOMMENDATIONS = 3
+
+def normalize_eligibility(values: Any) -> np.ndarray:
+    """Map eligibility flags to 'TRUE'/'FALSE' (None when unknown).
+
+    pandas reads the CSV's TRUE/FALSE as booleans, so the database holds
+    1/0 or true/false depending on the backend rather than the text 'TRUE'.
+    """
+    values = np.asarray(values, dtype=object)
+    normalized = np.full(len(values), None, dtype=object)
+    known = np.array([value is not None and value == value for value in values], dtype=bool)
+    text = np.char.upper(values[known].astype(str))
+    normalized[known] = np.where(np.isin(text, ['TRUE', '1', '1.0']), 'TRUE', 'FALSE')
+    return normalized
+
+def _column(metrics: Dict[str, Any], name: str) -> np.ndarray:
+    """Get a metric column as floats with missing values treated as 0"""
+    return np.nan_to_num(np.asarray(metrics[name], dtype=float))
+
+def _bin_points(values: np.ndarray, bins: tuple) -> np.ndarray:
+    edges, points = bins
+    return points[np.digitize(values, edges, right=True)]
+
+def score_products(metrics: Dict[str, Any]) -> np.ndarray:
+    """Performance score (0-100) for every product in one vectorized pass"""
+    eligible = np.asarray(metrics['is_eligible'], dtype=object) == 'TRUE'
+    score = (
+        _bin_points(_column(metrics, 'total_revenue'), REVENUE_BINS)
+        + _bin_points(_column(metrics, 'roas'), ROAS_BINS)
+        + _bin_points(_column(metrics, 'conversion_rate'), CONVERSION_BINS)
+        + np.where(eligible, ELIGIBLE_POINTS, 0)
+    )
+    return np.minimum(score, 100)
+
+def recommendation_masks(metrics: Dict[str, Any]) -> np.ndarray:
+    """Bitmask of applicable RECOMMENDATIONS for every product"""
+    roas = _column(metrics, 'roas')
+    cpc = _column(metrics, 'cpc')
+    conversion_rate = _column(metrics, 'conversion_rate')
+    ctr = _column(metrics, 'ctr')
+    eligible = np.asarray(metrics['is_eligible'], dtype=object) == 'TRUE'
+
+    conditions = [
+        roas < 2,
+        roas > 10,
+        cpc > 5,
+        cpc < 0.5,
+        conversion_rate < 1,
+        conversion_rate > 10,
+        ctr < 1,
+        ctr > 5,
+        ~eligible,
+    ]
+    masks = np.zeros(len(roas), dtype=np.int64)
+    for bit, condition in enumerate(conditions):
+        masks |= condition.astype(np.int64) << bit
+    return masks
+
+def decode_recommendations(mask: int) -> List[str]:
+    """Turn a recommendation bitmask into its (at most three) messages"""
+    messages = [text for bit, text in enumerate(RECOMMENDATIONS) if mask >> bit & 1]
+    return messages[:MAX_RECOMMENDATIONS]
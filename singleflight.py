@@ -0,0 +1,85 @@
+import logging
+import threading
+from typing import Any, Callable, Dict, Hashable, Tuple
+
+logger = logging.getLogger(__name__)
+
+class _Call:
+    __slots__ = ('done', 'result', 'error', 'waiters')
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+        self.waiters = 0
+
+class SingleFlight:
+    """Run one computation per key at a time; concurrent callers with the same key share its outcome"""
+
+    def __init__(self, name: str):
+        self.name = name
+        self._calls: Dict[Hashable, _Call] = {}
+        self._lock = threading.Lock()
+        self.stats = {'requests': 0, 'executions': 0, 'coalesced': 0, 'errors': 0, 'in_flight': 0}
+
+    def do(self, key: Hashable, fn: Callable[[], Any]) -> Tuple[Any, bool]:
+        """Return (result, shared): fn's result, computed here or by an identical in-flight call.
+
+        Exceptions raised by fn propagate to every caller that waited on it.
+        """
+        with self._lock:
+            self.stats['requests'] += 1
+            call = self._calls.get(key)
+            if call is not None:
+                call.waiters += 1
+                self.stats['coalesced'] += 1
+                leader = False
+            else:
+                call = self._calls[key] = _Call()
+                self.stats['executions'] += 1
+                self.stats['in_flight'] += 1
+                leader = True
+
+        if not leader:
+            call.done.wait()
+            if call.error is not None:
+                raise call.error
+            return call.result, True
+
+        try:
+            call.result = fn()
+        except Exception as e:
+            call.error = e
+            with self._lock:
+                self.stats['errors'] += 1
+            raise
+        finally:
+            with self._lock:
+                del self._calls[key]
+                self.stats['in_flight'] -= 1
+            call.done.set()
+            if call.waiters:
+                logger.debug(f"{self.name}: shared one computation of {key!r} with {call.waiters} waiting requests")
+        return call.result, False
+
+_groups: Dict[str, SingleFlight] = {}
+_groups_lock = threading.Lock()
+
+def get_single_flight(name: str) -> SingleFlight:
+    """Get the process-wide coalescing group for an endpoint"""
+    with _groups_lock:
+        if name not in _groups:
+            _groups[name] = SingleFlight(name)
+        return _groups[name]
+
+def coalescing_stats() -> Dict[str, Dict[str, Any]]:
+    """Per-group request, execution and coalesced counts, with the share of requests coalesced"""
+    with _groups_lock:
+        groups = list(_groups.values())
+    stats = {}
+    for group in groups:
+        with group._lock:
+            counts = dict(group.stats)
+        counts['coalesced_ratio'] = counts['coalesced'] / counts['requests'] if counts['requests'] else 0.0
+        stats[group.name] = counts
+    return stats
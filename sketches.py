@@ -0,0 +1,328 @@
+import logging
+import math
+import os
+import struct
+import threading
+import time
+import numpy as np
+import pandas as pd
+from typing import List, Dict, Any, Optional, Tuple
+from sqlalchemy import LargeBinary, bindparam, text
+from database import DatabaseManager
+
+logger = logging.getLogger(__name__)
+
+# HyperLogLog registers are 2^precision bytes; relative error is 1.04 / sqrt(2^precision)
+SKETCH_HLL_PRECISION = int(os.environ.get("SKETCH_HLL_PRECISION", 12))
+# Items kept per KLL level; larger k means smaller rank error
+SKETCH_KLL_K = int(os.environ.get("SKETCH_KLL_K", 200))
+
+# Per-day sketches: HyperLogLog over item ids, or KLL over per-row values.
+# Each reads (date, item_id, value) rows from its table and keeps rows where value is set.
+SKETCHES = {
+    'active_products': ('hll', "SELECT date, item_id, total_sales AS value FROM total_sales WHERE total_sales > 0 {filter}"),
+    'advertised_products': ('hll', "SELECT date, item_id, ad_spend AS value FROM ad_sales WHERE ad_spend > 0 {filter}"),
+    'sales': ('kll', "SELECT date, item_id, total_sales AS value FROM total_sales WHERE total_sales > 0 {filter}"),
+    'cpc': ('kll', "SELECT date, item_id, ad_spend * 1.0 / clicks AS value FROM ad_sales WHERE clicks > 0 {filter}"),
+    'roas': ('kll', "SELECT date, item_id, ad_sales * 1.0 / ad_spend AS value FROM ad_sales WHERE ad_spend > 0 {filter}"),
+    'ctr': ('kll', "SELECT date, item_id, clicks * 100.0 / impressions AS value FROM ad_sales WHERE impressions > 0 {filter}"),
+}
+DISTINCT_METRICS = [name for name, (kind, _) in SKETCHES.items() if kind == 'hll']
+QUANTILE_METRICS = [name for name, (kind, _) in SKETCHES.items() if kind == 'kll']
+
+def hash64(values: np.ndarray) -> np.ndarray:
+    """SplitMix64 finalizer: well-mixed 64-bit hashes of integer ids"""
+    x = values.astype(np.uint64) + np.uint64(0x9E3779B97F4A7C15)
+    x = (x ^ (x >> np.uint64(30))) * np.uint64(0xBF58476D1CE4E5B9)
+    x = (x ^ (x >> np.uint64(27))) * np.uint64(0x94D049BB133111EB)
+    return x ^ (x >> np.uint64(31))
+
+def _bit_length(values: np.ndarray) -> np.ndarray:
+    # frexp is exact on 32-bit halves, where a float64 of the full value could round up
+    high = (values >> np.uint64(32)).astype(np.float64)
+    low = (values & np.uint64(0xFFFFFFFF)).astype(np.float64)
+    return np.where(high > 0, 32 + np.frexp(high)[1], np.frexp(low)[1])
+
+class HyperLogLog:
+    """Mergeable distinct-count sketch over integer ids"""
+
+    def __init__(self, precision: int = SKETCH_HLL_PRECISION, registers: np.ndarray = None):
+        self.precision = precision
+        self.registers = registers if registers is not None else np.zeros(1 << precision, dtype=np.uint8)
+
+    def update(self, ids: np.ndarray):
+        hashes = hash64(np.asarray(ids))
+        suffix_bits = 64 - self.precision
+        buckets = (hashes >> np.uint64(suffix_bits)).astype(np.intp)
+        rest = hashes & np.uint64((1 << suffix_bits) - 1)
+        # Position of the first set bit in the suffix, counting from 1
+        ranks = (suffix_bits - _bit_length(rest) + 1).astype(np.uint8)
+        np.maximum.at(self.registers, buckets, ranks)
+
+    def merge(self, other: 'HyperLogLog'):
+        if other.precision != self.precision:
+            raise ValueError("Cannot merge HyperLogLog sketches of different precision")
+        np.maximum(self.registers, other.registers, out=self.registers)
+
+    @property
+    def relative_error(self) -> float:
+        return 1.04 / math.sqrt(len(self.registers))
+
+    def estimate(self) -> float:
+        m = len(self.registers)
+        alpha = 0.7213 / (1 + 1.079 / m)
+        raw = alpha * m * m / np.sum(np.exp2(-self.registers.astype(np.float64)))
+        zeros = int(np.count_nonzero(self.registers == 0))
+        if raw <= 2.5 * m and zeros:
+            # Linear counting is more accurate while many registers are empty
+            return m * math.log(m / zeros)
+        return float(raw)
+
+    def to_bytes(self) -> bytes:
+        return bytes([self.precision]) + self.registers.tobytes()
+
+    @classmethod
+    def from_bytes(cls, data: bytes) -> 'HyperLogLog':
+        return cls(data[0], np.frombuffer(data, dtype=np.uint8, offset=1).copy())
+
+class KLLSketch:
+    """Mergeable quantile sketch: levels of sorted samples, an item at level h standing for 2^h values.
+
+    A level holding more than k items is compacted by keeping every other item
+    (from a random offset) one level up, so memory stays O(k log(n / k)).
+    """
+
+    _HEADER = struct.Struct('<IQddI')
+
+    def __init__(self, k: int = SKETCH_KLL_K):
+        self.k = k
+        self.n = 0
+        self.min = math.inf
+        self.max = -math.inf
+        self.levels: List[np.ndarray] = [np.empty(0)]
+        self._rng = np.random.default_rng()
+
+    def update(self, values: np.ndarray):
+        values = np.asarray(values, dtype=np.float64)
+        values = values[np.isfinite(values)]
+        if not len(values):
+            return
+        self.n += len(values)
+        self.min = min(self.min, float(values.min()))
+        self.max = max(self.max, float(values.max()))
+        self.levels[0] = np.concatenate([self.levels[0], values])
+        self._compact()
+
+    def merge(self, other: 'KLLSketch'):
+        self.n += other.n
+        self.min = min(self.min, other.min)
+        self.max = max(self.max, other.max)
+        for height, items in enumerate(other.levels):
+            if height == len(self.levels):
+                self.levels.append(np.empty(0))
+            self.levels[height] = np.concatenate([self.levels[height], items])
+        self._compact()
+
+    def _compact(self):
+        height = 0
+        while height < len(self.levels):
+            items = self.levels[height]
+            if len(items) > self.k:
+                items = np.sort(items)
+                # An odd item out stays behind so the weight carried up is exact
+                keep = items[:len(items) % 2]
+                promoted = items[len(keep) + self._rng.integers(2)::2]
+                if height + 1 == len(self.levels):
+                    self.levels.append(np.empty(0))
+                self.levels[height] = keep
+                self.levels[height + 1] = np.concatenate([self.levels[height + 1], promoted])
+            height += 1
+
+    @property
+    def rank_error(self) -> float:
+        # Normalized rank error of a single quantile at 99% confidence for KLL
+        # (the DataSketches constants); equal-capacity levels only do better
+        return 2.296 / self.k ** 0.9723
+
+    def quantiles(self, qs: List[float]) -> List[Optional[float]]:
+        if not self.n:
+            return [None for _ in qs]
+        items = np.concatenate(self.levels)
+        weights = np.concatenate([np.full(len(level), 2.0 ** height) for height, level in enumerate(self.levels)])
+        order = np.argsort(items, kind='stable')
+        items, cumulative = items[order], np.cumsum(weights[order])
+        positions = np.searchsorted(cumulative, np.asarray(qs) * cumulative[-1], side='left')
+        values = items[np.minimum(positions, len(items) - 1)]
+        return [self.min if q <= 0 else self.max if q >= 1 else float(value) for q, value in zip(qs, values)]
+
+    def to_bytes(self) -> bytes:
+        sizes = np.array([len(level) for level in self.levels], dtype=np.uint32)
+        return (self._HEADER.pack(self.k, self.n, self.min, self.max, len(self.levels))
+                + sizes.tobytes() + np.concatenate(self.levels).astype(np.float64).tobytes())
+
+    @classmethod
+    def from_bytes(cls, data: bytes) -> 'KLLSketch':
+        k, n, low, high, depth = cls._HEADER.unpack_from(data)
+        sketch = cls(k)
+        sketch.n, sketch.min, sketch.max = n, low, high
+        sizes = np.frombuffer(data, dtype=np.uint32, count=depth, offset=cls._HEADER.size)
+        items = np.frombuffer(data, dtype=np.float64, offset=cls._HEADER.size + sizes.nbytes)
+        sketch.levels = np.split(items.copy(), np.cumsum(sizes)[:-1])
+        return sketch
+
+SKETCH_TYPES = {'hll': HyperLogLog, 'kll': KLLSketch}
+
+def build_day_sketches(kind: str, df: pd.DataFrame) -> List[Tuple[str, bytes]]:
+    """(date, serialized sketch) for each day in (date, item_id, value) rows"""
+    if df.empty:
+        return []
+    df = df.sort_values('date', kind='stable')
+    dates, starts = np.unique(df['date'].astype(str).to_numpy(), return_index=True)
+    column = df['item_id' if kind == 'hll' else 'value'].to_numpy()
+    sketches = []
+    for day, values in zip(dates, np.split(column, starts[1:])):
+        sketch = SKETCH_TYPES[kind]()
+        sketch.update(values)
+        sketches.append((day, sketch.to_bytes()))
+    return sketches
+
+class SketchAnalytics:
+    """Distinct counts and quantiles answered from per-day sketches (approx) or from the fact tables (exact)"""
+
+    def __init__(self):
+        self.db_manager = DatabaseManager()
+        self._sketches = None
+        self._sketches_version = None
+        self._sketches_lock = threading.Lock()
+
+    def _build(self, conn, version: int, days: List[str] = None) -> pd.DataFrame:
+        rows = []
+        filter_sql = "AND date IN :days" if days is not None else ""
+        for name, (kind, query) in SKETCHES.items():
+            statement = text(query.format(filter=filter_sql))
+            if days is not None:
+                statement = statement.bindparams(bindparam('days', expanding=True))
+            df = pd.read_sql(statement, conn, params={'days': days} if days is not None else None)
+            rows.extend((day, name, sketch, version) for day, sketch in build_day_sketches(kind, df))
+        return pd.DataFrame(rows, columns=['date', 'name', 'sketch', 'data_version'])
+
+    def materialize_daily_sketches(self, version: int):
+        """Build every day's sketches for this data version"""
+        start = time.perf_counter()
+        with self.db_manager.engine.connect() as conn:
+            df = self._build(conn, version)
+        df.to_sql('daily_sketches', self.db_manager.engine, index=False, if_exists='replace',
+                  dtype={'sketch': LargeBinary()})
+        with self.db_manager.engine.connect() as conn:
+            conn.execute(text("CREATE INDEX IF NOT EXISTS idx_daily_sketches_date ON daily_sketches(date)"))
+            conn.commit()
+        logger.info(f"Built {len(df)} daily sketches in {(time.perf_counter() - start) * 1000:.0f} ms (data version {version})")
+
+    def refresh_daily_sketches(self, conn, version: int, changes: Dict[str, Dict[str, set]]):
+        """Rebuild the sketches of only the changed days, inside an incremental ingest"""
+        days = sorted(str(day) for day in
+                      set(changes.get('total_sales', {}).get('date', ())) | set(changes.get('ad_sales', {}).get('date', ())))
+        if days:
+            df = self._build(conn, version, days)
+            conn.execute(text("DELETE FROM daily_sketches WHERE date IN :days")
+                         .bindparams(bindparam('days', expanding=True)), {'days': days})
+            if not df.empty:
+                conn.execute(text("""
+                    INSERT INTO daily_sketches (date, name, sketch, data_version)
+                    VALUES (:date, :name, :sketch, :data_version)
+                """), df.to_dict('records'))
+        conn.execute(text("UPDATE daily_sketches SET data_version = :version"), {'version': version})
+        logger.info(f"Refreshed sketches for {len(days)} days (data version {version})")
+
+    def get_sketches(self) -> Dict[str, Tuple[np.ndarray, list]]:
+        """name -> (sorted dates, sketches) for the current data version"""
+        version = self.db_manager.get_data_version()
+        with self._sketches_lock:
+            if self._sketches is None or self._sketches_version != version:
+                with self.db_manager.engine.connect() as conn:
+                    df = pd.read_sql(text("SELECT date, name, sketch FROM daily_sketches ORDER BY name, date"), conn)
+                sketches = {}
+                for name, group in df.groupby('name'):
+                    sketch_type = SKETCH_TYPES[SKETCHES[name][0]]
+                    sketches[name] = (group['date'].astype(str).to_numpy(),
+                                      [sketch_type.from_bytes(bytes(data)) for data in group['sketch']])
+                self._sketches = sketches
+                self._sketches_version = version
+            return self._sketches
+
+    def _merged(self, name: str, start: Optional[str], end: Optional[str]):
+        """The sketch of a metric over [start, end], merged from its days, and how many days it covers"""
+        dates, day_sketches = self.get_sketches().get(name, (np.array([]), []))
+        lo = np.searchsorted(dates, start, side='left') if start else 0
+        hi = np.searchsorted(dates, end, side='right') if end else len(dates)
+        merged = SKETCH_TYPES[SKETCHES[name][0]]()
+        for sketch in day_sketches[lo:hi]:
+            merged.merge(sketch)
+        return merged, int(max(hi - lo, 0))
+
+    def _range_filter(self, start: Optional[str], end: Optional[str]) -> Tuple[str, Dict[str, str]]:
+        conditions, params = [], {}
+        if start:
+            conditions.append("date >= :start")
+            params['start'] = start
+        if end:
+            conditions.append("date <= :end")
+            params['end'] = end
+        return ''.join(f" AND {condition}" for condition in conditions), params
+
+    def distinct_products(self, start: str = None, end: str = None, approx: bool = False) -> Dict[str, Any]:
+        """Distinct selling and advertised products, and active days, over [start, end]"""
+        started = time.perf_counter()
+        counts = {}
+        if approx:
+            for name in DISTINCT_METRICS:
+                sketch, days = self._merged(name, start, end)
+                estimate = sketch.estimate()
+                # About 95% of estimates fall within two standard errors
+                spread = 2 * sketch.relative_error * estimate
+                counts[name] = {'value': round(estimate), 'lower': max(0, math.floor(estimate - spread)),
+                                'upper': math.ceil(estimate + spread)}
+                if name == 'active_products':
+                    counts['active_days'] = {'value': days}
+            error = {'relative_error': 1.04 / math.sqrt(1 << SKETCH_HLL_PRECISION), 'confidence': 0.95}
+        else:
+            filter_sql, params = self._range_filter(start, end)
+            with self.db_manager.engine.connect() as conn:
+                for name in DISTINCT_METRICS:
+                    query = SKETCHES[name][1].format(filter=filter_sql)
+                    row = conn.execute(text(f"SELECT COUNT(DISTINCT item_id) AS items, COUNT(DISTINCT date) AS days FROM ({query}) matched"),
+                                       params).one()
+                    counts[name] = {'value': row.items}
+                    if name == 'active_products':
+                        counts['active_days'] = {'value': row.days}
+            error = None
+        return {'start': start, 'end': end, 'approx': approx, 'counts': counts, 'error': error,
+                'elapsed_ms': round((time.perf_counter() - started) * 1000, 1)}
+
+    def quantiles(self, metric: str, qs: List[float], start: str = None, end: str = None, approx: bool = False) -> Dict[str, Any]:
+        """Quantiles of a per-row metric (sales, cpc, roas or ctr) over [start, end]"""
+        if metric not in QUANTILE_METRICS:
+            raise ValueError(f"metric must be one of {', '.join(QUANTILE_METRICS)}")
+        if not qs or any(not 0 <= q <= 1 for q in qs):
+            raise ValueError("q must be one or more fractions between 0 and 1")
+        started = time.perf_counter()
+        if approx:
+            sketch, _ = self._merged(metric, start, end)
+            error = sketch.rank_error
+            values = sketch.quantiles(qs)
+            lower = sketch.quantiles([max(q - error, 0) for q in qs])
+            upper = sketch.quantiles([min(q + error, 1) for q in qs])
+            results = [{'q': q, 'value': value, 'lower': low, 'upper': high}
+                       for q, value, low, high in zip(qs, values, lower, upper)]
+            count = sketch.n
+            error = {'rank_error': error, 'confidence': 0.99}
+        else:
+            filter_sql, params = self._range_filter(start, end)
+            with self.db_manager.engine.connect() as conn:
+                values = pd.read_sql(text(SKETCHES[metric][1].format(filter=filter_sql)), conn, params=params)['value'].to_numpy(dtype=float)
+            count = len(values)
+            exact = np.quantile(values, qs, method='inverted_cdf') if count else [None] * len(qs)
+            results = [{'q': q, 'value': None if value is None else float(value)} for q, value in zip(qs, exact)]
+            error = None
+        return {'metric': metric, 'start': start, 'end': end, 'approx': approx, 'count': count,
+                'quantiles': results, 'error': error, 'elapsed_ms': round((time.perf_counter() - started) * 1000, 1)}
@@ -0,0 +1,526 @@
+import argparse
+import hashlib
+import json
+import logging
+import os
+import shutil
+import sqlite3
+import sys
+import tempfile
+import threading
+import time
+import numpy as np
+import pandas as pd
+from datetime import datetime, timezone
+from typing import List, Dict, Any, Optional, Tuple
+from urllib.parse import quote
+from sqlalchemy import create_engine, event, inspect, text
+from database import DatabaseManager, serve_snapshot
+
+try:
+    import pyarrow as pa
+    import pyarrow.ipc
+except ImportError:  # pyarrow is optional; without it no snapshots are written or read
+    pa = None
+
+logger = logging.getLogger(__name__)
+
+SNAPSHOT_DIR = os.environ.get("SNAPSHOT_DIR", "snapshots")
+SNAPSHOT_EXPORT = os.environ.get("SNAPSHOT_EXPORT", "true").lower() == "true"
+SNAPSHOT_KEEP = int(os.environ.get("SNAPSHOT_KEEP", 3))
+# Also publish the whole database as a read-only SQLite file for read nodes
+SNAPSHOT_DATABASE = os.environ.get("SNAPSHOT_DATABASE", "true").lower() == "true"
+# Read nodes: seconds between checks for a newer database snapshot, and the
+# memory-mapped window per connection
+SNAPSHOT_POLL_INTERVAL = float(os.environ.get("SNAPSHOT_POLL_INTERVAL", 5))
+SNAPSHOT_MMAP_MB = int(os.environ.get("SNAPSHOT_MMAP_MB", 256))
+
+# Fact tables and the column whose date (first 10 characters) partitions them
+SNAPSHOT_TABLES = {
+    'total_sales': 'date',
+    'ad_sales': 'date',
+    'eligibility': 'eligibility_datetime_utc',
+}
+SNAPSHOT_FORMAT = 'arrow-ipc'
+LATEST_FILE = 'LATEST'
+MANIFEST_FILE = 'manifest.json'
+DATABASE_SNAPSHOT_FORMAT = 'sqlite'
+DATABASE_SNAPSHOT_FILE = 'data.sqlite'
+LATEST_DATABASE_FILE = 'LATEST_DB'
+
+def _require_pyarrow():
+    if pa is None:
+        raise RuntimeError("Snapshots need the optional pyarrow package (pip install pyarrow)")
+
+def _sha256(path: str) -> str:
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(1 << 20), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+def _snapshot_name(version: int) -> str:
+    return f"v{version:06d}"
+
+def _database_snapshot_name(version: int) -> str:
+    return f"db-v{version:06d}"
+
+def _read_pointer(directory: str, pointer: str) -> Optional[str]:
+    """Path of the snapshot a pointer file names, or None"""
+    try:
+        with open(os.path.join(directory, pointer)) as f:
+            path = os.path.join(directory, f.read().strip())
+    except FileNotFoundError:
+        return None
+    return path if os.path.exists(os.path.join(path, MANIFEST_FILE)) else None
+
+def _write_pointer(directory: str, pointer: str, name: str):
+    """Point a pointer file at a snapshot with an atomic rename"""
+    pointer_tmp = os.path.join(directory, f".{pointer}.tmp-{os.getpid()}-{threading.get_ident()}")
+    with open(pointer_tmp, 'w') as f:
+        f.write(name)
+    os.replace(pointer_tmp, os.path.join(directory, pointer))
+
+def latest_snapshot_path(directory: str = SNAPSHOT_DIR) -> Optional[str]:
+    """Path of the most recently published snapshot, or None"""
+    return _read_pointer(directory, LATEST_FILE)
+
+def latest_database_snapshot_path(directory: str = SNAPSHOT_DIR) -> Optional[str]:
+    """Path of the most recently published database snapshot, or None"""
+    return _read_pointer(directory, LATEST_DATABASE_FILE)
+
+def snapshot_path_for_version(version: int, directory: str = SNAPSHOT_DIR) -> Optional[str]:
+    """Path of the snapshot for a data version, or None if it was never exported"""
+    path = os.path.join(directory, _snapshot_name(version))
+    return path if os.path.exists(os.path.join(path, MANIFEST_FILE)) else None
+
+def _write_table(table: 'pa.Table', partition_values: np.ndarray, table_dir: str, partition_column: str) -> List[Dict[str, Any]]:
+    """Write one uncompressed Arrow IPC file per partition; rows must be sorted by partition"""
+    values, starts = np.unique(partition_values, return_index=True)
+    ends = list(starts[1:]) + [len(partition_values)]
+    files = []
+    for value, start, end in zip(values, starts, ends):
+        relative = os.path.join(os.path.basename(table_dir), f"{partition_column}={value}", 'part-0.arrow')
+        path = os.path.join(os.path.dirname(table_dir), relative)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        # Uncompressed IPC files can be memory-mapped without decoding
+        with pa.OSFile(path, 'wb') as sink, pa.ipc.new_file(sink, table.schema) as writer:
+            writer.write_table(table.slice(int(start), int(end - start)))
+        files.append({
+            'path': relative,
+            'partition': str(value),
+            'rows': int(end - start),
+            'bytes': os.path.getsize(path),
+            'sha256': _sha256(path),
+        })
+    return files
+
+def export_snapshot(db_manager: DatabaseManager = None, version: int = None,
+                    directory: str = SNAPSHOT_DIR, force: bool = False) -> str:
+    """Write the fact tables as a date-partitioned Arrow snapshot and publish it as LATEST"""
+    _require_pyarrow()
+    db_manager = db_manager or DatabaseManager()
+    version = version if version is not None else db_manager.get_data_version()
+    final_path = os.path.join(directory, _snapshot_name(version))
+    if os.path.exists(os.path.join(final_path, MANIFEST_FILE)) and not force:
+        logger.info(f"Snapshot for data version {version} already exists at {final_path}")
+        return final_path
+
+    start_time = time.perf_counter()
+    # Build in a temporary directory and rename, so readers never see a partial snapshot
+    tmp_path = os.path.join(directory, f".{_snapshot_name(version)}.tmp-{os.getpid()}")
+    shutil.rmtree(tmp_path, ignore_errors=True)
+    os.makedirs(tmp_path)
+
+    manifest = {
+        'version': version,
+        'format': SNAPSHOT_FORMAT,
+        'created_at': datetime.now(timezone.utc).isoformat(),
+        'tables': {},
+    }
+    with db_manager.engine.connect() as conn:
+        for table_name, partition_column in SNAPSHOT_TABLES.items():
+            df = pd.read_sql(text(f"SELECT * FROM {table_name}"), conn)
+            partition_values = df[partition_column].astype(str).str.slice(0, 10).to_numpy()
+            order = np.argsort(partition_values, kind='stable')
+            table = pa.Table.from_pandas(df.iloc[order], preserve_index=False)
+            files = _write_table(table, partition_values[order], os.path.join(tmp_path, table_name), partition_column)
+            manifest['tables'][table_name] = {
+                'partition_by': partition_column,
+                'rows': table.num_rows,
+                'schema': [[field.name, str(field.type)] for field in table.schema],
+                'files': files,
+            }
+
+    with open(os.path.join(tmp_path, MANIFEST_FILE), 'w') as f:
+        json.dump(manifest, f, indent=2)
+
+    if os.path.exists(final_path):
+        shutil.rmtree(final_path)
+    os.rename(tmp_path, final_path)
+
+    _write_pointer(directory, LATEST_FILE, _snapshot_name(version))
+
+    _prune_snapshots(directory, keep=SNAPSHOT_KEEP)
+    rows = sum(table['rows'] for table in manifest['tables'].values())
+    logger.info(f"Exported snapshot {final_path} ({rows:,} rows) in {(time.perf_counter() - start_time) * 1000:.0f} ms")
+    return final_path
+
+def _prune_snapshots(directory: str, keep: int, prefix: str = 'v'):
+    """Remove all but the newest `keep` snapshots"""
+    names = sorted(name for name in os.listdir(directory)
+                   if name.startswith(prefix) and os.path.isdir(os.path.join(directory, name)))
+    for name in names[:-keep] if keep > 0 else []:
+        shutil.rmtree(os.path.join(directory, name), ignore_errors=True)
+
+class Snapshot:
+    """A published snapshot whose tables are opened memory-mapped from Arrow IPC files"""
+
+    def __init__(self, path: str):
+        _require_pyarrow()
+        self.path = path
+        with open(os.path.join(path, MANIFEST_FILE)) as f:
+            self.manifest = json.load(f)
+        self.version = self.manifest['version']
+        self._tables = {}
+
+    def table(self, name: str) -> 'pa.Table':
+        """One table as an Arrow table backed by memory-mapped partition files (no copy)"""
+        if name not in self._tables:
+            files = self.manifest['tables'][name]['files']
+            parts = [pa.ipc.open_file(pa.memory_map(os.path.join(self.path, entry['path']), 'r')).read_all()
+                     for entry in files]
+            self._tables[name] = pa.concat_tables(parts) if parts else pa.table({})
+        return self._tables[name]
+
+    def to_pandas(self, name: str) -> pd.DataFrame:
+        return self.table(name).to_pandas()
+
+    def verify(self, db_manager: DatabaseManager = None) -> List[str]:
+        """Check file checksums and row counts, and optionally row counts against the database"""
+        problems = []
+        for table_name, entry in self.manifest['tables'].items():
+            rows = 0
+            for file in entry['files']:
+                path = os.path.join(self.path, file['path'])
+                if not os.path.exists(path):
+                    problems.append(f"{table_name}: missing {file['path']}")
+                    continue
+                if _sha256(path) != file['sha256']:
+                    problems.append(f"{table_name}: checksum mismatch in {file['path']}")
+                file_rows = pa.ipc.open_file(pa.memory_map(path, 'r')).read_all().num_rows
+                if file_rows != file['rows']:
+                    problems.append(f"{table_name}: {file['path']} has {file_rows} rows, manifest says {file['rows']}")
+                rows += file_rows
+            if rows != entry['rows']:
+                problems.append(f"{table_name}: {rows} rows in files, manifest says {entry['rows']}")
+            if db_manager is not None:
+                with db_manager.engine.connect() as conn:
+                    db_rows = conn.execute(text(f"SELECT COUNT(*) FROM {table_name}")).scalar()
+                if db_rows != entry['rows']:
+                    problems.append(f"{table_name}: {entry['rows']} rows in snapshot, {db_rows} in database")
+        return problems
+
+def open_snapshot(path: str = None, directory: str = SNAPSHOT_DIR) -> Optional[Snapshot]:
+    """Open a snapshot (the LATEST one by default), or None if there is none"""
+    path = path or latest_snapshot_path(directory)
+    return Snapshot(path) if path else None
+
+def export_snapshot_hook(version: int):
+    """Post-ingest hook: write the snapshot for the new data version"""
+    if not SNAPSHOT_EXPORT:
+        return
+    if pa is None:
+        logger.info("pyarrow is not installed; skipping snapshot export")
+        return
+    export_snapshot(version=version)
+
+# Database snapshots: the whole database as one immutable SQLite file, for read nodes
+
+def _copy_database(db_manager: DatabaseManager, path: str):
+    """Write a transactionally consistent copy of the database to a new SQLite file"""
+    if not db_manager.use_postgres:
+        # VACUUM INTO copies what one read transaction sees, compacted, without blocking writers
+        with db_manager.engine.connect() as conn:
+            conn.exec_driver_sql("VACUUM INTO ?", (path,))
+        return
+
+    target = create_engine(f"sqlite:///{path}")
+    try:
+        # One repeatable-read transaction, so every table is copied as of the same moment
+        with db_manager.engine.connect().execution_options(isolation_level='REPEATABLE READ') as conn:
+            inspector = inspect(conn)
+            for table_name in inspector.get_table_names():
+                pd.read_sql(text(f'SELECT * FROM "{table_name}" LIMIT 0'), conn).to_sql(
+                    table_name, target, index=False, if_exists='replace')
+                for chunk in pd.read_sql(text(f'SELECT * FROM "{table_name}"'), conn, chunksize=50000):
+                    chunk.to_sql(table_name, target, index=False, if_exists='append')
+                with target.begin() as target_conn:
+                    for index in inspector.get_indexes(table_name):
+                        if None not in index['column_names']:
+                            columns = ', '.join(f'"{column}"' for column in index['column_names'])
+                            target_conn.exec_driver_sql(
+                                f'CREATE INDEX IF NOT EXISTS "{index["name"]}" ON "{table_name}" ({columns})')
+    finally:
+        target.dispose()
+
+def _seal_database_file(path: str) -> Tuple[int, Dict[str, int]]:
+    """Prepare a copied database for immutable readers; returns its data version and table row counts"""
+    conn = sqlite3.connect(path)
+    try:
+        # Immutable readers take no locks and read no -wal file, so the copy must not use WAL
+        conn.execute("PRAGMA journal_mode=DELETE")
+        # Planner statistics are computed once here rather than never on the read nodes
+        conn.execute("ANALYZE")
+        conn.commit()
+        tables = {name: conn.execute(f'SELECT COUNT(*) FROM "{name}"').fetchone()[0]
+                  for (name,) in conn.execute("SELECT name FROM sqlite_master WHERE type = 'table' "
+                                              "AND name NOT LIKE 'sqlite_%' ORDER BY name")}
+        version = conn.execute("SELECT MAX(version) FROM data_version").fetchone()[0]
+    finally:
+        conn.close()
+    with open(path, 'rb') as f:
+        os.fsync(f.fileno())
+    return version, tables
+
+def publish_database_snapshot(db_manager: DatabaseManager = None, version: int = None,
+                              directory: str = SNAPSHOT_DIR, force: bool = False) -> str:
+    """Publish the database as a read-only SQLite snapshot and point LATEST_DB at it.
+
+    Published snapshots are never modified: a version that already has one is
+    left alone unless forced. The manifest records the version found inside
+    the copy, which is newer than `version` if a delta committed meanwhile.
+    """
+    db_manager = db_manager or DatabaseManager()
+    version = version if version is not None else db_manager.get_data_version()
+    final_path = os.path.join(directory, _database_snapshot_name(version))
+    if os.path.exists(os.path.join(final_path, MANIFEST_FILE)) and not force:
+        logger.info(f"Database snapshot for data version {version} already exists at {final_path}")
+        return final_path
+
+    start_time = time.perf_counter()
+    os.makedirs(directory, exist_ok=True)
+    # Build in a temporary directory and rename, so readers never see a partial snapshot
+    tmp_path = tempfile.mkdtemp(prefix=f".{_database_snapshot_name(version)}.tmp-", dir=directory)
+    # mkdtemp makes it private to this user; read nodes may run as another
+    os.chmod(tmp_path, 0o755)
+    try:
+        database_file = os.path.join(os.path.abspath(tmp_path), DATABASE_SNAPSHOT_FILE)
+        _copy_database(db_manager, database_file)
+        copied_version, tables = _seal_database_file(database_file)
+        manifest = {
+            'version': copied_version,
+            'format': DATABASE_SNAPSHOT_FORMAT,
+            'created_at': datetime.now(timezone.utc).isoformat(),
+            'source': 'postgresql' if db_manager.use_postgres else 'sqlite',
+            'file': DATABASE_SNAPSHOT_FILE,
+            'bytes': os.path.getsize(database_file),
+            'sha256': _sha256(database_file),
+            'tables': tables,
+        }
+        with open(os.path.join(tmp_path, MANIFEST_FILE), 'w') as f:
+            json.dump(manifest, f, indent=2)
+
+        final_path = os.path.join(directory, _database_snapshot_name(copied_version))
+        if os.path.exists(final_path):
+            if not force:
+                logger.info(f"Database snapshot for data version {copied_version} was published meanwhile")
+                return final_path
+            shutil.rmtree(final_path)
+        os.rename(tmp_path, final_path)
+    finally:
+        shutil.rmtree(tmp_path, ignore_errors=True)
+
+    # Publishers can finish out of order; LATEST_DB only ever moves forward
+    latest = latest_database_snapshot_path(directory)
+    if latest is None or os.path.basename(latest) <= _database_snapshot_name(copied_version):
+        _write_pointer(directory, LATEST_DATABASE_FILE, _database_snapshot_name(copied_version))
+
+    _prune_snapshots(directory, keep=SNAPSHOT_KEEP, prefix='db-v')
+    logger.info(f"Published database snapshot {final_path} ({manifest['bytes'] / 1024 / 1024:.1f} MB) "
+                f"in {(time.perf_counter() - start_time) * 1000:.0f} ms")
+    return final_path
+
+def open_database_snapshot(path: str, verify: bool = True) -> Tuple[Any, Dict[str, Any]]:
+    """(engine, manifest) for a database snapshot, opened read-only, immutable and memory-mapped"""
+    with open(os.path.join(path, MANIFEST_FILE)) as f:
+        manifest = json.load(f)
+    database_file = os.path.abspath(os.path.join(path, manifest['file']))
+    if verify and _sha256(database_file) != manifest['sha256']:
+        raise ValueError(f"checksum mismatch in {database_file}")
+
+    # immutable=1: the file never changes, so SQLite skips locking and change detection
+    engine = create_engine(f"sqlite:///file:{quote(database_file)}?mode=ro&immutable=1&uri=true")
+
+    @event.listens_for(engine, 'connect')
+    def _map_pages(dbapi_connection, connection_record):
+        dbapi_connection.execute(f"PRAGMA mmap_size={SNAPSHOT_MMAP_MB * 1024 * 1024}")
+
+    try:
+        with engine.connect() as conn:
+            version = conn.execute(text("SELECT MAX(version) FROM data_version")).scalar()
+        if version != manifest['version']:
+            raise ValueError(f"{database_file} holds data version {version}, manifest says {manifest['version']}")
+    except Exception:
+        engine.dispose()
+        raise
+    return engine, manifest
+
+class SnapshotFollower:
+    """Keep a read node serving the newest published database snapshot.
+
+    A newer snapshot is opened and checked before it is swapped in, so requests
+    never wait on the swap: queries already running finish on the snapshot
+    they started on, and the next ones use the new one. A snapshot that fails
+    its checks is skipped and the current one keeps serving.
+    """
+
+    def __init__(self, directory: str = SNAPSHOT_DIR, interval: float = SNAPSHOT_POLL_INTERVAL):
+        self.directory = directory
+        self.interval = interval
+        self.version: Optional[int] = None
+        self.path: Optional[str] = None
+        self.swaps = 0
+        self.last_error: Optional[str] = None
+        self._rejected: Optional[str] = None
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def poll(self) -> bool:
+        """Swap to the LATEST_DB snapshot if it is newer than the one being served"""
+        with self._lock:
+            path = latest_database_snapshot_path(self.directory)
+            if path is None or path == self.path or path == self._rejected:
+                return False
+            try:
+                engine, manifest = open_database_snapshot(path)
+            except Exception as e:
+                self._rejected = path
+                self.last_error = f"{path}: {str(e)}"
+                logger.error(f"Not serving database snapshot {path}: {str(e)}")
+                return False
+            if self.version is not None and manifest['version'] <= self.version:
+                engine.dispose()
+                return False
+
+            previous = serve_snapshot(engine, manifest['version'], path)
+            if previous is not None:
+                # Checked-out connections stay usable; the old pool closes as they come back
+                previous['engine'].dispose()
+            logger.info(f"Serving database snapshot {path} (data version {manifest['version']}, "
+                        f"was {self.version})")
+            self.version, self.path = manifest['version'], path
+            self.swaps += 1
+            self.last_error = None
+            return True
+
+    def wait_for_snapshot(self, timeout: float = None, poll_interval: float = 0.5) -> int:
+        """Block until a snapshot is being served, then return its data version"""
+        if timeout is None:
+            timeout = float(os.environ.get("INGEST_WAIT_TIMEOUT", 300))
+        deadline = time.monotonic() + timeout
+        while not self.poll() and self.version is None:
+            if time.monotonic() >= deadline:
+                raise TimeoutError(f"No database snapshot published in {self.directory} after {timeout:.0f}s")
+            time.sleep(poll_interval)
+        return self.version
+
+    def start(self) -> 'SnapshotFollower':
+        self._thread = threading.Thread(target=self._poll_loop, name='snapshot-follower', daemon=True)
+        self._thread.start()
+        logger.info(f"Following database snapshots in {self.directory} every {self.interval:.0f}s")
+        return self
+
+    def stop(self, timeout: float = None):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout)
+
+    def _poll_loop(self):
+        while not self._stop.wait(self.interval):
+            try:
+                self.poll()
+            except Exception as e:
+                logger.error(f"Error checking {self.directory} for database snapshots: {str(e)}")
+
+    def status(self) -> Dict[str, Any]:
+        return {'directory': self.directory, 'version': self.version, 'path': self.path,
+                'swaps': self.swaps, 'last_error': self.last_error}
+
+_follower: Optional[SnapshotFollower] = None
+_follower_lock = threading.Lock()
+
+def start_snapshot_follower() -> SnapshotFollower:
+    """Serve the newest database snapshot (waiting for the first one) and follow new ones in the background"""
+    global _follower
+    with _follower_lock:
+        if _follower is None:
+            follower = SnapshotFollower()
+            follower.wait_for_snapshot()
+            _follower = follower.start()
+        return _follower
+
+def get_snapshot_follower() -> Optional[SnapshotFollower]:
+    return _follower
+
+def publish_database_snapshot_hook(version: int):
+    """Post-ingest hook: publish the database for read nodes, once all derived tables are built"""
+    if not SNAPSHOT_DATABASE:
+        return
+    publish_database_snapshot(version=version)
+
+def _inspect(snapshot: Snapshot):
+    print(f"Snapshot {snapshot.path}")
+    print(f"  data version {snapshot.version}, format {snapshot.manifest['format']}, created {snapshot.manifest['created_at']}")
+    for table_name, entry in snapshot.manifest['tables'].items():
+        size = sum(file['bytes'] for file in entry['files'])
+        partitions = [file['partition'] for file in entry['files']]
+        span = f"{partitions[0]} .. {partitions[-1]}" if partitions else "empty"
+        print(f"  {table_name}: {entry['rows']:,} rows, {len(partitions)} partitions by {entry['partition_by']} "
+              f"({span}), {size / 1024:.1f} KB")
+        print(f"    {', '.join(f'{name}:{dtype}' for name, dtype in entry['schema'])}")
+
+def main(argv: List[str] = None) -> int:
+    parser = argparse.ArgumentParser(description="Export, inspect and verify snapshots, and publish database snapshots")
+    parser.add_argument('--dir', default=SNAPSHOT_DIR, help="snapshot directory")
+    commands = parser.add_subparsers(dest='command', required=True)
+    export = commands.add_parser('export', help="write a snapshot of the current data version")
+    export.add_argument('--force', action='store_true', help="rewrite an existing snapshot")
+    publish = commands.add_parser('publish', help="publish the database as a read-only SQLite snapshot for read nodes")
+    publish.add_argument('--force', action='store_true', help="rewrite an existing database snapshot")
+    inspect = commands.add_parser('inspect', help="describe a snapshot")
+    inspect.add_argument('path', nargs='?', help="snapshot path (default: LATEST)")
+    verify = commands.add_parser('verify', help="check checksums and row counts")
+    verify.add_argument('path', nargs='?', help="snapshot path (default: LATEST)")
+    verify.add_argument('--against-db', action='store_true', help="also compare row counts with the database")
+    args = parser.parse_args(argv)
+
+    if args.command == 'publish':
+        path = publish_database_snapshot(directory=args.dir, force=args.force)
+        print(f"✅ Published {path}")
+        return 0
+
+    _require_pyarrow()
+    if args.command == 'export':
+        path = export_snapshot(directory=args.dir, force=args.force)
+        print(f"✅ Exported {path}")
+        return 0
+
+    snapshot = open_snapshot(args.path, directory=args.dir)
+    if snapshot is None:
+        print(f"❌ No snapshot found in {args.dir}")
+        return 1
+    if args.command == 'inspect':
+        _inspect(snapshot)
+        return 0
+
+    problems = snapshot.verify(DatabaseManager() if args.against_db else None)
+    for problem in problems:
+        print(f"❌ {problem}")
+    print(f"✅ Snapshot {snapshot.path} verified" if not problems else f"{len(problems)} problems found")
+    return 1 if problems else 0
+
+if __name__ == '__main__':
+    logging.basicConfig(level=logging.INFO)
+    sys.exit(main())
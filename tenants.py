@@ -0,0 +1,157 @@
+import glob
+import logging
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, wait
+from typing import List, Dict, Any, Optional, Tuple
+from sqlalchemy import create_engine, text
+from database import DatabaseManager, TENANT_DATABASE_URL, TENANT_KEY
+from timeseries import DAILY_METRICS, DAILY_METRICS_QUERY, with_ratios
+
+logger = logging.getLogger(__name__)
+
+# Tenants fanned out to (comma-separated); discovered from the shards when unset
+TENANTS = os.environ.get("TENANTS")
+# Shards queried at once, and how long a fan-out waits for the slowest one
+TENANT_FANOUT_CONCURRENCY = int(os.environ.get("TENANT_FANOUT_CONCURRENCY", 8))
+TENANT_FANOUT_TIMEOUT = float(os.environ.get("TENANT_FANOUT_TIMEOUT", 30))
+
+_fanout_executor = ThreadPoolExecutor(max_workers=TENANT_FANOUT_CONCURRENCY, thread_name_prefix='tenant-fanout')
+
+# Additive partial aggregates each shard returns. Ratios are only computed after
+# summing, so RoAS is total ad sales over total ad spend across tenants, not a
+# mean of per-tenant RoAS. Item ids are per-seller, so distinct products add up.
+PARTIAL_QUERIES = {
+    'sales': """
+        SELECT
+            COALESCE(SUM(total_sales), 0) as total_sales,
+            COALESCE(SUM(total_units_ordered), 0) as total_units,
+            COUNT(*) as sale_rows,
+            COUNT(DISTINCT item_id) as active_products
+        FROM total_sales WHERE total_sales > 0
+    """,
+    'ads': """
+        SELECT
+            COALESCE(SUM(ad_sales), 0) as ad_sales,
+            COALESCE(SUM(ad_spend), 0) as ad_spend,
+            COALESCE(SUM(impressions), 0) as impressions,
+            COALESCE(SUM(clicks), 0) as clicks,
+            COALESCE(SUM(units_sold), 0) as ad_units
+        FROM ad_sales WHERE ad_spend > 0
+    """,
+}
+
+def list_tenants() -> List[str]:
+    """Tenants from TENANTS, or the SQLite shard files / PostgreSQL tenant schemas that exist"""
+    if TENANTS:
+        return sorted({tenant.strip() for tenant in TENANTS.split(',') if tenant.strip()})
+    if '{tenant}' in TENANT_DATABASE_URL:
+        if not TENANT_DATABASE_URL.startswith('sqlite'):
+            return []
+        prefix, suffix = TENANT_DATABASE_URL.split(':///', 1)[1].split('{tenant}', 1)
+        names = [path[len(prefix):len(path) - len(suffix)] for path in glob.glob(f"{prefix}*{suffix}")]
+        return sorted(name for name in names if TENANT_KEY.match(name))
+    engine = create_engine(TENANT_DATABASE_URL)
+    with engine.connect() as conn:
+        schemas = conn.execute(text("SELECT schema_name FROM information_schema.schemata WHERE schema_name LIKE 'tenant\\_%'"))
+        return sorted(row[0][len('tenant_'):] for row in schemas)
+
+def merge_partials(partials: List[Dict[str, Any]]) -> Dict[str, float]:
+    """Sum partial aggregates key by key"""
+    merged: Dict[str, float] = {}
+    for partial in partials:
+        for key, value in partial.items():
+            merged[key] = merged.get(key, 0) + (value or 0)
+    return merged
+
+def with_derived_metrics(sums: Dict[str, float]) -> Dict[str, float]:
+    """Business metrics from summed partials"""
+    metrics = with_ratios(sums)
+    metrics['avg_sales_per_transaction'] = sums['total_sales'] / sums['sale_rows'] if sums['sale_rows'] else 0
+    return metrics
+
+_managers: Dict[str, DatabaseManager] = {}
+_managers_lock = threading.Lock()
+
+def get_tenant_manager(tenant: str) -> DatabaseManager:
+    """One read-only DatabaseManager (and connection pool) per tenant shard, shared across requests.
+
+    Fan-out never creates storage, so a tenant without a shard fails instead of
+    leaving an empty shard behind for list_tenants to find.
+    """
+    with _managers_lock:
+        if tenant not in _managers:
+            _managers[tenant] = DatabaseManager(tenant, read_only=True)
+        return _managers[tenant]
+
+class ShardedAnalytics:
+    """Cross-tenant analytics: partial aggregates run on every shard in parallel, then merged"""
+
+    def __init__(self, tenants: List[str] = None):
+        self.tenants = tenants
+
+    def scatter(self, query: str, params: Dict[str, Any] = None) -> Tuple[Dict[str, List[Dict[str, Any]]], Dict[str, str]]:
+        """(rows per tenant, error per failed tenant) for a query run on every shard"""
+        tenants = self.tenants if self.tenants is not None else list_tenants()
+        futures = {_fanout_executor.submit(get_tenant_manager(tenant).execute_query, query, params): tenant
+                   for tenant in tenants}
+        done, pending = wait(futures, timeout=TENANT_FANOUT_TIMEOUT)
+        results, failed = {}, {}
+        for future in done:
+            tenant = futures[future]
+            try:
+                results[tenant] = future.result()
+            except Exception as e:
+                failed[tenant] = str(e)
+        for future in pending:
+            future.cancel()
+            failed[futures[future]] = f"timed out after {TENANT_FANOUT_TIMEOUT:.0f}s"
+        if failed:
+            logger.warning(f"{len(failed)} of {len(tenants)} shards failed: {failed}")
+        # Tenant order, not completion order, so merged floating-point sums are reproducible
+        return dict(sorted(results.items())), failed
+
+    def summary(self) -> Dict[str, Any]:
+        """Sales and ad metrics per tenant and across all of them"""
+        start = time.perf_counter()
+        partials: Dict[str, Dict[str, Any]] = {}
+        failed: Dict[str, str] = {}
+        for query in PARTIAL_QUERIES.values():
+            results, errors = self.scatter(query)
+            failed.update(errors)
+            for tenant, rows in results.items():
+                partials.setdefault(tenant, {}).update(rows[0] if rows else {})
+        # A tenant counts only when all its partials arrived
+        partials = {tenant: partial for tenant, partial in partials.items() if tenant not in failed}
+        return {
+            'tenants': {tenant: with_derived_metrics(merge_partials([partial])) for tenant, partial in partials.items()},
+            'totals': with_derived_metrics(merge_partials(list(partials.values()))) if partials else None,
+            'shards': len(partials),
+            'failed': failed,
+            'elapsed_ms': round((time.perf_counter() - start) * 1000, 1),
+        }
+
+    def daily(self, start: Optional[str] = None, end: Optional[str] = None) -> Dict[str, Any]:
+        """Per-day metrics summed across tenants, with ratios computed from the daily sums"""
+        started = time.perf_counter()
+        conditions, params = [], {}
+        if start:
+            conditions.append("date >= :start")
+            params['start'] = start
+        if end:
+            conditions.append("date <= :end")
+            params['end'] = end
+        where = f"WHERE {' AND '.join(conditions)}" if conditions else ''
+        results, failed = self.scatter(DAILY_METRICS_QUERY.format(total_sales_filter=where, ad_sales_filter=where), params)
+
+        days: Dict[str, List[Dict[str, Any]]] = {}
+        for rows in results.values():
+            for row in rows:
+                days.setdefault(str(row['date']), []).append({metric: row[metric] for metric in DAILY_METRICS})
+        return {
+            'series': [{'date': day, **with_ratios(merge_partials(partials))} for day, partials in sorted(days.items())],
+            'shards': len(results),
+            'failed': failed,
+            'elapsed_ms': round((time.perf_counter() - started) * 1000, 1),
+        }
@@ -0,0 +1,31 @@
+import pytest
+
+import llm_client
+from ai_agent import AIAgent
+
+@pytest.fixture
+def agent(tmp_path, monkeypatch):
+    monkeypatch.setenv('DATABASE_URL', f"sqlite:///{tmp_path / 'history.db'}")
+    monkeypatch.setattr(llm_client, 'LLM_BACKEND', 'fake')
+    monkeypatch.setattr(llm_client, '_client', None)
+    agent = AIAgent()
+    with agent.db_manager.engine.connect() as conn:
+        conn.exec_driver_sql("""
+            CREATE TABLE query_history (id INTEGER PRIMARY KEY, question TEXT NOT NULL, sql_query TEXT,
+                                        created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP, response_summary TEXT,
+                                        execution_time_ms INTEGER)
+        """)
+        conn.commit()
+    return agent
+
+@pytest.mark.parametrize('asked', ["What is  my RoAS", "what is my roas", "  WHAT\tis my RoAS\n"])
+def test_history_fallback_matches_the_memory_key(agent, asked):
+    agent.db_manager.save_query_history("What is my RoAS", "SELECT 1;", "ok")
+    assert agent._cached_sql(asked) == "SELECT 1;"
+
+def test_history_fallback_needs_the_same_words(agent):
+    agent.db_manager.save_query_history("What is my RoAS", "SELECT 1;", "ok")
+    agent.db_manager.save_query_history("What is my 100% RoAS", "SELECT 2;", "ok")
+    assert agent._cached_sql("What is not my RoAS") is None
+    assert agent._cached_sql("What is my 100%  RoAS") == "SELECT 2;"
+    assert agent._cached_sql("What is my RoAS_") is None
@@ -0,0 +1,98 @@
+import math
+
+import pandas as pd
+import pytest
+
+from columnar import ColumnarStore
+from database import DatabaseManager
+from queries import FIXED_QUERIES, QUERY_PARAMS, run_fixed_query
+
+# Items 1-3 tie on total sales, items 4-5 on RoAS, so both LIMITs can cut through a tie.
+# Several ad rows per item exercise the join fan-out in product_performance, and item 7
+# has two eligibility values at its latest timestamp.
+TOTAL_SALES = pd.DataFrame({
+    'date': ['2025-06-01', '2025-06-01', '2025-06-02', '2025-06-02', '2025-06-03', '2025-06-03',
+             '2025-06-03', '2025-06-04', '2025-06-04', '2025-06-05'],
+    'item_id': [1, 2, 3, 4, 5, 6, 7, 1, 8, 6],
+    'total_sales': [10.0, 15.0, 15.0, 8.5, 3.25, -2.0, 0.0, 5.0, 40.0, 1.5],
+    'total_units_ordered': [1, 3, 2, 1, 1, 0, 0, 1, 4, 1],
+})
+AD_SALES = pd.DataFrame({
+    'date': ['2025-06-01', '2025-06-01', '2025-06-02', '2025-06-02', '2025-06-03', '2025-06-03', '2025-06-04', '2025-06-05'],
+    'item_id': [1, 1, 4, 5, 5, 2, 8, 3],
+    'ad_sales': [20.0, 4.0, 12.0, 6.0, 6.0, 0.0, 30.0, 2.0],
+    'impressions': [200, 50, 120, 80, 40, 10, 300, 0],
+    'ad_spend': [6.0, 2.0, 4.0, 2.0, 2.0, 1.0, 12.0, 0.0],
+    'clicks': [8, 2, 5, 3, 1, 0, 15, 0],
+    'units_sold': [2, 0, 1, 1, 0, 0, 3, 0],
+})
+ELIGIBILITY = pd.DataFrame({
+    'eligibility_datetime_utc': ['2025-06-01 00:00:00', '2025-06-02 00:00:00', '2025-06-01 00:00:00',
+                                 '2025-06-01 00:00:00', '2025-06-03 00:00:00', '2025-06-03 00:00:00'],
+    'item_id': [1, 1, 2, 4, 7, 7],
+    'eligibility': ['TRUE', 'FALSE', 'TRUE', 'FALSE', 'TRUE', 'FALSE'],
+    'message': ['', 'out of stock', '', 'restricted', '', ''],
+})
+
+# Queries whose row order SQL leaves unspecified (compared after sorting by key columns)
+UNORDERED_QUERIES = {'business_sales', 'business_ads', 'business_eligibility', 'product_performance',
+                     'eligibility_distribution', 'ad_performance'}
+PARAM_VALUES = {'days': [1, 3, 100], 'limit': [1, 2, 3, 4, 100]}
+# The column each LIMIT query orders by
+ORDER_COLUMNS = {'top_products': 'total_product_sales', 'roas_by_product': 'roas'}
+
+CASES = [pytest.param(name, {key: value}, id=f"{name}-{key}={value}")
+         for name in FIXED_QUERIES for key in sorted(QUERY_PARAMS[name]) for value in PARAM_VALUES[key]]
+CASES += [pytest.param(name, {}, id=name) for name in FIXED_QUERIES if not QUERY_PARAMS[name]]
+
+@pytest.fixture(scope='module')
+def backends(tmp_path_factory):
+    url = f"sqlite:///{tmp_path_factory.mktemp('parity') / 'parity.db'}"
+    with pytest.MonkeyPatch.context() as monkeypatch:
+        monkeypatch.setenv('DATABASE_URL', url)
+        db_manager = DatabaseManager()
+    for table, df in (('total_sales', TOTAL_SALES), ('ad_sales', AD_SALES), ('eligibility', ELIGIBILITY)):
+        df.to_sql(table, db_manager.engine, index=False)
+    return db_manager, ColumnarStore.from_database(db_manager)
+
+def values_match(expected, actual) -> bool:
+    if expected is None or actual is None:
+        return expected is None and actual is None
+    if isinstance(expected, (int, float)) and isinstance(actual, (int, float)):
+        return math.isclose(expected, actual, rel_tol=1e-9, abs_tol=1e-6)
+    return str(expected) == str(actual)
+
+def rows_match(expected, actual) -> bool:
+    return list(expected) == list(actual) and all(values_match(expected[key], actual[key]) for key in expected)
+
+def sort_key(row):
+    return tuple(str(row.get(column)) for column in ('item_id', 'eligibility', 'is_eligible'))
+
+@pytest.mark.parametrize('name, params', CASES)
+def test_columnar_matches_sql(backends, name, params):
+    db_manager, store = backends
+    expected = run_fixed_query(db_manager, name, backend='sql', **params)
+    actual = store.run(name, **params)
+    assert len(expected) == len(actual)
+    if name in UNORDERED_QUERIES:
+        expected, actual = sorted(expected, key=sort_key), sorted(actual, key=sort_key)
+    if 'limit' not in params:
+        for sql_row, columnar_row in zip(expected, actual):
+            assert rows_match(sql_row, columnar_row), (sql_row, columnar_row)
+        return
+
+    # Tied rows at the LIMIT boundary may pick different items: every row must be an item's
+    # true row, and the ordering column must match position by position
+    every_item = {row['item_id']: row for row in run_fixed_query(db_manager, name, backend='sql', limit=1000)}
+    order_column = ORDER_COLUMNS[name]
+    for sql_row, columnar_row in zip(expected, actual):
+        assert rows_match(every_item[columnar_row['item_id']], columnar_row), columnar_row
+        assert values_match(sql_row[order_column], columnar_row[order_column])
+    assert len({row['item_id'] for row in actual}) == len(actual)
+
+def test_fixture_has_ties_at_the_limit_boundary(backends):
+    db_manager, _ = backends
+    top = run_fixed_query(db_manager, 'top_products', backend='sql', limit=1000)
+    roas = run_fixed_query(db_manager, 'roas_by_product', backend='sql', limit=1000)
+    assert top[2]['total_product_sales'] == top[3]['total_product_sales']
+    assert roas[1]['roas'] == roas[2]['roas']
@@ -0,0 +1,42 @@
+import pandas as pd
+import pytest
+from sqlalchemy import text
+
+import delta_ingest
+from delta_ingest import DeltaIngestor
+
+EXISTING = pd.DataFrame({
+    'date': ['2025-06-01', '2025-06-02'],
+    'item_id': [1, 1],
+    'total_sales': [5.0, 6.0],
+    'total_units_ordered': [1, 1],
+})
+
+def row(day, item, sales):
+    return {'date': day, 'item_id': item, 'total_sales': sales, 'total_units_ordered': 1}
+
+@pytest.fixture
+def ingestor(tmp_path, monkeypatch):
+    monkeypatch.setenv('DATABASE_URL', f"sqlite:///{tmp_path / 'delta.db'}")
+    monkeypatch.setattr(delta_ingest, 'DELTA_BATCH_ROWS', 2)
+    ingestor = DeltaIngestor()
+    EXISTING.to_sql('total_sales', ingestor.db_manager.engine, index=False)
+    return ingestor
+
+def test_keys_repeated_across_batches_count_once(ingestor):
+    rows = [
+        row('2025-06-01', 1, 10.0),   # replaces an existing row
+        row('2025-06-03', 2, 1.0),    # new
+        row('2025-06-03', 2, 2.0),    # repeats a key from the first batch
+        row('2025-06-01', 1, 11.0),   # repeats a replaced key
+        row('2025-06-04', 3, 3.0),    # new
+    ]
+    stats = {'rows': 0, 'replaced': 0}
+    with ingestor.db_manager.engine.begin() as conn:
+        changed = ingestor._upsert(conn, 'total_sales', iter(rows), stats)
+    assert stats == {'rows': 3, 'replaced': 1}
+    assert changed['total_sales']['item_id'] == {1, 2, 3}
+    with ingestor.db_manager.engine.connect() as conn:
+        table = {(r.date, r.item_id): r.total_sales for r in conn.execute(text("SELECT * FROM total_sales"))}
+    # The last row for each key wins, and untouched rows stay
+    assert table == {('2025-06-01', 1): 11.0, ('2025-06-02', 1): 6.0, ('2025-06-03', 2): 2.0, ('2025-06-04', 3): 3.0}
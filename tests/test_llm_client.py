@@ -0,0 +1,110 @@
+import threading
+import time
+
+import pytest
+
+from llm_client import (
+    CircuitBreaker, FakeBackend, LLMError, LLMTimeoutError, LLMUnavailableError, ResilientLLMClient,
+)
+
+BadRequest = type('BadRequest', (Exception,), {'code': 400})
+
+def outcome(client: ResilientLLMClient) -> str:
+    try:
+        client.generate("hi")
+        return 'ok'
+    except LLMError as e:
+        return type(e).__name__
+
+def open_breaker(reset_timeout: float = 0.05):
+    """A client whose breaker has just opened after two transient failures"""
+    breaker = CircuitBreaker(failure_threshold=2, reset_timeout=reset_timeout)
+    backend = FakeBackend(failures=2)
+    client = ResilientLLMClient(backend, max_retries=0, breaker=breaker)
+    for _ in range(2):
+        outcome(client)
+    assert breaker.state == 'open'
+    return client, breaker, backend
+
+def test_retries_transient_failures():
+    backend = FakeBackend(failures=2)
+    client = ResilientLLMClient(backend, max_retries=3, base_delay=0.01, max_delay=0.02)
+    assert client.generate("hi")
+    assert backend.calls == 3
+
+def test_does_not_retry_client_errors():
+    backend = FakeBackend(failures=1, error=BadRequest("bad request"))
+    client = ResilientLLMClient(backend, max_retries=3, base_delay=0.01)
+    with pytest.raises(LLMError):
+        client.generate("hi")
+    assert backend.calls == 1
+
+def test_gives_up_at_the_deadline():
+    client = ResilientLLMClient(FakeBackend(latency=1.0), timeout=5, max_retries=0)
+    start = time.monotonic()
+    with pytest.raises(LLMTimeoutError):
+        client.generate("hi", deadline=0.2)
+    assert time.monotonic() - start < 0.5
+
+def test_limits_concurrent_upstream_calls():
+    backend = FakeBackend(latency=0.2)
+    client = ResilientLLMClient(backend, max_concurrency=2, max_retries=0, deadline=0.3)
+    outcomes = []
+    threads = [threading.Thread(target=lambda: outcomes.append(outcome(client))) for _ in range(4)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert backend.max_active == 2
+    assert outcomes.count('ok') >= 2
+
+def test_opens_after_consecutive_failures_and_fails_fast():
+    client, breaker, backend = open_breaker(reset_timeout=10)
+    with pytest.raises(LLMUnavailableError):
+        client.generate("hi")
+    assert backend.calls == 2
+
+def test_half_open_allows_a_single_trial():
+    _, breaker, _ = open_breaker()
+    time.sleep(0.06)
+    assert breaker.allow()
+    assert breaker.state == 'half_open'
+    assert not breaker.allow()
+
+def test_successful_trial_closes_the_circuit():
+    client, breaker, _ = open_breaker()
+    time.sleep(0.06)
+    assert client.generate("hi")
+    assert breaker.state == 'closed'
+    assert breaker.failures == 0
+
+def test_failed_trial_reopens_the_circuit():
+    client, breaker, backend = open_breaker()
+    time.sleep(0.06)
+    backend.failures = 1
+    assert outcome(client) == 'RetryableError'
+    assert breaker.state == 'open'
+    with pytest.raises(LLMUnavailableError):
+        client.generate("hi")
+
+def test_rejected_trial_does_not_close_the_circuit():
+    client, breaker, backend = open_breaker()
+    time.sleep(0.06)
+    backend.failures, backend.error = 1, BadRequest("bad request")
+    assert outcome(client) == 'LLMError'
+    assert breaker.state == 'half_open'
+    # The trial slot is free again, so the next call probes the upstream
+    assert client.generate("hi")
+    assert breaker.state == 'closed'
+
+def test_rejected_request_keeps_the_failure_count():
+    breaker = CircuitBreaker(failure_threshold=2, reset_timeout=10)
+    backend = FakeBackend(failures=1)
+    client = ResilientLLMClient(backend, max_retries=0, breaker=breaker)
+    outcome(client)
+    backend.failures, backend.error = 1, BadRequest("bad request")
+    outcome(client)
+    assert breaker.failures == 1
+    backend.failures, backend.error = 1, ConnectionError("reset")
+    outcome(client)
+    assert breaker.state == 'open'
@@ -0,0 +1,38 @@
+import pytest
+
+import query_rewriter  # registers the rollup tables
+from query_cache import QueryCache, referenced_tables
+
+CACHED = [
+    "SELECT SUM(total_sales) FROM total_sales",
+    "SELECT * FROM total_sales ts LEFT JOIN ad_sales AS ads ON ts.item_id = ads.item_id",
+    "SELECT * FROM total_sales t, ad_sales a WHERE t.item_id = a.item_id",
+    "SELECT * FROM (SELECT item_id FROM eligibility) e, total_sales",
+    "WITH latest AS (SELECT item_id FROM eligibility) SELECT * FROM latest JOIN ad_sales USING (item_id)",
+    "SELECT date, SUM(sum_total_sales) FROM total_sales_by_day GROUP BY date",
+    "SELECT * FROM total_sales WHERE item_id IN (SELECT item_id FROM eligibility_latest)",
+]
+
+NOT_CACHED = [
+    "SELECT * FROM query_history ORDER BY created_at DESC",
+    "SELECT payload FROM warm_payloads",
+    "SELECT state FROM warmup_runs",
+    "SELECT COUNT(*) FROM ingest_log",
+    "SELECT * FROM product_scores",
+    "SELECT * FROM daily_metrics",
+    "SELECT * FROM total_sales t, query_history h",
+    "SELECT * FROM (SELECT item_id FROM total_sales) t, product_scores p",
+    "SELECT * FROM total_sales WHERE item_id IN (SELECT item_id FROM chart_payloads)",
+    "SELECT (SELECT MAX(version) FROM data_version) AS version, SUM(total_sales) FROM total_sales",
+]
+
+@pytest.mark.parametrize('sql', CACHED)
+def test_fact_and_rollup_queries_are_cached(sql):
+    assert QueryCache(1024).key('db', sql, None, 1) is not None
+
+@pytest.mark.parametrize('sql', NOT_CACHED)
+def test_queries_on_other_tables_are_not_cached(sql):
+    assert QueryCache(1024).key('db', sql, None, 1) is None
+
+def test_string_literals_are_not_tables():
+    assert referenced_tables("SELECT * FROM total_sales WHERE message = 'from query_history'") == {'total_sales'}
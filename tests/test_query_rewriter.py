@@ -0,0 +1,82 @@
+import pandas as pd
+import pytest
+from sqlalchemy import text
+
+from query_rewriter import QueryRewriter, _rewrite_aggregate, results_match
+
+# Several rows per item and day, so anything that sees individual rows differs on a rollup
+TOTAL_SALES = pd.DataFrame({
+    'date': ['2025-06-01', '2025-06-01', '2025-06-01', '2025-06-02', '2025-06-02', '2025-06-03'],
+    'item_id': [1, 1, 2, 1, 2, 2],
+    'total_sales': [10.0, 5.5, 20.0, 7.25, 3.0, 12.0],
+    'total_units_ordered': [1, 1, 2, 1, 1, 3],
+})
+AD_SALES = pd.DataFrame({
+    'date': ['2025-06-01', '2025-06-01', '2025-06-02', '2025-06-02'],
+    'item_id': [1, 1, 2, 2],
+    'ad_sales': [4.0, 6.0, 0.0, 9.0],
+    'impressions': [100, 50, 30, 70],
+    'ad_spend': [2.0, 1.0, 0.5, 3.0],
+    'clicks': [5, 2, 1, 4],
+    'units_sold': [1, 1, 0, 2],
+})
+ELIGIBILITY = pd.DataFrame({
+    'eligibility_datetime_utc': ['2025-06-01 00:00:00', '2025-06-02 00:00:00', '2025-06-01 00:00:00'],
+    'item_id': [1, 1, 2],
+    'eligibility': ['TRUE', 'FALSE', 'TRUE'],
+    'message': ['', '', ''],
+})
+
+# Rewritten onto a rollup, with the same results as the original
+EQUIVALENT = [
+    "SELECT SUM(total_sales) FROM total_sales",
+    "SELECT item_id, SUM(total_sales) AS s, COUNT(*) AS n FROM total_sales GROUP BY item_id ORDER BY item_id",
+    "SELECT date, AVG(total_sales) AS a, MIN(total_sales), MAX(total_sales) FROM total_sales GROUP BY date ORDER BY date",
+    "SELECT item_id, ROUND(SUM(total_sales), 2) AS s FROM total_sales GROUP BY item_id ORDER BY item_id",
+    "SELECT COALESCE(SUM(ad_sales), 0) / NULLIF(SUM(ad_spend), 0) AS roas FROM ad_sales WHERE date >= '2025-06-02'",
+    "SELECT strftime('%m', date) AS m, SUM(total_sales) AS s FROM total_sales GROUP BY strftime('%m', date)",
+    "SELECT COUNT(DISTINCT item_id) FROM total_sales",
+]
+
+# Left alone: the rollup no longer has the rows these look at
+NOT_REWRITTEN = [
+    "SELECT item_id, GROUP_CONCAT(item_id) AS g, SUM(total_sales) AS s FROM total_sales GROUP BY item_id ORDER BY item_id",
+    "SELECT date, GROUP_CONCAT(total_sales) AS g FROM total_sales GROUP BY date",
+    "SELECT item_id, json_group_array(date) AS days, SUM(total_sales) FROM total_sales GROUP BY item_id",
+    "SELECT item_id, string_agg(date, ',') AS days, SUM(total_sales) FROM total_sales GROUP BY item_id",
+    "SELECT item_id, array_agg(date) AS days FROM total_sales GROUP BY item_id",
+    "SELECT SUM(total_sales) FROM total_sales WHERE random() > 0",
+    "SELECT total_sales FROM total_sales",
+    "SELECT item_id, total_sales FROM total_sales GROUP BY item_id",
+]
+
+@pytest.fixture
+def engine(tmp_path, monkeypatch):
+    monkeypatch.setenv('DATABASE_URL', f"sqlite:///{tmp_path / 'rewrite.db'}")
+    rewriter = QueryRewriter()
+    for table, df in (('total_sales', TOTAL_SALES), ('ad_sales', AD_SALES), ('eligibility', ELIGIBILITY)):
+        df.to_sql(table, rewriter.db_manager.engine, index=False)
+    rewriter.materialize_rollups(1)
+    return rewriter.db_manager.engine
+
+def run(engine, sql):
+    with engine.connect() as conn:
+        return [dict(row._mapping) for row in conn.execute(text(sql))]
+
+@pytest.mark.parametrize('sql', EQUIVALENT)
+def test_rewrite_gives_same_results(engine, sql):
+    rewritten = _rewrite_aggregate(sql)
+    assert rewritten is not None, sql
+    rewritten_sql, table = rewritten
+    assert table in rewritten_sql
+    assert results_match(run(engine, sql), run(engine, rewritten_sql), ordered='ORDER BY' in sql)
+
+@pytest.mark.parametrize('sql', NOT_REWRITTEN)
+def test_unsafe_queries_are_not_rewritten(sql):
+    assert _rewrite_aggregate(sql) is None
+
+def test_group_concat_over_grain_would_change_results(engine):
+    # Why GROUP_CONCAT is refused: the per-item rollup has one row where the table has several
+    original = run(engine, "SELECT item_id, GROUP_CONCAT(item_id) AS g FROM total_sales GROUP BY item_id ORDER BY item_id")
+    on_rollup = run(engine, "SELECT item_id, GROUP_CONCAT(item_id) AS g FROM total_sales_by_item GROUP BY item_id ORDER BY item_id")
+    assert original != on_rollup
@@ -0,0 +1,94 @@
+import math
+
+import pandas as pd
+import pytest
+
+import database
+import tenants
+from database import DatabaseManager
+from tenants import ShardedAnalytics, list_tenants
+
+TENANTS = 3
+
+# Tenants get very different ad efficiency, so a mean of per-tenant ratios is far from the true one
+TOTAL_SALES = pd.DataFrame({
+    'date': ['2025-06-01', '2025-06-01', '2025-06-02', '2025-06-02', '2025-06-03', '2025-06-03', '2025-06-01'],
+    'item_id': [0, 1, 2, 3, 4, 5, 6],
+    'total_sales': [10.0, 20.5, 7.25, 0.0, 30.0, 12.0, 4.0],
+    'total_units_ordered': [1, 2, 1, 0, 3, 1, 1],
+})
+AD_SALES = pd.DataFrame({
+    'date': ['2025-06-01', '2025-06-01', '2025-06-02', '2025-06-02', '2025-06-03', '2025-06-03'],
+    'item_id': [0, 1, 2, 3, 4, 5],
+    'ad_sales': [100.0, 2.0, 9.0, 0.0, 40.0, 1.0],
+    'impressions': [1000, 50, 300, 10, 700, 20],
+    'ad_spend': [5.0, 4.0, 3.0, 0.0, 8.0, 6.0],
+    'clicks': [50, 2, 10, 0, 30, 1],
+    'units_sold': [5, 0, 1, 0, 3, 0],
+})
+ELIGIBILITY = pd.DataFrame({
+    'eligibility_datetime_utc': ['2025-06-01 00:00:00'] * 7,
+    'item_id': [0, 1, 2, 3, 4, 5, 6],
+    'eligibility': ['TRUE', 'FALSE', 'TRUE', 'TRUE', 'FALSE', 'TRUE', 'TRUE'],
+    'message': [''] * 7,
+})
+FRAMES = {'total_sales': TOTAL_SALES, 'ad_sales': AD_SALES, 'eligibility': ELIGIBILITY}
+
+@pytest.fixture
+def shards(tmp_path, monkeypatch):
+    url = f"sqlite:///{tmp_path}/{{tenant}}.db"
+    monkeypatch.setenv('TENANT_DATABASE_URL', url)
+    monkeypatch.setattr(database, 'TENANT_DATABASE_URL', url)
+    monkeypatch.setattr(tenants, 'TENANT_DATABASE_URL', url)
+    monkeypatch.setattr(tenants, 'TENANTS', None)
+    monkeypatch.setattr(tenants, '_managers', {})
+    for index in range(TENANTS):
+        shard = DatabaseManager(f"seller_{index}")
+        for table, df in FRAMES.items():
+            df[df['item_id'] % TENANTS == index].to_sql(table, shard.engine, index=False)
+        shard.engine.dispose()
+    return tmp_path
+
+def test_totals_equal_the_unsplit_sums(shards):
+    summary = ShardedAnalytics().summary()
+    sales = TOTAL_SALES[TOTAL_SALES['total_sales'] > 0]
+    ads = AD_SALES[AD_SALES['ad_spend'] > 0]
+    assert summary['shards'] == TENANTS and not summary['failed']
+    totals = summary['totals']
+    assert math.isclose(totals['total_sales'], sales['total_sales'].sum())
+    assert math.isclose(totals['active_products'], sales['item_id'].nunique())
+    assert math.isclose(totals['avg_sales_per_transaction'], sales['total_sales'].mean())
+    assert math.isclose(totals['ad_spend'], ads['ad_spend'].sum())
+
+def test_ratios_come_from_summed_parts(shards):
+    summary = ShardedAnalytics().summary()
+    ads = AD_SALES[AD_SALES['ad_spend'] > 0]
+    totals = summary['totals']
+    assert math.isclose(totals['roas'], ads['ad_sales'].sum() / ads['ad_spend'].sum())
+    assert math.isclose(totals['cpc'], ads['ad_spend'].sum() / ads['clicks'].sum())
+    assert math.isclose(totals['ctr'], ads['clicks'].sum() * 100.0 / ads['impressions'].sum())
+    mean_roas = sum(tenant['roas'] for tenant in summary['tenants'].values()) / TENANTS
+    assert not math.isclose(totals['roas'], mean_roas)
+
+def test_daily_matches_a_per_day_groupby(shards):
+    series = ShardedAnalytics().daily()['series']
+    sales = TOTAL_SALES.groupby('date')['total_sales'].sum()
+    spend = AD_SALES.groupby('date')['ad_spend'].sum()
+    assert [row['date'] for row in series] == list(sales.index)
+    for row in series:
+        assert math.isclose(row['total_sales'], sales[row['date']])
+        assert math.isclose(row['ad_spend'], spend[row['date']])
+
+def test_broken_shard_is_isolated(shards):
+    healthy = [f"seller_{index}" for index in range(TENANTS)]
+    expected = ShardedAnalytics(healthy).summary()['totals']
+    (shards / 'seller_broken.db').write_bytes(b'not a database')
+    degraded = ShardedAnalytics(healthy + ['seller_broken']).summary()
+    assert set(degraded['failed']) == {'seller_broken'}
+    assert degraded['totals'] == expected
+
+def test_fanout_does_not_create_missing_shards(shards):
+    summary = ShardedAnalytics(['seller_0', 'seller_missing']).summary()
+    assert set(summary['failed']) == {'seller_missing'}
+    assert not (shards / 'seller_missing.db').exists()
+    assert list_tenants() == [f"seller_{index}" for index in range(TENANTS)]
@@ -0,0 +1,92 @@
+import time
+
+import pytest
+from sqlalchemy import text
+from sqlalchemy.exc import OperationalError
+
+import watcher
+from delta_ingest import DeltaValidationError
+from watcher import DirectoryWatcher
+
+SUMMARY = {'rows': 1, 'rows_per_sec': 100.0, 'elapsed_ms': 10, 'data_version': 2}
+
+@pytest.fixture
+def drop(tmp_path, monkeypatch):
+    monkeypatch.setenv('DATABASE_URL', f"sqlite:///{tmp_path / 'watch.db'}")
+    directory = tmp_path / 'drop'
+    directory.mkdir()
+    path = directory / 'delta.csv'
+    path.write_text("date,item_id,total_sales,total_units_ordered\n2025-06-01,1,10.0,1\n")
+    return DirectoryWatcher(str(directory), interval=0.01, debounce=0), str(path)
+
+def status(dir_watcher):
+    with dir_watcher.db_manager.engine.connect() as conn:
+        return conn.execute(text("SELECT status FROM ingest_log")).scalar()
+
+def fail_once(error):
+    calls = []
+    def ingest(table, f):
+        calls.append(table)
+        if len(calls) == 1:
+            raise error
+        return SUMMARY
+    return ingest, calls
+
+def test_transient_failure_is_retried(drop, monkeypatch):
+    dir_watcher, path = drop
+    ingest, calls = fail_once(OperationalError("INSERT", {}, Exception("database is locked")))
+    monkeypatch.setattr(dir_watcher.ingestor, 'ingest', ingest)
+    assert dir_watcher.ingest_file(path, time.time()) is None
+    assert status(dir_watcher) == 'failed'
+    assert path not in dir_watcher._handled and path in dir_watcher._retries
+
+    assert dir_watcher.ingest_file(path, time.time()) == SUMMARY
+    assert status(dir_watcher) == 'ok' and len(calls) == 2
+    assert path not in dir_watcher._retries
+    # Ingested contents are never claimed again
+    assert dir_watcher.ingest_file(path, time.time()) is None and len(calls) == 2
+
+def test_invalid_file_is_rejected_for_good(drop, monkeypatch):
+    dir_watcher, path = drop
+    ingest, calls = fail_once(DeltaValidationError(["row 2: bad date"]))
+    monkeypatch.setattr(dir_watcher.ingestor, 'ingest', ingest)
+    assert dir_watcher.ingest_file(path, time.time()) is None
+    assert status(dir_watcher) == 'rejected'
+    assert dir_watcher.ingest_file(path, time.time()) is None and len(calls) == 1
+
+def test_stale_running_claim_is_taken_over(drop, monkeypatch):
+    dir_watcher, path = drop
+    monkeypatch.setattr(dir_watcher.ingestor, 'ingest', lambda table, f: SUMMARY)
+    fingerprint = watcher.file_fingerprint(path)
+    with dir_watcher.db_manager.engine.connect() as conn:
+        conn.execute(text("INSERT INTO ingest_log (fingerprint, path, status, ingested_at) VALUES (:f, :p, 'running', :t)"),
+                     {'f': fingerprint, 'p': path, 't': time.time()})
+        conn.commit()
+    # Another worker is still within its claim: leave it, but look again later
+    assert dir_watcher.ingest_file(path, time.time()) is None
+    assert path in dir_watcher._retries
+
+    monkeypatch.setattr(watcher, 'WATCH_CLAIM_TIMEOUT', 0)
+    assert dir_watcher.ingest_file(path, time.time()) == SUMMARY
+    assert status(dir_watcher) == 'ok'
+
+def test_unknown_header_is_rejected(drop):
+    dir_watcher, path = drop
+    with open(path, 'w') as f:
+        f.write("foo,bar\n1,2\n")
+    assert dir_watcher.ingest_file(path, time.time()) is None
+    assert status(dir_watcher) == 'rejected'
+
+def test_retry_waits_for_the_backoff(drop, monkeypatch):
+    dir_watcher, path = drop
+    dir_watcher.scan()
+    dir_watcher.scan()
+    assert dir_watcher._pending.qsize() == 1
+    dir_watcher._pending.get_nowait()
+    dir_watcher._retries[path] = (3, time.time() + 60)
+    dir_watcher._handled.pop(path)
+    dir_watcher.scan()
+    assert dir_watcher._pending.qsize() == 0
+    dir_watcher._retries[path] = (3, time.time() - 1)
+    dir_watcher.scan()
+    assert dir_watcher._pending.qsize() == 1
@@ -0,0 +1,229 @@
+import logging
+import os
+import threading
+import numpy as np
+import pandas as pd
+from datetime import date, timedelta
+from typing import List, Dict, Any, Optional
+from sqlalchemy import bindparam, text
+from database import DatabaseManager
+
+logger = logging.getLogger(__name__)
+
+# Additive daily metrics kept in the daily_metrics rollup
+DAILY_METRICS = ['total_sales', 'total_units', 'ad_sales', 'ad_spend', 'impressions', 'clicks', 'ad_units']
+
+# One row per day across both fact tables; the filters narrow it to changed days
+DAILY_METRICS_QUERY = """
+    SELECT
+        date,
+        SUM(total_sales) as total_sales,
+        SUM(total_units) as total_units,
+        SUM(ad_sales) as ad_sales,
+        SUM(ad_spend) as ad_spend,
+        SUM(impressions) as impressions,
+        SUM(clicks) as clicks,
+        SUM(ad_units) as ad_units
+    FROM (
+        SELECT date, total_sales, total_units_ordered as total_units,
+               0 as ad_sales, 0 as ad_spend, 0 as impressions, 0 as clicks, 0 as ad_units
+        FROM total_sales {total_sales_filter}
+        UNION ALL
+        SELECT date, 0, 0, ad_sales, ad_spend, impressions, clicks, units_sold
+        FROM ad_sales {ad_sales_filter}
+    ) daily
+    GROUP BY date
+    ORDER BY date
+"""
+
+GRAINS = ('day', 'week', 'month')
+COMPARISONS = ('previous_period', 'previous_year')
+ROLLING_WINDOWS = (7, 28)
+# Longest date range one request may cover; bounds the series built per day or period
+TIMESERIES_MAX_DAYS = int(os.environ.get("TIMESERIES_MAX_DAYS", 3660))
+
+def with_ratios(sums: Dict[str, float]) -> Dict[str, float]:
+    """Add RoAS, CPC, CTR and conversion rate computed from summed numerators and denominators"""
+    metrics = dict(sums)
+    metrics['roas'] = sums['ad_sales'] / sums['ad_spend'] if sums['ad_spend'] > 0 else 0
+    metrics['cpc'] = sums['ad_spend'] / sums['clicks'] if sums['clicks'] > 0 else 0
+    metrics['ctr'] = sums['clicks'] * 100.0 / sums['impressions'] if sums['impressions'] > 0 else 0
+    metrics['conversion_rate'] = sums['ad_units'] * 100.0 / sums['clicks'] if sums['clicks'] > 0 else 0
+    return metrics
+
+class PrefixSumIndex:
+    """Cumulative sums over a dense day axis: any date range sums in O(1).
+
+    cumulative[m][i] holds the total of metric m over the first i days, so the
+    sum over days [i, j) is cumulative[m][j] - cumulative[m][i].
+    """
+
+    def __init__(self, first_day: date, daily: Dict[str, np.ndarray]):
+        self.first_day = first_day
+        self.days = len(next(iter(daily.values()))) if daily else 0
+        self.cumulative = {
+            metric: np.concatenate([[0.0], np.cumsum(values, dtype=float)])
+            for metric, values in daily.items()
+        }
+
+    @classmethod
+    def from_frame(cls, df: pd.DataFrame) -> 'PrefixSumIndex':
+        """Build from daily rows, filling days without data with zeros"""
+        if df.empty:
+            return cls(date.today(), {metric: np.zeros(0) for metric in DAILY_METRICS})
+
+        day_numbers = pd.to_datetime(df['date']).dt.date
+        first_day = min(day_numbers)
+        offsets = np.array([(day - first_day).days for day in day_numbers])
+        days = offsets.max() + 1
+
+        daily = {}
+        for metric in DAILY_METRICS:
+            values = np.zeros(days)
+            np.add.at(values, offsets, df[metric].fillna(0).to_numpy(dtype=float))
+            daily[metric] = values
+        return cls(first_day, daily)
+
+    @property
+    def last_day(self) -> date:
+        return self.first_day + timedelta(days=max(self.days - 1, 0))
+
+    def _offset(self, day: date) -> int:
+        return int(np.clip((day - self.first_day).days, 0, self.days))
+
+    def window(self, start: date, end: date) -> Dict[str, float]:
+        """Metric totals for the inclusive date range [start, end]"""
+        i, j = self._offset(start), self._offset(end + timedelta(days=1))
+        if j <= i:
+            return {metric: 0.0 for metric in self.cumulative}
+        return {metric: float(cumulative[j] - cumulative[i]) for metric, cumulative in self.cumulative.items()}
+
+    def rolling(self, start: date, end: date, window_days: int) -> Dict[str, np.ndarray]:
+        """Trailing window_days totals ending on each day of [start, end]"""
+        # Window bounds are computed before clipping, so windows reaching past
+        # either end of the data cover only the days they overlap
+        raw_ends = (start - self.first_day).days + 1 + np.arange((end - start).days + 1)
+        ends = np.clip(raw_ends, 0, self.days)
+        starts = np.clip(raw_ends - window_days, 0, self.days)
+        return {metric: cumulative[ends] - cumulative[starts] for metric, cumulative in self.cumulative.items()}
+
+def period_bounds(start: date, end: date, grain: str) -> List[tuple]:
+    """Split [start, end] into day, ISO week (Monday start) or calendar month periods"""
+    periods = []
+    period_start = start
+    while period_start <= end:
+        if grain == 'day':
+            period_end = period_start
+        elif grain == 'week':
+            period_end = period_start + timedelta(days=6 - period_start.weekday())
+        else:
+            next_month = (period_start.replace(day=1) + timedelta(days=32)).replace(day=1)
+            period_end = next_month - timedelta(days=1)
+        period_end = min(period_end, end)
+        periods.append((period_start, period_end))
+        period_start = period_end + timedelta(days=1)
+    return periods
+
+def _percent_change(current: float, previous: float) -> Optional[float]:
+    return (current - previous) / previous * 100 if previous else None
+
+class TimeSeriesAnalytics:
+    def __init__(self):
+        self.db_manager = DatabaseManager()
+        self._index = None
+        self._index_version = None
+        self._index_lock = threading.Lock()
+
+    def materialize_daily_metrics(self, version: int):
+        """Roll the fact tables up to one row per day for this data version"""
+        query = DAILY_METRICS_QUERY.format(total_sales_filter='', ad_sales_filter='')
+        with self.db_manager.engine.connect() as conn:
+            df = pd.read_sql(text(query), conn)
+        df['data_version'] = version
+        df.to_sql('daily_metrics', self.db_manager.engine, index=False, if_exists='replace')
+        logger.info(f"Materialized {len(df)} days of daily metrics (data version {version})")
+
+    def refresh_daily_metrics(self, conn, version: int, changes: Dict[str, Dict[str, set]]):
+        """Recompute only the changed days, inside an incremental ingest"""
+        days = set(changes.get('total_sales', {}).get('date', ())) | set(changes.get('ad_sales', {}).get('date', ()))
+        if days:
+            keys = bindparam('days', expanding=True)
+            query = DAILY_METRICS_QUERY.format(total_sales_filter='WHERE date IN :days', ad_sales_filter='WHERE date IN :days')
+            conn.execute(text("DELETE FROM daily_metrics WHERE date IN :days").bindparams(keys), {'days': sorted(days)})
+            conn.execute(text(f"""
+                INSERT INTO daily_metrics (date, {', '.join(DAILY_METRICS)}, data_version)
+                SELECT *, {int(version)} FROM ({query}) changed
+            """).bindparams(keys), {'days': sorted(days)})
+        conn.execute(text("UPDATE daily_metrics SET data_version = :version"), {'version': version})
+        logger.info(f"Refreshed {len(days)} days of daily metrics (data version {version})")
+
+    def get_index(self) -> PrefixSumIndex:
+        """Get the prefix-sum index for the current data version, rebuilding it when data changes"""
+        version = self.db_manager.get_data_version()
+        with self._index_lock:
+            if self._index is None or self._index_version != version:
+                with self.db_manager.engine.connect() as conn:
+                    df = pd.read_sql(text(f"SELECT date, {', '.join(DAILY_METRICS)} FROM daily_metrics"), conn)
+                self._index = PrefixSumIndex.from_frame(df)
+                self._index_version = version
+            return self._index
+
+    def analyze(self, start: date = None, end: date = None, grain: str = 'day',
+                compare_to: str = None, rolling: int = None) -> Dict[str, Any]:
+        """Per-period metrics over [start, end], optionally compared with an earlier window"""
+        if grain not in GRAINS:
+            raise ValueError(f"grain must be one of {', '.join(GRAINS)}")
+        if compare_to is not None and compare_to not in COMPARISONS:
+            raise ValueError(f"compare_to must be one of {', '.join(COMPARISONS)}")
+        if rolling is not None and rolling not in ROLLING_WINDOWS:
+            raise ValueError(f"rolling must be one of {', '.join(map(str, ROLLING_WINDOWS))}")
+
+        index = self.get_index()
+        start = start or index.first_day
+        end = end or index.last_day
+        if end < start:
+            raise ValueError("end must not be before start")
+        if (end - start).days + 1 > TIMESERIES_MAX_DAYS:
+            raise ValueError(f"The date range may span at most {TIMESERIES_MAX_DAYS} days")
+
+        totals = with_ratios(index.window(start, end))
+        analysis = {
+            'start': start.isoformat(),
+            'end': end.isoformat(),
+            'grain': grain,
+            'series': [
+                {'period_start': period_start.isoformat(), 'period_end': period_end.isoformat(),
+                 **with_ratios(index.window(period_start, period_end))}
+                for period_start, period_end in period_bounds(start, end, grain)
+            ],
+            'totals': totals,
+        }
+
+        if compare_to:
+            if compare_to == 'previous_period':
+                length = end - start + timedelta(days=1)
+                compare_start, compare_end = start - length, start - timedelta(days=1)
+            else:
+                # 52 weeks back keeps weekdays aligned
+                compare_start, compare_end = start - timedelta(days=364), end - timedelta(days=364)
+            previous = with_ratios(index.window(compare_start, compare_end))
+            analysis['comparison'] = {
+                'compare_to': compare_to,
+                'start': compare_start.isoformat(),
+                'end': compare_end.isoformat(),
+                'totals': previous,
+                'change_pct': {metric: _percent_change(totals[metric], previous[metric]) for metric in totals},
+            }
+
+        if rolling:
+            windows = index.rolling(start, end, rolling)
+            days = [(start + timedelta(days=k)).isoformat() for k in range((end - start).days + 1)]
+            analysis['rolling'] = {
+                'window_days': rolling,
+                'series': [
+                    {'date': day, **with_ratios({metric: float(values[k]) for metric, values in windows.items()})}
+                    for k, day in enumerate(days)
+                ],
+            }
+
+        return analysis
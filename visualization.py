@@ -1,55 +1,397 @@
 import plotly.graph_objects as go
 import plotly.express as px
+import plotly.utils
 import pandas as pd
+import numpy as np
+import time
+import base64
 import json
 import logging
+import os
+import threading
+from collections import OrderedDict
 from typing import List, Dict, Any, Optional
+from sqlalchemy import text
 from database import DatabaseManager
+from chart_pool import get_render_pool
+from queries import run_fixed_query
+from downsampling import lttb, bin_scatter
 
 logger = logging.getLogger(__name__)
 
+# Series longer than this are downsampled before plotting
+CHART_POINT_BUDGET = int(os.environ.get("CHART_POINT_BUDGET", 2000))
+# Traces with more points than this are drawn with WebGL (Scattergl)
+SCATTERGL_THRESHOLD = int(os.environ.get("SCATTERGL_THRESHOLD", 1000))
+
+# Chart types served by /visualizations/<chart_type>: builder method and default limit
+CHART_TYPES = {
+    'sales-trend': ('create_sales_trend_chart', None),
+    'top-products': ('create_top_products_chart', 10),
+    'roas': ('create_roas_by_product_chart', 15),
+    'eligibility': ('create_eligibility_pie_chart', None),
+    'ad-performance': ('create_ad_performance_scatter', None),
+}
+
+# The fixed query behind each chart, whose parameters the chart's limit binds to
+CHART_QUERIES = {
+    'sales-trend': 'sales_trend',
+    'top-products': 'top_products',
+    'roas': 'roas_by_product',
+    'eligibility': 'eligibility_distribution',
+    'ad-performance': 'ad_performance',
+}
+
+# Payloads rendered at ingest time: every default, plus the dashboard's RoAS top 10
+PRECOMPUTED_CHARTS = [(chart_type, limit) for chart_type, (_, limit) in CHART_TYPES.items()] + [('roas', 10)]
+
+# NumPy dtype -> Plotly.js typed-array dtype (Plotly.js has no 64-bit integers)
+TYPED_ARRAY_DTYPES = {
+    'int8': 'i1', 'uint8': 'u1', 'int16': 'i2', 'uint16': 'u2',
+    'int32': 'i4', 'uint32': 'u4', 'float32': 'f4', 'float64': 'f8',
+}
+
+def encode_typed_arrays(obj: Any) -> Any:
+    """Replace numeric NumPy arrays with Plotly's base64 typed-array spec"""
+    if isinstance(obj, dict):
+        return {key: encode_typed_arrays(value) for key, value in obj.items()}
+    if isinstance(obj, (list, tuple)):
+        return [encode_typed_arrays(value) for value in obj]
+    if isinstance(obj, np.ndarray) and obj.dtype.kind in 'iuf' and obj.size:
+        array = obj
+        if array.dtype.name not in TYPED_ARRAY_DTYPES:
+            fits_int32 = array.dtype.kind in 'iu' and array.min() >= -2**31 and array.max() < 2**31
+            array = array.astype(np.int32 if fits_int32 else np.float64)
+        spec = {
+            'dtype': TYPED_ARRAY_DTYPES[array.dtype.name],
+            'bdata': base64.b64encode(np.ascontiguousarray(array, dtype=array.dtype.newbyteorder('<')).tobytes()).decode('ascii'),
+        }
+        if array.ndim > 1:
+            spec['shape'] = ','.join(str(dim) for dim in array.shape)
+        return spec
+    return obj
+
+def figure_to_payload(fig: go.Figure) -> str:
+    """Serialize a figure with numeric arrays as base64 typed arrays instead of decimal text"""
+    return json.dumps(encode_typed_arrays(fig.to_plotly_json()), cls=plotly.utils.PlotlyJSONEncoder, separators=(',', ':'))
+
+def rows_to_columns(results: List[Dict[str, Any]]) -> Dict[str, list]:
+    """Convert query rows to plain column lists that are cheap to pickle"""
+    return {col: [row[col] for row in results] for col in results[0].keys()}
+
+# Renderers are module-level so they can run in the chart render process pool.
+# They take plain column data and return the serialized figure JSON.
+
+def render_sales_trend_chart(columns: Dict[str, list]) -> str:
+    """Render the daily sales trend line chart"""
+    df = pd.DataFrame(columns)
+    df['date'] = pd.to_datetime(df['date'])
+    total_points = len(df)
+
+    # Long histories are reduced with LTTB so the line keeps its shape
+    if total_points > CHART_POINT_BUDGET:
+        keep = lttb(df['date'].to_numpy(dtype='int64'), df['daily_sales'].to_numpy(dtype=float), CHART_POINT_BUDGET)
+        df = df.iloc[keep]
+
+    trace_type = go.Scattergl if len(df) > SCATTERGL_THRESHOLD else go.Scatter
+    fig = go.Figure()
+    fig.add_trace(trace_type(
+        x=df['date'],
+        y=df['daily_sales'],
+        mode='lines+markers',
+        name='Daily Sales ($)',
+        line=dict(color='#28a745', width=3),
+        marker=dict(size=8)
+    ))
+
+    fig.update_layout(
+        title='Daily Sales Trend',
+        xaxis_title='Date',
+        yaxis_title='Sales ($)',
+        template='plotly_dark',
+        height=400,
+        showlegend=True,
+        meta={'points': total_points, 'rendered_points': len(df)}
+    )
+
+    return figure_to_payload(fig)
+
+def render_top_products_chart(columns: Dict[str, list], limit: int) -> str:
+    """Render the top products bar chart"""
+    df = pd.DataFrame(columns)
+    df['item_id'] = df['item_id'].astype(str)
+
+    fig = go.Figure(data=[
+        go.Bar(
+            x=df['item_id'],
+            y=df['total_product_sales'],
+            marker_color='#007bff',
+            text=df['total_product_sales'].round(2),
+            textposition='auto',
+        )
+    ])
+
+    fig.update_layout(
+        title=f'Top {limit} Products by Sales',
+        xaxis_title='Product ID',
+        yaxis_title='Total Sales ($)',
+        template='plotly_dark',
+        height=400
+    )
+
+    return figure_to_payload(fig)
+
+def render_roas_by_product_chart(columns: Dict[str, list], limit: int) -> str:
+    """Render the RoAS by product bar chart"""
+    df = pd.DataFrame(columns)
+    df['item_id'] = df['item_id'].astype(str)
+
+    # Color code based on RoAS performance
+    colors = ['#28a745' if x >= 5 else '#ffc107' if x >= 2 else '#dc3545' for x in df['roas']]
+
+    fig = go.Figure(data=[
+        go.Bar(
+            x=df['item_id'],
+            y=df['roas'],
+            marker_color=colors,
+            text=df['roas'].round(2),
+            textposition='auto',
+        )
+    ])
+
+    fig.update_layout(
+        title=f'Return on Ad Spend (RoAS) by Product - Top {limit}',
+        xaxis_title='Product ID',
+        yaxis_title='RoAS (Revenue/Ad Spend)',
+        template='plotly_dark',
+        height=400,
+        annotations=[
+            dict(
+                text="Green: Excellent (≥5x) | Yellow: Good (≥2x) | Red: Poor (<2x)",
+                xref="paper", yref="paper",
+                x=0.5, y=1.1, xanchor='center', yanchor='bottom',
+                showarrow=False,
+                font=dict(size=12)
+            )
+        ]
+    )
+
+    return figure_to_payload(fig)
+
+def render_eligibility_pie_chart(columns: Dict[str, list]) -> str:
+    """Render the eligibility distribution pie chart"""
+    df = pd.DataFrame(columns)
+
+    colors = ['#28a745' if status == 'TRUE' else '#dc3545' for status in df['eligibility']]
+
+    fig = go.Figure(data=[
+        go.Pie(
+            labels=[f"{'Eligible' if x == 'TRUE' else 'Not Eligible'}" for x in df['eligibility']],
+            values=df['count'],
+            marker_colors=colors,
+            textinfo='label+percent+value',
+            textposition='auto'
+        )
+    ])
+
+    fig.update_layout(
+        title='Product Eligibility Distribution',
+        template='plotly_dark',
+        height=400
+    )
+
+    return figure_to_payload(fig)
+
+def render_ad_performance_scatter(columns: Dict[str, list]) -> str:
+    """Render the CPC vs conversion rate scatter plot"""
+    df = pd.DataFrame(columns)
+    total_points = len(df)
+    cpc = df['cpc'].to_numpy(dtype=float)
+    conversion_rate = df['conversion_rate'].to_numpy(dtype=float)
+    spend = df['total_spend'].to_numpy(dtype=float)
+
+    if total_points > CHART_POINT_BUDGET:
+        # Too many products to plot one marker each: show a density view with
+        # one bubble per grid cell, sized by the number of products in it
+        cells = bin_scatter(cpc, conversion_rate, CHART_POINT_BUDGET, weights=spend)
+        x, y = cells['x'], cells['y']
+        sizes = np.clip(np.sqrt(cells['count']) * 5, 5, 30)
+        customdata = np.column_stack([cells['count'], cells['weight']])
+        hovertemplate = ('<b>%{customdata[0]} products</b><br>' +
+                         'Avg CPC: $%{x:.2f}<br>' +
+                         'Avg Conversion Rate: %{y:.1f}%<br>' +
+                         'Total Spend: $%{customdata[1]:,.0f}<br>' +
+                         '<extra></extra>')
+        text = None
+        legend_text = "Bubble size = Products per cell | Color = Conversion Rate"
+    else:
+        x, y = cpc, conversion_rate
+        sizes = np.clip(spend / 10, 5, 30)
+        customdata = spend
+        hovertemplate = ('<b>Product %{text}</b><br>' +
+                         'CPC: $%{x:.2f}<br>' +
+                         'Conversion Rate: %{y:.1f}%<br>' +
+                         'Total Spend: $%{customdata:.0f}<br>' +
+                         '<extra></extra>')
+        text = df['item_id'].astype(str)
+        legend_text = "Bubble size = Ad Spend | Color = Conversion Rate"
+
+    trace_type = go.Scattergl if len(x) > SCATTERGL_THRESHOLD else go.Scatter
+    fig = go.Figure(data=trace_type(
+        x=x,
+        y=y,
+        mode='markers',
+        marker=dict(
+            size=sizes,
+            color=y,
+            colorscale='Viridis',
+            showscale=True,
+            colorbar=dict(title="Conversion Rate %")
+        ),
+        text=text,
+        customdata=customdata,
+        hovertemplate=hovertemplate
+    ))
+
+    fig.update_layout(
+        title='Ad Performance: Cost Per Click vs Conversion Rate',
+        xaxis_title='Cost Per Click ($)',
+        yaxis_title='Conversion Rate (%)',
+        template='plotly_dark',
+        height=500,
+        meta={'points': total_points, 'rendered_points': len(x)},
+        annotations=[
+            dict(
+                text=legend_text,
+                xref="paper", yref="paper",
+                x=0.5, y=1.1, xanchor='center', yanchor='bottom',
+                showarrow=False,
+                font=dict(size=12)
+            )
+        ]
+    )
+
+    return figure_to_payload(fig)
+
 class VisualizationEngine:
     def __init__(self):
         self.db_manager = DatabaseManager()
+        self.render_pool = get_render_pool()
+        self.cache_size = int(os.environ.get("CHART_CACHE_SIZE", 64))
+        self._chart_cache = OrderedDict()
+        self._chart_cache_lock = threading.Lock()
+        # Last render time and payload size per (chart_type, limit)
+        self.chart_stats = {}
+    
+    def get_chart(self, chart_type: str, limit: int = None) -> Optional[str]:
+        """Get a chart payload for the current data version.
+
+        Default charts are served from the payloads precomputed at ingest; any
+        other limit is rendered on demand and cached until the data changes.
+        """
+        _, default_limit = CHART_TYPES[chart_type]
+        if default_limit is None or limit is None:
+            limit = default_limit
+        
+        version = self.db_manager.get_data_version()
+        payload = self._load_precomputed_chart(chart_type, limit, version)
+        if payload is not None:
+            return payload
+        
+        cache_key = (chart_type, limit, version)
+        with self._chart_cache_lock:
+            if cache_key in self._chart_cache:
+                self._chart_cache.move_to_end(cache_key)
+                return self._chart_cache[cache_key]
+        
+        payload = self._build_chart(chart_type, limit)
+        if payload is not None:
+            with self._chart_cache_lock:
+                self._chart_cache[cache_key] = payload
+                while len(self._chart_cache) > self.cache_size:
+                    self._chart_cache.popitem(last=False)
+        return payload
+    
+    def precompute_chart_payloads(self, version: int):
+        """Render the fixed charts and store them keyed by data version"""
+        with self.db_manager.engine.connect() as conn:
+            conn.execute(text("""
+                CREATE TABLE IF NOT EXISTS chart_payloads (
+                    chart_type TEXT NOT NULL,
+                    params TEXT NOT NULL,
+                    data_version INTEGER NOT NULL,
+                    payload TEXT NOT NULL,
+                    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                    PRIMARY KEY (chart_type, params, data_version)
+                )
+            """))
+            conn.commit()
+            
+            stored = 0
+            for chart_type, limit in PRECOMPUTED_CHARTS:
+                payload = self._build_chart(chart_type, limit)
+                if payload is None:
+                    continue
+                params = self._chart_params(limit)
+                conn.execute(text("""
+                    DELETE FROM chart_payloads
+                    WHERE chart_type = :chart_type AND params = :params AND data_version = :version
+                """), {'chart_type': chart_type, 'params': params, 'version': version})
+                conn.execute(text("""
+                    INSERT INTO chart_payloads (chart_type, params, data_version, payload)
+                    VALUES (:chart_type, :params, :version, :payload)
+                """), {'chart_type': chart_type, 'params': params, 'version': version, 'payload': payload})
+                stored += 1
+            
+            # Payloads for older versions can never be served again
+            conn.execute(text("DELETE FROM chart_payloads WHERE data_version < :version"), {'version': version})
+            conn.commit()
+        
+        logger.info(f"Precomputed {stored} chart payloads for data version {version}")
+    
+    def _load_precomputed_chart(self, chart_type: str, limit: Optional[int], version: int) -> Optional[str]:
+        """Look up a payload rendered at ingest time"""
+        try:
+            with self.db_manager.engine.connect() as conn:
+                return conn.execute(text("""
+                    SELECT payload FROM chart_payloads
+                    WHERE chart_type = :chart_type AND params = :params AND data_version = :version
+                """), {'chart_type': chart_type, 'params': self._chart_params(limit), 'version': version}).scalar()
+        except Exception as e:
+            # Table is missing until the first post-ingest precompute runs
+            logger.debug(f"No precomputed {chart_type} chart: {str(e)}")
+            return None
+    
+    def _build_chart(self, chart_type: str, limit: Optional[int]) -> Optional[str]:
+        """Render a chart on demand, reporting render time and payload size"""
+        method_name, default_limit = CHART_TYPES[chart_type]
+        method = getattr(self, method_name)
+        
+        start_time = time.perf_counter()
+        payload = method() if default_limit is None else method(limit=limit)
+        render_ms = (time.perf_counter() - start_time) * 1000
+        
+        if payload is not None:
+            self.chart_stats[(chart_type, limit)] = {
+                'render_ms': round(render_ms, 1),
+                'payload_bytes': len(payload),
+            }
+            logger.info(f"Rendered {chart_type} chart (limit={limit}) in {render_ms:.1f} ms, {len(payload):,} bytes")
+        return payload
+    
+    @staticmethod
+    def _chart_params(limit: Optional[int]) -> str:
+        return f"limit={limit}" if limit is not None else ""
     
     def create_sales_trend_chart(self) -> Optional[str]:
         """Create a sales trend chart over time"""
         try:
-            query = """
-            SELECT date, SUM(total_sales) as daily_sales, SUM(total_units_ordered) as daily_units
-            FROM total_sales 
-            WHERE total_sales > 0
-            GROUP BY date 
-            ORDER BY date
-            """
-            results = self.db_manager.execute_query(query)
+            results = run_fixed_query(self.db_manager, 'sales_trend')
             
             if not results:
                 return None
                 
-            df = pd.DataFrame(results)
-            df['date'] = pd.to_datetime(df['date'])
-            
-            fig = go.Figure()
-            fig.add_trace(go.Scatter(
-                x=df['date'],
-                y=df['daily_sales'],
-                mode='lines+markers',
-                name='Daily Sales ($)',
-                line=dict(color='#28a745', width=3),
-                marker=dict(size=8)
-            ))
-            
-            fig.update_layout(
-                title='Daily Sales Trend',
-                xaxis_title='Date',
-                yaxis_title='Sales ($)',
-                template='plotly_dark',
-                height=400,
-                showlegend=True
-            )
-            
-            return fig.to_json()
+            return self.render_pool.render(render_sales_trend_chart, rows_to_columns(results))
             
         except Exception as e:
             logger.error(f"Error creating sales trend chart: {str(e)}")
@@ -58,41 +400,12 @@ class VisualizationEngine:
     def create_top_products_chart(self, limit: int = 10) -> Optional[str]:
         """Create a chart showing top products by sales"""
         try:
-            query = f"""
-            SELECT item_id, SUM(total_sales) as total_product_sales, SUM(total_units_ordered) as total_units
-            FROM total_sales 
-            WHERE total_sales > 0
-            GROUP BY item_id 
-            ORDER BY total_product_sales DESC 
-            LIMIT {limit}
-            """
-            results = self.db_manager.execute_query(query)
+            results = run_fixed_query(self.db_manager, 'top_products', limit=limit)
             
             if not results:
                 return None
                 
-            df = pd.DataFrame(results)
-            df['item_id'] = df['item_id'].astype(str)
-            
-            fig = go.Figure(data=[
-                go.Bar(
-                    x=df['item_id'],
-                    y=df['total_product_sales'],
-                    marker_color='#007bff',
-                    text=df['total_product_sales'].round(2),
-                    textposition='auto',
-                )
-            ])
-            
-            fig.update_layout(
-                title=f'Top {limit} Products by Sales',
-                xaxis_title='Product ID',
-                yaxis_title='Total Sales ($)',
-                template='plotly_dark',
-                height=400
-            )
-            
-            return fig.to_json()
+            return self.render_pool.render(render_top_products_chart, rows_to_columns(results), limit=limit)
             
         except Exception as e:
             logger.error(f"Error creating top products chart: {str(e)}")
@@ -101,60 +414,12 @@ class VisualizationEngine:
     def create_roas_by_product_chart(self, limit: int = 15) -> Optional[str]:
         """Create a chart showing RoAS by product"""
         try:
-            query = f"""
-            SELECT 
-                item_id,
-                SUM(ad_sales) as total_ad_sales,
-                SUM(ad_spend) as total_ad_spend,
-                CASE 
-                    WHEN SUM(ad_spend) > 0 THEN SUM(ad_sales) / SUM(ad_spend)
-                    ELSE 0 
-                END as roas
-            FROM ad_sales 
-            WHERE ad_spend > 0 AND ad_sales > 0
-            GROUP BY item_id 
-            ORDER BY roas DESC 
-            LIMIT {limit}
-            """
-            results = self.db_manager.execute_query(query)
+            results = run_fixed_query(self.db_manager, 'roas_by_product', limit=limit)
             
             if not results:
                 return None
                 
-            df = pd.DataFrame(results)
-            df['item_id'] = df['item_id'].astype(str)
-            
-            # Color code based on RoAS performance
-            colors = ['#28a745' if x >= 5 else '#ffc107' if x >= 2 else '#dc3545' for x in df['roas']]
-            
-            fig = go.Figure(data=[
-                go.Bar(
-                    x=df['item_id'],
-                    y=df['roas'],
-                    marker_color=colors,
-                    text=df['roas'].round(2),
-                    textposition='auto',
-                )
-            ])
-            
-            fig.update_layout(
-                title=f'Return on Ad Spend (RoAS) by Product - Top {limit}',
-                xaxis_title='Product ID',
-                yaxis_title='RoAS (Revenue/Ad Spend)',
-                template='plotly_dark',
-                height=400,
-                annotations=[
-                    dict(
-                        text="Green: Excellent (≥5x) | Yellow: Good (≥2x) | Red: Poor (<2x)",
-                        xref="paper", yref="paper",
-                        x=0.5, y=1.1, xanchor='center', yanchor='bottom',
-                        showarrow=False,
-                        font=dict(size=12)
-                    )
-                ]
-            )
-            
-            return fig.to_json()
+            return self.render_pool.render(render_roas_by_product_chart, rows_to_columns(results), limit=limit)
             
         except Exception as e:
             logger.error(f"Error creating RoAS chart: {str(e)}")
@@ -163,47 +428,12 @@ class VisualizationEngine:
     def create_eligibility_pie_chart(self) -> Optional[str]:
         """Create a pie chart showing product eligibility distribution"""
         try:
-            query = """
-            SELECT 
-                eligibility,
-                COUNT(*) as count
-            FROM (
-                SELECT DISTINCT item_id, eligibility 
-                FROM eligibility 
-                WHERE eligibility_datetime_utc = (
-                    SELECT MAX(eligibility_datetime_utc) 
-                    FROM eligibility e2 
-                    WHERE e2.item_id = eligibility.item_id
-                )
-            ) latest_eligibility
-            GROUP BY eligibility
-            """
-            results = self.db_manager.execute_query(query)
+            results = run_fixed_query(self.db_manager, 'eligibility_distribution')
             
             if not results:
                 return None
                 
-            df = pd.DataFrame(results)
-            
-            colors = ['#28a745' if status == 'TRUE' else '#dc3545' for status in df['eligibility']]
-            
-            fig = go.Figure(data=[
-                go.Pie(
-                    labels=[f"{'Eligible' if x == 'TRUE' else 'Not Eligible'}" for x in df['eligibility']],
-                    values=df['count'],
-                    marker_colors=colors,
-                    textinfo='label+percent+value',
-                    textposition='auto'
-                )
-            ])
-            
-            fig.update_layout(
-                title='Product Eligibility Distribution',
-                template='plotly_dark',
-                height=400
-            )
-            
-            return fig.to_json()
+            return self.render_pool.render(render_eligibility_pie_chart, rows_to_columns(results))
             
         except Exception as e:
             logger.error(f"Error creating eligibility pie chart: {str(e)}")
@@ -212,70 +442,12 @@ class VisualizationEngine:
     def create_ad_performance_scatter(self) -> Optional[str]:
         """Create a scatter plot of ad performance (CPC vs Conversion Rate)"""
         try:
-            query = """
-            SELECT 
-                item_id,
-                SUM(ad_spend) as total_spend,
-                SUM(clicks) as total_clicks,
-                SUM(units_sold) as total_conversions,
-                CASE 
-                    WHEN SUM(clicks) > 0 THEN SUM(ad_spend) * 1.0 / SUM(clicks)
-                    ELSE 0 
-                END as cpc,
-                CASE 
-                    WHEN SUM(clicks) > 0 THEN SUM(units_sold) * 100.0 / SUM(clicks)
-                    ELSE 0 
-                END as conversion_rate
-            FROM ad_sales 
-            WHERE clicks > 0 AND ad_spend > 0
-            GROUP BY item_id
-            HAVING SUM(ad_spend) > 10
-            """
-            results = self.db_manager.execute_query(query)
+            results = run_fixed_query(self.db_manager, 'ad_performance')
             
             if not results:
                 return None
                 
-            df = pd.DataFrame(results)
-            
-            fig = go.Figure(data=go.Scatter(
-                x=df['cpc'],
-                y=df['conversion_rate'],
-                mode='markers',
-                marker=dict(
-                    size=df['total_spend'].apply(lambda x: min(max(x/10, 5), 30)),
-                    color=df['conversion_rate'],
-                    colorscale='Viridis',
-                    showscale=True,
-                    colorbar=dict(title="Conversion Rate %")
-                ),
-                text=df['item_id'].astype(str),
-                textposition="middle center",
-                hovertemplate='<b>Product %{text}</b><br>' +
-                             'CPC: $%{x:.2f}<br>' +
-                             'Conversion Rate: %{y:.1f}%<br>' +
-                             'Total Spend: $%{marker.size:.0f}<br>' +
-                             '<extra></extra>'
-            ))
-            
-            fig.update_layout(
-                title='Ad Performance: Cost Per Click vs Conversion Rate',
-                xaxis_title='Cost Per Click ($)',
-                yaxis_title='Conversion Rate (%)',
-                template='plotly_dark',
-                height=500,
-                annotations=[
-                    dict(
-                        text="Bubble size = Ad Spend | Color = Conversion Rate",
-                        xref="paper", yref="paper",
-                        x=0.5, y=1.1, xanchor='center', yanchor='bottom',
-                        showarrow=False,
-                        font=dict(size=12)
-                    )
-                ]
-            )
-            
-            return fig.to_json()
+            return self.render_pool.render(render_ad_performance_scatter, rows_to_columns(results))
             
         except Exception as e:
             logger.error(f"Error creating ad performance scatter: {str(e)}")
@@ -286,23 +458,23 @@ class VisualizationEngine:
         question_lower = question.lower()
         
         if any(keyword in question_lower for keyword in ['sales trend', 'daily sales', 'sales over time']):
-            return self.create_sales_trend_chart()
+            return self.get_chart('sales-trend')
         elif any(keyword in question_lower for keyword in ['top products', 'best selling', 'highest sales']):
-            return self.create_top_products_chart()
+            return self.get_chart('top-products')
         elif any(keyword in question_lower for keyword in ['roas', 'return on ad spend', 'ad performance']):
-            return self.create_roas_by_product_chart()
+            return self.get_chart('roas')
         elif any(keyword in question_lower for keyword in ['eligibility', 'eligible products']):
-            return self.create_eligibility_pie_chart()
+            return self.get_chart('eligibility')
         elif any(keyword in question_lower for keyword in ['cpc', 'cost per click', 'conversion']):
-            return self.create_ad_performance_scatter()
+            return self.get_chart('ad-performance')
         
         # Default visualization based on data type
         if results and len(results) > 1:
             # If multiple rows, try to create a relevant chart
             first_row = results[0]
             if 'item_id' in first_row and any('sales' in k.lower() for k in first_row.keys()):
-                return self.create_top_products_chart()
+                return self.get_chart('top-products')
             elif 'date' in first_row:
-                return self.create_sales_trend_chart()
+                return self.get_chart('sales-trend')
         
         return None
\ No newline at end of file
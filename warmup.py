@@ -0,0 +1,205 @@
+import logging
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, FIRST_COMPLETED, wait
+from typing import Callable, Dict, Any, Optional
+from sqlalchemy import text
+from sqlalchemy.exc import IntegrityError
+from database import DatabaseManager
+
+logger = logging.getLogger(__name__)
+
+WARMUP = os.environ.get("WARMUP", "true").lower() == "true"
+# Seconds a warm-up may run before the remaining payloads are left to the first requests
+WARMUP_BUDGET = float(os.environ.get("WARMUP_BUDGET", 120))
+WARMUP_CONCURRENCY = int(os.environ.get("WARMUP_CONCURRENCY", 2))
+
+class Warmup:
+    """Precompute response payloads for a data version in the background.
+
+    Payloads live in the warm_payloads table so every worker serves them, and
+    the warmup_runs row for a version doubles as a claim: only the process
+    that inserts it does the work, the others just report its progress.
+    """
+
+    def __init__(self):
+        self.db_manager = DatabaseManager()
+        self._ready = False
+
+    @property
+    def enabled(self) -> bool:
+        # Read nodes serve an immutable snapshot, which has nowhere to keep payloads
+        return WARMUP and not self.db_manager.serves_snapshot
+
+    def _ensure_tables(self):
+        if self._ready:
+            return
+        with self.db_manager.engine.connect() as conn:
+            conn.execute(text("""
+                CREATE TABLE IF NOT EXISTS warm_payloads (
+                    name TEXT NOT NULL,
+                    data_version INTEGER NOT NULL,
+                    payload TEXT NOT NULL,
+                    PRIMARY KEY (name, data_version)
+                )
+            """))
+            conn.execute(text("""
+                CREATE TABLE IF NOT EXISTS warmup_runs (
+                    data_version INTEGER PRIMARY KEY,
+                    state TEXT NOT NULL,
+                    total INTEGER NOT NULL,
+                    done INTEGER NOT NULL DEFAULT 0,
+                    failed INTEGER NOT NULL DEFAULT 0,
+                    started_at REAL NOT NULL,
+                    finished_at REAL
+                )
+            """))
+            conn.commit()
+        self._ready = True
+
+    def get(self, name: str) -> Optional[str]:
+        """The warmed payload for the current data version, if there is one"""
+        if not self.enabled:
+            return None
+        try:
+            self._ensure_tables()
+            with self.db_manager.engine.connect() as conn:
+                row = conn.execute(text("""
+                    SELECT payload FROM warm_payloads
+                    WHERE name = :name AND data_version = (SELECT MAX(version) FROM data_version)
+                """), {'name': name}).fetchone()
+            return row[0] if row else None
+        except Exception as e:
+            logger.error(f"Error reading warm payload {name}: {str(e)}")
+            return None
+
+    def previous(self, version: int) -> Dict[str, str]:
+        """The payloads warmed for the newest version before this one, by name"""
+        if not self.enabled:
+            return {}
+        try:
+            self._ensure_tables()
+            with self.db_manager.engine.connect() as conn:
+                rows = conn.execute(text("""
+                    SELECT name, payload FROM warm_payloads
+                    WHERE data_version = (SELECT MAX(data_version) FROM warm_payloads WHERE data_version < :version)
+                """), {'version': version}).fetchall()
+            return {name: payload for name, payload in rows}
+        except Exception as e:
+            logger.error(f"Error reading previous warm payloads: {str(e)}")
+            return {}
+
+    def start(self, version: int, tasks: Dict[str, Callable[[], Optional[str]]]) -> bool:
+        """Warm the named payloads for a version in a background thread, unless another process already is.
+
+        Each task returns the serialized payload to store, or None to store nothing.
+        """
+        if not self.enabled or not tasks:
+            return False
+        try:
+            self._ensure_tables()
+            with self.db_manager.engine.connect() as conn:
+                # A claim abandoned by a crashed process expires after the budget
+                conn.execute(text("""
+                    DELETE FROM warmup_runs
+                    WHERE data_version < :version OR (data_version = :version AND state = 'running' AND started_at < :stale)
+                """), {'version': version, 'stale': time.time() - WARMUP_BUDGET - 60})
+                conn.execute(text("DELETE FROM warm_payloads WHERE data_version < :version"), {'version': version})
+                conn.execute(text("""
+                    INSERT INTO warmup_runs (data_version, state, total, started_at)
+                    VALUES (:version, 'running', :total, :now)
+                """), {'version': version, 'total': len(tasks), 'now': time.time()})
+                conn.commit()
+        except IntegrityError:
+            logger.info(f"Warm-up for data version {version} already claimed")
+            return False
+        except Exception as e:
+            logger.error(f"Error starting warm-up: {str(e)}")
+            return False
+
+        threading.Thread(target=self._run, args=(version, tasks), name='warmup', daemon=True).start()
+        return True
+
+    def _run(self, version: int, tasks: Dict[str, Callable[[], Optional[str]]]):
+        start = time.monotonic()
+        executor = ThreadPoolExecutor(max_workers=WARMUP_CONCURRENCY, thread_name_prefix='warmup')
+        pending = {executor.submit(task): name for name, task in tasks.items()}
+        state = 'complete'
+        while pending:
+            remaining = WARMUP_BUDGET - (time.monotonic() - start)
+            if remaining <= 0:
+                state = 'budget_exhausted'
+                break
+            done, _ = wait(pending, timeout=remaining, return_when=FIRST_COMPLETED)
+            for future in done:
+                name = pending.pop(future)
+                try:
+                    payload = future.result()
+                    self._record(version, name, payload)
+                except Exception as e:
+                    logger.error(f"Warm-up of {name} failed: {str(e)}")
+                    self._record(version, name, None)
+        executor.shutdown(wait=False, cancel_futures=True)
+
+        self._finish(version, state)
+        logger.info(f"Warm-up for data version {version} {state} after {time.monotonic() - start:.1f}s "
+                    f"({len(tasks) - len(pending)} of {len(tasks)} payloads)")
+
+    def _record(self, version: int, name: str, payload: Optional[str]):
+        """Store one payload and count it; None counts as a failure"""
+        try:
+            with self.db_manager.engine.connect() as conn:
+                if payload is not None:
+                    conn.execute(text("DELETE FROM warm_payloads WHERE name = :name AND data_version = :version"),
+                                 {'name': name, 'version': version})
+                    conn.execute(text("""
+                        INSERT INTO warm_payloads (name, data_version, payload) VALUES (:name, :version, :payload)
+                    """), {'name': name, 'version': version, 'payload': payload})
+                column = 'done' if payload is not None else 'failed'
+                conn.execute(text(f"UPDATE warmup_runs SET {column} = {column} + 1 WHERE data_version = :version"),
+                             {'version': version})
+                conn.commit()
+        except Exception as e:
+            logger.error(f"Error storing warm payload {name}: {str(e)}")
+
+    def _finish(self, version: int, state: str):
+        try:
+            with self.db_manager.engine.connect() as conn:
+                conn.execute(text("""
+                    UPDATE warmup_runs SET state = :state, finished_at = :now WHERE data_version = :version
+                """), {'version': version, 'state': state, 'now': time.time()})
+                conn.commit()
+        except Exception as e:
+            logger.error(f"Error updating warm-up progress: {str(e)}")
+
+    def status(self) -> Dict[str, Any]:
+        """Progress of the warm-up for the current data version"""
+        version = self.db_manager.get_data_version()
+        if not self.enabled:
+            return {'state': 'disabled', 'data_version': version}
+        try:
+            self._ensure_tables()
+            with self.db_manager.engine.connect() as conn:
+                row = conn.execute(text("""
+                    SELECT state, total, done, failed, started_at, finished_at
+                    FROM warmup_runs WHERE data_version = :version
+                """), {'version': version}).fetchone()
+        except Exception as e:
+            logger.error(f"Error reading warm-up progress: {str(e)}")
+            row = None
+        if row is None:
+            return {'state': 'not_started', 'data_version': version}
+        state, total, done, failed, started_at, finished_at = row
+        return {
+            'state': state,
+            'data_version': version,
+            'total': total,
+            'done': done,
+            'failed': failed,
+            'elapsed_ms': int(((finished_at or time.time()) - started_at) * 1000)
+        }
+
+    def is_warm(self) -> bool:
+        """Whether the current version's warm-up has finished (or there is nothing to wait for)"""
+        return not self.enabled or self.status()['state'] in ('complete', 'budget_exhausted')
@@ -0,0 +1,274 @@
+import csv
+import glob
+import hashlib
+import logging
+import os
+import queue
+import threading
+import time
+from typing import Dict, Any, List, Optional, Tuple
+from sqlalchemy import text
+from sqlalchemy.exc import IntegrityError
+from database import DatabaseManager
+from delta_ingest import DeltaIngestor, DeltaValidationError, DELTA_TABLES
+
+logger = logging.getLogger(__name__)
+
+# Drop directory watched for delta CSV files (watch mode is off when unset)
+WATCH_DIR = os.environ.get("WATCH_DIR")
+WATCH_INTERVAL = float(os.environ.get("WATCH_INTERVAL", 5))
+# Seconds a file's size and mtime must stay put before it counts as fully written
+WATCH_DEBOUNCE = float(os.environ.get("WATCH_DEBOUNCE", 10))
+# Files queued for ingestion before scanning pauses
+WATCH_MAX_PENDING = int(os.environ.get("WATCH_MAX_PENDING", 16))
+# Longest wait before retrying a file whose ingest failed for a reason other than invalid contents
+WATCH_RETRY_MAX = float(os.environ.get("WATCH_RETRY_MAX", 300))
+# Seconds after which a 'running' claim counts as abandoned by a crashed process
+WATCH_CLAIM_TIMEOUT = float(os.environ.get("WATCH_CLAIM_TIMEOUT", 600))
+
+def file_fingerprint(path: str) -> str:
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(1 << 20), b''):
+            digest.update(block)
+    return digest.hexdigest()
+
+def detect_table(path: str) -> Optional[str]:
+    """The fact table whose columns match the file's header"""
+    with open(path, newline='', encoding='utf-8-sig') as f:
+        try:
+            header = {name.strip() for name in next(csv.reader(f), [])}
+        except UnicodeDecodeError:
+            return None
+    for table, spec in DELTA_TABLES.items():
+        if header == set(spec['columns']):
+            return table
+    return None
+
+class DirectoryWatcher:
+    """Poll a drop directory and ingest new or changed CSV files as deltas in the background.
+
+    A file is queued once its size and mtime have been stable for the debounce
+    period. Each file content is claimed once across processes through its
+    ingest_log row. Scanning pauses while the queue is full, so a burst of
+    files waits on disk rather than in memory. Invalid files are rejected for
+    good; any other failure releases the claim and the file is retried with
+    exponential backoff.
+    """
+
+    def __init__(self, directory: str, interval: float = WATCH_INTERVAL, debounce: float = WATCH_DEBOUNCE,
+                 max_pending: int = WATCH_MAX_PENDING):
+        self.directory = directory
+        self.interval = interval
+        self.debounce = debounce
+        self.db_manager = DatabaseManager()
+        self.ingestor = DeltaIngestor()
+        self._pending: "queue.Queue[Tuple[str, Tuple[int, int]]]" = queue.Queue(maxsize=max_pending)
+        self._seen: Dict[str, Tuple[Tuple[int, int], float]] = {}
+        self._handled: Dict[str, Tuple[int, int]] = {}
+        self._retries: Dict[str, Tuple[int, float]] = {}
+        self._stop = threading.Event()
+        self._threads: List[threading.Thread] = []
+        self.stats = {'queued': 0, 'ingested': 0, 'skipped': 0, 'failed': 0, 'rows': 0, 'paused_scans': 0}
+        self._ensure_log()
+
+    def _ensure_log(self):
+        with self.db_manager.engine.connect() as conn:
+            conn.execute(text("""
+                CREATE TABLE IF NOT EXISTS ingest_log (
+                    fingerprint TEXT PRIMARY KEY,
+                    path TEXT NOT NULL,
+                    table_name TEXT,
+                    status TEXT NOT NULL,
+                    rows INTEGER,
+                    rows_per_sec REAL,
+                    lag_seconds REAL,
+                    elapsed_ms INTEGER,
+                    data_version INTEGER,
+                    error TEXT,
+                    ingested_at REAL
+                )
+            """))
+            conn.commit()
+
+    def start(self) -> 'DirectoryWatcher':
+        for target, name in ((self._scan_loop, 'watch-scan'), (self._ingest_loop, 'watch-ingest')):
+            thread = threading.Thread(target=target, name=name, daemon=True)
+            thread.start()
+            self._threads.append(thread)
+        logger.info(f"Watching {self.directory} for delta files every {self.interval:.0f}s")
+        return self
+
+    def stop(self, timeout: float = None):
+        self._stop.set()
+        for thread in self._threads:
+            thread.join(timeout)
+
+    def _scan_loop(self):
+        while not self._stop.is_set():
+            try:
+                self.scan()
+            except Exception as e:
+                logger.error(f"Error scanning {self.directory}: {str(e)}")
+            self._stop.wait(self.interval)
+
+    def scan(self):
+        """Queue files whose contents have settled; oldest first"""
+        now = time.time()
+        files = []
+        for path in glob.glob(os.path.join(self.directory, '*.csv')):
+            try:
+                files.append((os.stat(path), path))
+            except FileNotFoundError:
+                continue
+        for stat, path in sorted(files, key=lambda file: file[0].st_mtime):
+            signature = (stat.st_size, stat.st_mtime_ns)
+            if self._handled.get(path) == signature:
+                continue
+            retry = self._retries.get(path)
+            if retry and now < retry[1]:
+                continue
+            seen = self._seen.get(path)
+            if seen is None or seen[0] != signature:
+                # New or still being written: restart the debounce clock
+                self._seen[path] = (signature, now)
+                continue
+            if now - seen[1] < self.debounce:
+                continue
+            try:
+                self._pending.put_nowait((path, signature))
+            except queue.Full:
+                self.stats['paused_scans'] += 1
+                logger.warning(f"Ingest queue full ({self._pending.maxsize} files), leaving the rest for the next scan")
+                return
+            self._handled[path] = signature
+            self.stats['queued'] += 1
+
+    def _ingest_loop(self):
+        while not self._stop.is_set():
+            try:
+                path, signature = self._pending.get(timeout=0.5)
+            except queue.Empty:
+                continue
+            try:
+                self.ingest_file(path, signature[1] / 1e9)
+            except Exception as e:
+                logger.error(f"Error ingesting {path}: {str(e)}")
+
+    def _claim(self, fingerprint: str, path: str) -> Optional[str]:
+        """Claim a file's contents in ingest_log; None when claimed, else the status of the existing claim"""
+        now = time.time()
+        with self.db_manager.engine.connect() as conn:
+            try:
+                conn.execute(text("""
+                    INSERT INTO ingest_log (fingerprint, path, status, ingested_at)
+                    VALUES (:fingerprint, :path, 'running', :now)
+                """), {'fingerprint': fingerprint, 'path': path, 'now': now})
+                conn.commit()
+                return None
+            except IntegrityError:
+                conn.rollback()
+            # A failed ingest, or a claim abandoned by a crashed process, can be taken over
+            taken = conn.execute(text("""
+                UPDATE ingest_log SET path = :path, status = 'running', error = NULL, ingested_at = :now
+                WHERE fingerprint = :fingerprint AND (status = 'failed'
+                    OR (status = 'running' AND (ingested_at IS NULL OR ingested_at < :stale)))
+            """), {'fingerprint': fingerprint, 'path': path, 'now': now, 'stale': now - WATCH_CLAIM_TIMEOUT}).rowcount
+            conn.commit()
+            if taken:
+                return None
+            row = conn.execute(text("SELECT status FROM ingest_log WHERE fingerprint = :fingerprint"),
+                               {'fingerprint': fingerprint}).fetchone()
+            return row[0] if row else 'running'
+
+    def _retry_later(self, path: str):
+        """Let the next scans queue the file again, backing off exponentially"""
+        attempts = self._retries.get(path, (0, 0))[0] + 1
+        self._retries[path] = (attempts, time.time() + min(self.interval * 2 ** attempts, WATCH_RETRY_MAX))
+        self._handled.pop(path, None)
+
+    def ingest_file(self, path: str, modified_at: float) -> Optional[Dict[str, Any]]:
+        """Claim a file by content fingerprint and upsert it; None if it was already ingested or failed"""
+        fingerprint = file_fingerprint(path)
+        try:
+            held = self._claim(fingerprint, path)
+        except Exception as e:
+            self.stats['failed'] += 1
+            self._retry_later(path)
+            logger.error(f"Could not claim {path}, will retry: {str(e)}")
+            return None
+        if held is not None:
+            self.stats['skipped'] += 1
+            if held == 'running':
+                # Another worker has it; look again in case that worker dies
+                self._retry_later(path)
+                logger.info(f"Skipping {path}: another worker is ingesting these contents")
+            else:
+                logger.info(f"Skipping {path}: these contents were already {'ingested' if held == 'ok' else held}")
+            return None
+
+        table = None
+        try:
+            table = detect_table(path)
+            if table is None:
+                raise DeltaValidationError(["header matches none of " + ', '.join(DELTA_TABLES)])
+            with open(path, 'rb') as f:
+                summary = self.ingestor.ingest(table, f)
+        except DeltaValidationError as e:
+            self.stats['failed'] += 1
+            self._log(fingerprint, table, 'rejected', error=str(e)[:500])
+            logger.error(f"Delta file {path} rejected: {str(e)}")
+            return None
+        except Exception as e:
+            # Not the file's fault (a locked or unavailable database, say): release the claim and retry
+            self.stats['failed'] += 1
+            self._log(fingerprint, table, 'failed', error=str(e)[:500])
+            self._retry_later(path)
+            logger.error(f"Ingesting {path} failed, will retry: {str(e)}")
+            return None
+
+        self._retries.pop(path, None)
+        lag = time.time() - modified_at
+        self.stats['ingested'] += 1
+        self.stats['rows'] += summary['rows']
+        self._log(fingerprint, table, 'ok', rows=summary['rows'], rows_per_sec=summary['rows_per_sec'],
+                  lag_seconds=lag, elapsed_ms=summary['elapsed_ms'], data_version=summary['data_version'])
+        logger.info(f"Ingested {path} into {table}: {summary['rows']} rows at {summary['rows_per_sec']} rows/s, "
+                    f"{lag:.1f}s after it landed")
+        return summary
+
+    def _log(self, fingerprint: str, table: Optional[str], status: str, **fields: Any):
+        values = {'rows': None, 'rows_per_sec': None, 'lag_seconds': None, 'elapsed_ms': None,
+                  'data_version': None, 'error': None, **fields}
+        try:
+            with self.db_manager.engine.connect() as conn:
+                conn.execute(text("""
+                    UPDATE ingest_log SET table_name = :table, status = :status, rows = :rows,
+                        rows_per_sec = :rows_per_sec, lag_seconds = :lag_seconds, elapsed_ms = :elapsed_ms,
+                        data_version = :data_version, error = :error, ingested_at = :now
+                    WHERE fingerprint = :fingerprint
+                """), {'fingerprint': fingerprint, 'table': table, 'status': status, 'now': time.time(), **values})
+                conn.commit()
+        except Exception as e:
+            logger.error(f"Error writing ingest log: {str(e)}")
+
+    def status(self) -> Dict[str, Any]:
+        return {'directory': self.directory, 'pending': self._pending.qsize(), **self.stats}
+
+_watcher: Optional[DirectoryWatcher] = None
+_watcher_lock = threading.Lock()
+
+def start_watcher(directory: str = None) -> Optional[DirectoryWatcher]:
+    """Start the process-wide watcher on a directory (WATCH_DIR by default); None when there is none"""
+    global _watcher
+    directory = directory or WATCH_DIR
+    if not directory:
+        return None
+    with _watcher_lock:
+        if _watcher is None:
+            os.makedirs(directory, exist_ok=True)
+            _watcher = DirectoryWatcher(directory).start()
+        return _watcher
+
+def get_watcher() -> Optional[DirectoryWatcher]:
+    return _watcher